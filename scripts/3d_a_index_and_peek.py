@@ -6,22 +6,32 @@
 - Prints header columns to help confirm the raw counts column name
 """
 
+import sys
 import pandas as pd, numpy as np
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.instrument import RunReport, nbytes
+
+run = RunReport.start(__file__)   # stage timings -> data_proc/.runs/
+
 base = Path("data_raw/gdc_star_counts_primary")
 assert base.exists(), f"Counts folder not found: {base}"
 
 # 1) map every *.tsv or *.tsv.gz file by its basename
-name_to_path = {}
-for p in base.rglob("*"):
-    if p.is_file() and (p.suffix.lower() in [".tsv",".gz"] or p.name.endswith(".tsv.gz")):
-        name_to_path[p.name] = p
+with run.stage("index_files") as st:
+    name_to_path = {}
+    for p in base.rglob("*"):
+        if p.is_file() and (p.suffix.lower() in [".tsv",".gz"] or p.name.endswith(".tsv.gz")):
+            name_to_path[p.name] = p
+    st.rows = len(name_to_path)
 
 print("Indexed files:", len(name_to_path))
 
 # 2) load the join table (clinical+files)
-joined = pd.read_csv("data_proc/tcga_survival_join.tsv", sep="\t")
+with run.stage("read_join") as st:
+    joined = pd.read_csv("data_proc/tcga_survival_join.tsv", sep="\t")
+    st.rows, st.bytes = len(joined), nbytes("data_proc/tcga_survival_join.tsv")
 print("joined rows:", joined.shape)
 
 # 3) pick one file from the join list to sniff
@@ -33,7 +43,9 @@ print("example path:", ex_path)
 kw = dict(sep="\t", comment="#", nrows=5, engine="python")
 if str(ex_path).endswith(".gz"):
     kw["compression"] = "infer"
-df_head = pd.read_csv(ex_path, **kw)
+with run.stage("peek") as st:
+    df_head = pd.read_csv(ex_path, **kw)
+    st.rows = len(df_head)
 print("example columns:", df_head.columns.tolist())
 print(df_head.head(3))
 
@@ -11,147 +11,286 @@ Outputs:
 
 Behavior (faithful to REPL):
   - Map file_name -> actual path
-  - read_star_counts() per sample (raw counts only, drop summary rows)
+  - read_star_counts() per sample (src/star_utils.py; raw counts only, drop summary rows)
   - Assemble genes × samples, collapse duplicate symbols by median
   - Reorder columns strictly to join order
-"""
-
-
-import pandas as pd, numpy as np
-from pathlib import Path
-
-
-def read_star_counts(path):
-    """Return Series: index = gene symbol (uppercased; fallback to gene_id), values = raw counts."""
-    import pandas as pd
-
-    kw = dict(sep="\t", comment="#", dtype=str, engine="c")
-    if str(path).endswith(".gz"):
-        kw["compression"] = "infer"
-    df = pd.read_csv(path, **kw)
-
-    # normalize column names
-    norm = {c: c.lower().replace(".", "_").strip() for c in df.columns}
-    inv  = {v: k for k, v in norm.items()}
-
-    # columns present?
-    gene_id_col   = inv.get("gene_id")
-    gene_name_col = inv.get("gene_name") or inv.get("gene") or inv.get("hugo_symbol")
-
-    # choose raw-counts column (NOT tpm/fpkm)
-    for key in ["unstranded", "raw_count", "read_count", "htseq_counts", "stranded_first", "stranded_second"]:
-        if key in inv:
-            count_col = inv[key]
-            break
-    else:
-        raise ValueError(f"No counts column found in {list(df.columns)}")
-
-    # build a robust index: use gene_name if available; otherwise fall back to gene_id
-    if gene_name_col is not None:
-        sym = df[gene_name_col].astype("string").str.strip()
-        # consider empty/NA/"NA"/"NAN"/"-" as missing
-        miss = sym.isna() | (sym == "") | sym.str.upper().isin({"NA", "NAN", "NULL", "-"})
-        if gene_id_col is not None:
-            sym.loc[miss] = df[gene_id_col]
-        else:
-            sym = sym[~miss]
-        index = sym.str.upper()
-    elif gene_id_col is not None:
-        index = df[gene_id_col].astype("string").str.strip().str.upper()
-    else:
-        raise ValueError("Neither gene_name nor gene_id found")
 
-    # make the series
-    s = pd.Series(df[count_col].values, index=index, name=count_col)
-    print("read_star_counts:", path, "n_rows=", len(s), flush=True)
+Usage:
+  python scripts/3d_c_build_tcga_counts.py              # sequential (one core)
+  python scripts/3d_c_build_tcga_counts.py --workers 16 # parse files in a process pool
 
+Missing files and files that fail to parse are collected and reported at the end;
+they never abort the run. The output is identical for any --workers value.
 
-    # drop STAR/HTSeq summary rows (single pass; robust to NA)
-    idx = s.index.astype("string")
-    keep = ~idx.str.startswith(("__", "N_"), na=False)
-    s = s[keep]
+Fixed-layout fast path (default; --no-fixed-layout disables it): the first file sets
+the reference gene layout, every file whose gene_id/gene_name columns hash to the
+same digest only contributes its count column to a preallocated genes × samples
+int32 matrix. Files with a different layout fall back to the Series/union path.
 
-    # coerce to numeric; NaN -> 0
-    s = pd.to_numeric(s, errors="coerce").fillna(0)
+Parse cache (default; --no-cache disables it): parsed count vectors are stored under
+--cache-dir keyed by the GDC manifest md5 + reader version (src/star_cache.py), so a
+re-run only parses files it has not seen. The cache is LRU-trimmed to --cache-max-mb
+after each build; `python -m src.star_cache verify|prune` maintains it by hand.
 
-    # remove any residual empty/NAN index rows (defensive)
-    s = s[(s.index != "") & (s.index != "NAN")]
+Integrity (default; --no-verify disables it): files are checked against the manifest
+md5/size in the same read that feeds the parser. Corrupted or truncated files are moved
+to --quarantine-dir and skipped; every file's status lands in
+data_proc/tcga_counts_integrity.tsv (ok / cached / unverified / md5_mismatch /
+truncated / size_mismatch / parse_error / missing).
 
-    return s
+The counts Parquet is written with pandas' default layout (one row group), byte-identical
+to earlier builds; --row-group-size N (e.g. 4096) opts into bounded row groups for
+streaming 3D-D --chunked at lower peak memory.
+"""
 
 
+import argparse, os, shutil, sys
+import pandas as pd, numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.star_utils import ENGINES, read_star_bytes, star_layout
+from src.preprocess.collapse import collapse_duplicates
+from src.instrument import RunReport, nbytes
+from src.star_cache import (BAD_STATUSES, DEFAULT_MANIFEST, DEFAULT_ROOT, StarCountCache,
+                            check_integrity, load_manifest, read_star_counts_cached)
 
-# where your STAR counts live
-base = Path("data_raw/gdc_star_counts_primary")
-assert base.exists(), f"Counts folder not found: {base}"
 
-# map basename -> full path for fast lookup
-exts = (".tsv", ".tsv.gz", ".txt", ".txt.gz")
-name_to_path = {
-    p.name: p
-    for p in base.rglob("*")
-    if p.is_file() and any(p.name.lower().endswith(e) for e in exts)
-}
-print("Indexed files:", len(name_to_path))
+# per-process worker state: reference layout (index labels stay in the parent), engine, cache
+_LAYOUT = None
+_ENGINE = "auto"
+_CACHE = None
+_VERIFY = False
 
-# joined table from 2D-3 (submitter_id, file_name, os labels)
-joined = pd.read_csv("data_proc/tcga_survival_join.tsv", sep="\t")
-joined["submitter_id"] = joined["submitter_id"].astype(str).str.upper().str.strip()
-joined = joined.drop_duplicates(subset=["submitter_id"]).copy()
-sample_order = joined["submitter_id"].tolist()
-print("Joined rows (unique samples):", len(sample_order))
 
+def init_worker(layout, engine="auto", cache_root=None, verify=False):
+    global _LAYOUT, _ENGINE, _CACHE, _VERIFY
+    _LAYOUT, _ENGINE, _VERIFY = layout, engine, verify
+    _CACHE = StarCountCache(cache_root) if cache_root is not None else None
 
 
-series_by_sample = {}
-missing_files = []
+def load_one(job):
+    """Worker: (submitter_id, file_name, path, md5, size) -> (submitter_id, file_name, counts, error, cache_hit, integrity).
 
-for i, row in joined.iterrows():
-    sid = row["submitter_id"]
-    f   = row["file_name"]
-    p   = name_to_path.get(f)
+    counts is an int32 array in reference-layout order when the fast path applies,
+    otherwise the read_star_counts() Series; None on error.
+    """
+    sid, f, p, md5, size = job
     if p is None:
-        missing_files.append(f)
-        continue
-    s = read_star_counts(p)           # <-- the function you just perfected
-    series_by_sample[sid] = s
-    if (i + 1) % 100 == 0:
-        print(f" loaded {len(series_by_sample)}/{len(sample_order)} ...")
-
-print("\nloaded samples:", len(series_by_sample), " | missing files:", len(missing_files))
-if missing_files:
-    print("example missing:", missing_files[:5])
-
-
-
-# assemble (union of all gene indices across samples)
-Xc = pd.DataFrame(series_by_sample)
-
-# how many duplicated gene symbols?
-n_dupe = int(Xc.index.duplicated().sum())
-print("genes before collapse:", Xc.shape[0], "| duplicate rows:", n_dupe)
-
-# collapse duplicates by median across duplicate-symbol rows
-Xc = Xc.groupby(level=0, as_index=True).median(numeric_only=True)
-
-# fill any gaps with 0 counts
-Xc = Xc.fillna(0)
-
-# order columns to match joined sample order (and drop any missing)
-cols_loaded = [c for c in sample_order if c in Xc.columns]
-Xc = Xc.reindex(columns=cols_loaded)
-
-print("raw counts shape after collapse (genes × samples):", Xc.shape)
-print("any negative counts?", bool((Xc < 0).any().any()))
-print("library sizes, first 5:", list(Xc.sum(axis=0).astype(int).iloc[:5]))
-
-
-
-
-out_counts = Path("data_proc/tcga_counts_raw.parquet")
-Xc.astype("int32").to_parquet(out_counts, index=True)
-print("saved raw counts ->", out_counts)
-
-
-
+        return sid, f, None, "missing", False, {"status": "missing"}
+    try:
+        counts, hit, integrity = read_star_counts_cached(p, md5, _CACHE, _LAYOUT, _ENGINE, size, _VERIFY)
+        err = integrity["status"] if counts is None else None
+        return sid, f, counts, err, hit, integrity
+    except Exception as e:  # collect, never abort the build
+        return sid, f, None, f"{type(e).__name__}: {e}", False, {"status": "parse_error"}
+
+
+def iter_star_counts(jobs, workers=1, chunksize=4, layout=None, engine="auto", cache_root=None, verify=False):
+    """Yield load_one() results in job order; parse in a process pool when workers > 1."""
+    if layout is not None:
+        layout = layout._replace(index=None)  # workers only need digest + kept rows
+    init = (layout, engine, cache_root, verify)
+    if workers <= 1:
+        init_worker(*init)
+        yield from map(load_one, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=init) as ex:
+        # Executor.map streams results back in submission (= join) order
+        yield from ex.map(load_one, jobs, chunksize=chunksize)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=1,
+                    help="parser processes (1 = sequential; 0 = all cores)")
+    ap.add_argument("--chunksize", type=int, default=4, help="files handed to a worker per task")
+    ap.add_argument("--progress-every", type=int, default=100)
+    ap.add_argument("--fixed-layout", action=argparse.BooleanOptionalAction, default=True,
+                    help="fill a preallocated int32 matrix for files sharing the reference gene layout")
+    ap.add_argument("--engine", choices=ENGINES + ("auto",), default="auto",
+                    help="STAR parser backend (all engines give identical results)")
+    ap.add_argument("--cache", action=argparse.BooleanOptionalAction, default=True,
+                    help="reuse parsed count vectors keyed by manifest md5")
+    ap.add_argument("--cache-dir", type=Path, default=DEFAULT_ROOT)
+    ap.add_argument("--cache-max-mb", type=float, default=2048, help="LRU size cap applied after the build")
+    ap.add_argument("--manifest", type=Path, default=DEFAULT_MANIFEST)
+    ap.add_argument("--verify", action=argparse.BooleanOptionalAction, default=True,
+                    help="check each file's md5/size against the manifest while reading it")
+    ap.add_argument("--quarantine-dir", type=Path, default=Path("data_raw/gdc_quarantine"))
+    ap.add_argument("--integrity-report", type=Path, default=Path("data_proc/tcga_counts_integrity.tsv"))
+    ap.add_argument("--row-group-size", type=int, default=None,
+                    help="Parquet rows per row group (default: pandas' single row group, byte-identical output)")
+    args = ap.parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+    run = RunReport.start(__file__)   # stage timings -> data_proc/.runs/
+
+    # where your STAR counts live
+    base = Path("data_raw/gdc_star_counts_primary")
+    assert base.exists(), f"Counts folder not found: {base}"
+
+    # map basename -> full path for fast lookup
+    exts = (".tsv", ".tsv.gz", ".txt", ".txt.gz")
+    with run.stage("index_files") as st:
+        name_to_path = {
+            p.name: p
+            for p in base.rglob("*")
+            if p.is_file() and any(p.name.lower().endswith(e) for e in exts)
+        }
+        st.rows = len(name_to_path)
+    print("Indexed files:", len(name_to_path))
+
+    # joined table from 2D-3 (submitter_id, file_name, os labels)
+    joined = pd.read_csv("data_proc/tcga_survival_join.tsv", sep="\t")
+    joined["submitter_id"] = joined["submitter_id"].astype(str).str.upper().str.strip()
+    joined = joined.drop_duplicates(subset=["submitter_id"]).copy()
+    sample_order = joined["submitter_id"].tolist()
+    print("Joined rows (unique samples):", len(sample_order))
+
+    # manifest md5/size key the parse cache and the integrity check
+    manifest = load_manifest(args.manifest) if args.manifest.exists() else None
+    md5_by_name = manifest["md5"].to_dict() if manifest is not None else {}
+    size_by_name = manifest["size"].to_dict() if manifest is not None else {}
+    cache = StarCountCache(args.cache_dir) if args.cache else None
+
+    jobs = [(sid, f, name_to_path.get(f), md5_by_name.get(f), size_by_name.get(f))
+            for sid, f in zip(joined["submitter_id"], joined["file_name"])]
+    print(f"parsing {len(jobs)} files with {workers} worker(s) | cache:",
+          cache.root if cache else "off", f"| verify: {args.verify} ({len(md5_by_name)} manifest md5s)")
+
+    with run.stage("reference_layout"):
+        layout = None
+        if args.fixed_layout:
+            # reference = first file present (and intact, when verifying)
+            ref = None
+            for _, _, p, md5, size in jobs:
+                if p is None:
+                    continue
+                if args.verify and md5 is not None:
+                    _, got_md5, got_size = read_star_bytes(p)
+                    if check_integrity(got_md5, got_size, md5, size) in BAD_STATUSES:
+                        continue
+                ref = p
+                break
+            if ref is not None:
+                layout = star_layout(ref, args.engine)
+                print("reference layout:", ref.name, "| genes:", len(layout.index), "| digest:", layout.digest)
+                if cache is not None:
+                    cache.save_layout(layout)
+
+    # fast-path columns land in M; other layouts keep the Series path
+    M = np.zeros((len(layout.index), len(jobs)), dtype=np.int32) if layout is not None else None
+    fast_cols = []
+    series_by_sample = {}
+    loaded_order = []
+    missing_files = []
+    failed_files = []
+    n_hits = n_parsed = 0
+    integrity_rows = []
+
+    with run.stage("parse_star") as st:
+        st.bytes = nbytes(*(j[2] for j in jobs if j[2] is not None))   # before any quarantine move
+        results = iter_star_counts(jobs, workers, args.chunksize, layout, args.engine,
+                                   cache.root if cache else None, args.verify)
+        for i, (sid, f, s, err, hit, integrity) in enumerate(results):
+            n_hits += hit
+            n_parsed += s is not None and not hit
+            job = jobs[i]
+            row = {"submitter_id": sid, "file_name": f, "expected_md5": job[3], "expected_size": job[4],
+                   "observed_md5": integrity.get("observed_md5"), "observed_size": integrity.get("observed_size"),
+                   "status": integrity["status"], "quarantined_to": None, "detail": None}
+            if integrity["status"] in BAD_STATUSES:
+                # corrupted/truncated download: move it aside so the next gdc-client run refetches it
+                dest = args.quarantine_dir / f
+                args.quarantine_dir.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(job[2]), dest)
+                row["quarantined_to"] = str(dest)
+                print(f" QUARANTINED {f}: {integrity['status']} -> {dest}", flush=True)
+            elif err is not None and err != "missing":
+                row["detail"] = err
+            integrity_rows.append(row)
+
+            if err == "missing":
+                missing_files.append(f)
+            elif err is not None:
+                failed_files.append((f, err))
+                print(f" FAILED {f}: {err}", flush=True)
+            elif isinstance(s, np.ndarray):
+                M[:, len(fast_cols)] = s
+                fast_cols.append(sid)
+                loaded_order.append(sid)
+            else:
+                series_by_sample[sid] = s
+                loaded_order.append(sid)
+            if (i + 1) % args.progress_every == 0:
+                print(f" loaded {len(loaded_order)}/{len(sample_order)} ...", flush=True)
+        st.rows = len(loaded_order)
+
+    print("\nloaded samples:", len(loaded_order), " | missing files:", len(missing_files),
+          " | failed files:", len(failed_files))
+    print("fixed-layout samples:", len(fast_cols), " | fallback samples:", len(series_by_sample),
+          " | cache hits:", n_hits, " | parsed:", n_parsed)
+    if missing_files:
+        print("example missing:", missing_files[:5])
+    if failed_files:
+        print("example failed:", failed_files[:5])
+
+    integrity = pd.DataFrame(integrity_rows)
+    for c in ["expected_size", "observed_size"]:
+        integrity[c] = integrity[c].astype("Int64")
+    integrity.to_csv(args.integrity_report, sep="\t", index=False)
+    print("integrity:", integrity["status"].value_counts().to_dict(), "->", args.integrity_report)
+
+    with run.stage("assemble") as st:
+        if layout is not None and fast_cols and not series_by_sample:
+            # every file matched the reference layout: no label alignment needed
+            Xc = pd.DataFrame(M[:, :len(fast_cols)], index=layout.index, columns=fast_cols)
+        else:
+            # assemble (union of all gene indices across samples; empty if nothing loaded)
+            fast_pos = {sid: j for j, sid in enumerate(fast_cols)}
+            Xc = pd.DataFrame({
+                sid: (pd.Series(M[:, fast_pos[sid]], index=layout.index) if sid in fast_pos
+                      else series_by_sample[sid])
+                for sid in loaded_order
+            })
+        st.rows, st.bytes = len(Xc), nbytes(Xc)
+    del M
+
+    # how many duplicated gene symbols?
+    n_dupe = int(Xc.index.duplicated().sum())
+    print("genes before collapse:", Xc.shape[0], "| duplicate rows:", n_dupe)
+
+    # collapse duplicates by median across duplicate-symbol rows (== groupby(level=0).median())
+    with run.stage("collapse") as st:
+        st.rows = len(Xc)
+        Xc = collapse_duplicates(Xc, "median")
+
+        # fill any gaps with 0 counts
+        Xc = Xc.fillna(0)
+
+        # order columns to match joined sample order (and drop any missing)
+        cols_loaded = [c for c in sample_order if c in Xc.columns]
+        Xc = Xc.reindex(columns=cols_loaded)
+        st.bytes = nbytes(Xc)
+
+    print("raw counts shape after collapse (genes × samples):", Xc.shape)
+    print("any negative counts?", bool((Xc < 0).any().any()))
+    print("library sizes, first 5:", list(Xc.sum(axis=0).astype(int).iloc[:5]))
+
+    out_counts = Path("data_proc/tcga_counts_raw.parquet")
+    # opt-in bounded row groups let 3D-D --chunked stream the matrix at lower peak memory
+    with run.stage("write_parquet") as st:
+        kw = {"row_group_size": args.row_group_size} if args.row_group_size else {}
+        Xc.astype("int32").to_parquet(out_counts, index=True, **kw)
+        st.rows, st.bytes = len(Xc), nbytes(out_counts)
+    print("saved raw counts ->", out_counts)
+
+    if cache is not None:
+        with run.stage("cache_evict"):
+            evicted = cache.evict(int(args.cache_max_mb * 1e6))
+        print("parse cache size (MB) ~", round(cache.size_bytes() / 1e6, 1), "| evicted:", len(evicted))
+
+
+if __name__ == "__main__":
+    main()
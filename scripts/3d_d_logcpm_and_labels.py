@@ -8,64 +8,96 @@ Inputs:
 
 Outputs:
   - data_proc/tcga_expr_logcpm.parquet  (genes × samples, float32)
+  - data_proc/store/tcga_expr_logcpm/   (with --store: memory-mapped copy, src/preprocess/matrix_store.py)
   - data_proc/tcga_labels.tsv           (SAMPLE_ID, os_event[int8], os_time_months[float32])
+
+Usage:
+  python scripts/3d_d_logcpm_and_labels.py                         # whole matrix in memory
+  python scripts/3d_d_logcpm_and_labels.py --chunked --memory-mb 512
+      two passes over Parquet (library sizes, then float32 row groups); same numbers
 """
 
+import argparse, sys
 import pandas as pd, numpy as np
 from pathlib import Path
 
-# reload your saved counts from 3D-C
-Xc = pd.read_parquet("data_proc/tcga_counts_raw.parquet")   # (59427, 1094), int32
-print("counts shape:", Xc.shape, "| dtype:", Xc.dtypes.iloc[0])
-
-
-# library sizes per sample (float to avoid overflow)
-libs = Xc.sum(axis=0).astype(np.float64)
-
-# guard against divide-by-zero (should be none, but be safe)
-zero_libs = libs.eq(0).sum()
-print("zero-size libraries:", int(zero_libs))
-libs = libs.replace(0, np.nan)
-
-# CPM = counts / libsize * 1e6
-CPM = (Xc.divide(libs, axis=1) * 1e6)
-
-# any NaNs created by zero libs? (should be 0)
-print("CPM NaNs:", int(CPM.isna().sum().sum()))
-# fill potential NaNs with 0 just in case
-CPM = CPM.fillna(0)
-
-
-X_logcpm = np.log2(CPM + 1.0).astype("float32")
-print("logCPM shape:", X_logcpm.shape, "| dtype:", X_logcpm.dtypes.iloc[0])
-
-# quick QA: no inf/NaN
-nonfinite = ~np.isfinite(X_logcpm.to_numpy()).all()
-print("any non-finite?", bool(nonfinite))
-
-# optional peek
-print("logCPM mean/std:", float(X_logcpm.values.mean()), float(X_logcpm.values.std()))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.preprocess.normalize import logcpm, logcpm_parquet
+from src.preprocess.matrix_store import write_matrix_parquet
+from src.instrument import RunReport, nbytes
 
+ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+ap.add_argument("--chunked", action="store_true", help="stream the counts matrix instead of loading it")
+ap.add_argument("--memory-mb", type=float, default=512, help="working-memory budget for --chunked")
+ap.add_argument("--store", action=argparse.BooleanOptionalAction, default=False,
+                help="also write a memory-mapped store (zero-copy loads/slices downstream)")
+args = ap.parse_args()
+run = RunReport.start(__file__)
 
+P_COUNTS = Path("data_proc/tcga_counts_raw.parquet")
 out_expr = Path("data_proc/tcga_expr_logcpm.parquet")
-X_logcpm.to_parquet(out_expr, index=True)
-print("saved:", out_expr, "| size (MB) ~", round(out_expr.stat().st_size/1e6, 1))
-
-
 
+if args.chunked:
+    with run.stage("logcpm_chunked") as st:
+        info = logcpm_parquet(P_COUNTS, out_expr, memory_mb=args.memory_mb)
+        st.rows, st.bytes = info["shape"][0], nbytes(P_COUNTS)
+    print("counts shape:", info["shape"], "| streamed with budget (MB):", args.memory_mb)
+    if info["note"]:
+        print("note:", info["note"])
+    print("zero-size libraries:", info["zero_libs"])
+    print("any non-finite?", bool(info["nonfinite"]))
+    print("logCPM mean/std:", info["mean"], info["std"])
+    expr_columns = info["columns"]
+else:
+    # reload your saved counts from 3D-C
+    with run.stage("read_counts") as st:
+        Xc = pd.read_parquet(P_COUNTS)   # (59427, 1094), int32
+        st.rows, st.bytes = len(Xc), nbytes(Xc)
+    print("counts shape:", Xc.shape, "| dtype:", Xc.dtypes.iloc[0])
+
+    # guard against divide-by-zero (should be none, but be safe)
+    zero_libs = Xc.sum(axis=0).eq(0).sum()
+    print("zero-size libraries:", int(zero_libs))
+
+    # CPM = counts / libsize * 1e6 ; log2(CPM + 1) -> float32 (src/preprocess/normalize.py)
+    with run.stage("logcpm") as st:
+        X_logcpm = logcpm(Xc)
+        st.rows, st.bytes = len(Xc), nbytes(Xc)
+    del Xc
+    print("logCPM shape:", X_logcpm.shape, "| dtype:", X_logcpm.dtypes.iloc[0])
+
+    # quick QA: no inf/NaN
+    nonfinite = ~np.isfinite(X_logcpm.to_numpy()).all()
+    print("any non-finite?", bool(nonfinite))
+
+    # optional peek
+    print("logCPM mean/std:", float(X_logcpm.values.mean()), float(X_logcpm.values.std()))
+
+    with run.stage("write_parquet") as st:
+        X_logcpm.to_parquet(out_expr, index=True)
+        st.rows, st.bytes = len(X_logcpm), nbytes(X_logcpm)
+    expr_columns = list(X_logcpm.columns)
 
+print("saved:", out_expr, "| size (MB) ~", round(out_expr.stat().st_size/1e6, 1))
 
+if args.store:
+    with run.stage("write_store") as st:
+        out_store = write_matrix_parquet(out_expr, Path("data_proc/store/tcga_expr_logcpm"), memory_mb=args.memory_mb)
+        st.bytes = nbytes(out_store)
+    print("saved store:", out_store)
 
 
 # load the joined table and align
 joined = pd.read_csv("data_proc/tcga_survival_join.tsv", sep="\t")
 joined["submitter_id"] = joined["submitter_id"].astype(str).str.upper().str.strip()
 
-labels_tcga = (joined
-    .set_index("submitter_id")
-    .loc[X_logcpm.columns, ["os_event", "os_time_months"]]
-    .rename_axis("SAMPLE_ID")
-    .reset_index())
+with run.stage("align_labels") as st:
+    labels_tcga = (joined
+        .set_index("submitter_id")
+        .loc[expr_columns, ["os_event", "os_time_months"]]
+        .rename_axis("SAMPLE_ID")
+        .reset_index())
+    st.rows = len(joined)
 
 
 # tidy dtypes (optional but nice)
@@ -73,7 +105,7 @@ labels_tcga["os_event"] = labels_tcga["os_event"].astype("int8")
 labels_tcga["os_time_months"] = labels_tcga["os_time_months"].astype("float32")
 
 assert labels_tcga["SAMPLE_ID"].is_unique
-assert set(labels_tcga["SAMPLE_ID"]) == set(X_logcpm.columns)
+assert set(labels_tcga["SAMPLE_ID"]) == set(expr_columns)
 
 
 # save
@@ -82,7 +114,7 @@ labels_tcga.to_csv(out_lab, sep="\t", index=False)
 print("saved labels:", out_lab, "| shape:", labels_tcga.shape)
 
 # safety assert: perfect alignment
-assert list(labels_tcga["SAMPLE_ID"]) == list(X_logcpm.columns)
+assert list(labels_tcga["SAMPLE_ID"]) == list(expr_columns)
 print("alignment OK ", labels_tcga.shape)
 
 print("columns after fix:", labels_tcga.columns.tolist())
@@ -4,6 +4,7 @@ Build METABRIC patient-level OS labels from cBioPortal clinical patient file.
 
 Inputs (from brca_metabric.tar.gz):
   - data_raw/metabric/cbioportal/data_clinical_patient.txt  (typical cBioPortal format)
+    read from data_raw/metabric/cbioportal/brca_metabric.tar.gz when not extracted
 
 Outputs:
   - data_proc/metabric_clinical_core.tsv  (PATIENT_ID, os_event[int8], os_time_months[float32])
@@ -13,21 +14,31 @@ Notes:
   - OS_MONTHS is used as survival time; rows with missing time are dropped.
 """
 
+import sys
 import pandas as pd, numpy as np
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.cbio_bundle import study_files
+from src.instrument import RunReport, nbytes
+
+run = RunReport.start(__file__)
+
 mb_dir = Path("data_raw/metabric/cbioportal")
 out_path = Path("data_proc/metabric_clinical_core.tsv")
 out_path.parent.mkdir(parents=True, exist_ok=True)
 
 # --- locate the patient clinical file robustly ---
-cands = sorted([p for p in mb_dir.glob("data_clinical_patient*") if p.suffix.lower() in {".txt", ".tsv"}])
-assert len(cands) >= 1, f"No METABRIC patient clinical file found in {mb_dir}"
+# (extracted files, else members of the study .tar.gz; src/cbio_bundle.py)
+cands = [p for p in study_files("data_clinical_patient*", mb_dir) if p.suffix.lower() in {".txt", ".tsv"}]
+assert len(cands) >= 1, f"No METABRIC patient clinical file found in {mb_dir} (or its .tar.gz)"
 clin_path = cands[0]
 print("Using patient clinical file:", clin_path.name)
 
 # --- read; skip cBioPortal header comments that start with '#'
-clin_raw = pd.read_csv(clin_path, sep="\t", comment="#", dtype=str)
+with run.stage("read_clinical") as st, clin_path.open("rb") as fh:
+    clin_raw = pd.read_csv(fh, sep="\t", comment="#", dtype=str)
+    st.rows = len(clin_raw)
 
 # helper to find columns ignoring case/dots/underscores/spaces
 def find_col(df, names):
@@ -46,23 +57,27 @@ assert col_patient and col_os_stat and col_os_mo, (
     f"Missing required columns. Found patient={col_patient}, os_status={col_os_stat}, os_months={col_os_mo}"
 )
 
-clin = pd.DataFrame({
-    "PATIENT_ID": clin_raw[col_patient].astype(str).str.strip()
-})
-# status → event
-status = clin_raw[col_os_stat].astype(str).str.upper().str.strip()
-# robust mapping: accept 'DECEASED', 'DEAD', or strings containing those
-clin["os_event"] = status.str.contains("DECEASED|DEAD", regex=True).astype("int8")
+with run.stage("os_labels") as st:
+    clin = pd.DataFrame({
+        "PATIENT_ID": clin_raw[col_patient].astype(str).str.strip()
+    })
+    # status → event
+    status = clin_raw[col_os_stat].astype(str).str.upper().str.strip()
+    # robust mapping: accept 'DECEASED', 'DEAD', or strings containing those
+    clin["os_event"] = status.str.contains("DECEASED|DEAD", regex=True).astype("int8")
 
-# time (months)
-time = pd.to_numeric(clin_raw[col_os_mo], errors="coerce")
-clin["os_time_months"] = time
+    # time (months)
+    time = pd.to_numeric(clin_raw[col_os_mo], errors="coerce")
+    clin["os_time_months"] = time
 
-# drop missing/invalid time, clip zeros to tiny positive to avoid issues
-clin = clin.dropna(subset=["os_time_months"]).copy()
-clin["os_time_months"] = clin["os_time_months"].clip(lower=1e-6)
+    # drop missing/invalid time, clip zeros to tiny positive to avoid issues
+    clin = clin.dropna(subset=["os_time_months"]).copy()
+    clin["os_time_months"] = clin["os_time_months"].clip(lower=1e-6)
+    st.rows = len(clin_raw)
 
-clin.to_csv(out_path, sep="\t", index=False)
+with run.stage("write") as st:
+    clin.to_csv(out_path, sep="\t", index=False)
+    st.rows, st.bytes = len(clin), nbytes(out_path)
 print("wrote:", out_path, "shape:", clin.shape)
 print(clin["os_event"].value_counts(dropna=False))
 print(clin[["os_event","os_time_months"]].describe(include="all"))
@@ -3,26 +3,35 @@
 Build METABRIC sample-level survival labels by mapping SAMPLE_ID -> PATIENT_ID and attaching patient OS.
 
 Inputs:
-  - data_raw/cbioportal/data_clinical_sample.txt
+  - data_raw/cbioportal/data_clinical_sample.txt (or straight from brca_metabric.tar.gz)
   - data_proc/metabric_clinical_core.tsv
 
 Outputs:
   - data_proc/metabric_sample_survival.tsv (SAMPLE_ID, PATIENT_ID, os_event[int8], os_time_months[float32])
 """
 
+import sys
 import pandas as pd
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.cbio_bundle import study_files
+from src.instrument import RunReport, nbytes
+
+run = RunReport.start(__file__)
+
 mb_dir = Path("data_raw/metabric/cbioportal")
 
-# 1) locate sample-level clinical file
-cands = sorted([p for p in mb_dir.glob("data_clinical_sample*") if p.suffix.lower() in {".txt", ".tsv"}])
-assert len(cands) >= 1, f"No METABRIC sample clinical file found in {mb_dir}"
+# 1) locate sample-level clinical file (extracted, else inside the study .tar.gz)
+cands = [p for p in study_files("data_clinical_sample*", mb_dir) if p.suffix.lower() in {".txt", ".tsv"}]
+assert len(cands) >= 1, f"No METABRIC sample clinical file found in {mb_dir} (or its .tar.gz)"
 samp_path = cands[0]
 print("Using sample clinical file:", samp_path.name)
 
 # 2) read (skip lines starting with '#')
-samp_raw = pd.read_csv(samp_path, sep="\t", comment="#", dtype=str)
+with run.stage("read_samples") as st, samp_path.open("rb") as fh:
+    samp_raw = pd.read_csv(fh, sep="\t", comment="#", dtype=str)
+    st.rows = len(samp_raw)
 
 def find_col(df, names):
     cols = {c.lower().replace(".", "_").replace(" ", "_"): c for c in df.columns}
@@ -46,10 +55,14 @@ sample_map = samp_raw[[col_sample, col_patient]].rename(columns={
 clin = pd.read_csv("data_proc/metabric_clinical_core.tsv", sep="\t")
 
 # 4) join sample→patient→OS
-samp_surv = (sample_map.merge(clin, on="PATIENT_ID", how="inner")
-                        .drop_duplicates(subset=["SAMPLE_ID"]))
+with run.stage("join") as st:
+    samp_surv = (sample_map.merge(clin, on="PATIENT_ID", how="inner")
+                            .drop_duplicates(subset=["SAMPLE_ID"]))
+    st.rows = len(sample_map)
 
-samp_surv.to_csv("data_proc/metabric_sample_survival.tsv", sep="\t", index=False)
+with run.stage("write") as st:
+    samp_surv.to_csv("data_proc/metabric_sample_survival.tsv", sep="\t", index=False)
+    st.rows, st.bytes = len(samp_surv), nbytes("data_proc/metabric_sample_survival.tsv")
 print("wrote: data_proc/metabric_sample_survival.tsv  shape:", samp_surv.shape)
 print("unique patients:", samp_surv["PATIENT_ID"].nunique(), 
       "| unique samples:", samp_surv["SAMPLE_ID"].nunique())
@@ -2,9 +2,19 @@
 """
 Sanity diagnostics for Phase 2 artifacts.
 """
+import sys
 import pandas as pd
-m = pd.read_csv("data_proc/tcga_file_metadata.tsv", sep="\t")
-j = pd.read_csv("data_proc/tcga_survival_join.tsv", sep="\t")
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.instrument import RunReport, nbytes
+
+run = RunReport.start(__file__)
+with run.stage("read") as st:
+    m = pd.read_csv("data_proc/tcga_file_metadata.tsv", sep="\t")
+    j = pd.read_csv("data_proc/tcga_survival_join.tsv", sep="\t")
+    st.rows = len(m) + len(j)
+    st.bytes = nbytes("data_proc/tcga_file_metadata.tsv", "data_proc/tcga_survival_join.tsv")
 
 print("metadata sample_type counts:")
 print(m["sample_type"].value_counts(dropna=False).head(10))
@@ -7,8 +7,26 @@ Inputs:
 
 Output:
   - data_proc/tcga_file_metadata.tsv
+
+Batches of 200 file ids go out concurrently through src/gdc_client.py (retry/backoff,
+pagination, response cache under data_proc/cache/gdc: a re-run makes no requests).
+Offline: start `python -m src.gdc_stub --table ...` and pass --base-url.
 """
-import pandas as pd, requests, json, math, pathlib
+import argparse, sys
+import pandas as pd, pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from src.gdc_client import DEFAULT_CACHE, FILE_FIELDS, GDC_API, fetch_file_metadata, file_metadata_table
+from src.instrument import RunReport, nbytes
+
+ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+ap.add_argument("--base-url", default=GDC_API, help="GDC API root (or a local stand-in)")
+ap.add_argument("--concurrency", type=int, default=8, help="requests in flight")
+ap.add_argument("--batch-size", type=int, default=200, help="file ids per request")
+ap.add_argument("--cache", action=argparse.BooleanOptionalAction, default=True, help="use the response cache")
+ap.add_argument("--refresh", action="store_true", help="refetch and overwrite cached responses")
+args = ap.parse_args()
+run = RunReport.start(__file__)
 
 manifest_path = pathlib.Path("data_raw/gdc/manifest_tcga_brca_star_counts_primary.txt")
 out_path = pathlib.Path("data_proc/tcga_file_metadata.tsv")
@@ -17,41 +35,18 @@ out_path.parent.mkdir(parents=True, exist_ok=True)
 # read file UUIDs from manifest (first column is 'id')
 ids = pd.read_csv(manifest_path, sep="\t")["id"].tolist()
 
-fields = [
-    "file_id","file_name","data_category","data_type","experimental_strategy",
-    "analysis.workflow_type","cases.samples.sample_type","cases.samples.sample_type_id",
-    "cases.case_id","cases.submitter_id"
-]
-url = "https://api.gdc.cancer.gov/files"
-rows = []
-BATCH = 200
-
-for i in range(0, len(ids), BATCH):
-    chunk = ids[i:i+BATCH]
-    payload = {
-        "filters": {"op":"in","content":{"field":"files.file_id","value":chunk}},
-        "format": "JSON",
-        "fields": ",".join(fields),
-        "size": BATCH
-    }
-    r = requests.post(url, headers={"Content-Type":"application/json"}, data=json.dumps(payload), timeout=120)
-    r.raise_for_status()
-    for hit in r.json()["data"]["hits"]:
-        rows.append({
-            "file_id": hit.get("file_id"),
-            "file_name": hit.get("file_name"),
-            "data_category": hit.get("data_category"),
-            "data_type": hit.get("data_type"),
-            "experimental_strategy": hit.get("experimental_strategy"),
-            "workflow_type": (hit.get("analysis") or {}).get("workflow_type"),
-            "sample_type": ((hit.get("cases") or [{}])[0].get("samples") or [{}])[0].get("sample_type"),
-            "sample_type_id": ((hit.get("cases") or [{}])[0].get("samples") or [{}])[0].get("sample_type_id"),
-            "case_id": ((hit.get("cases") or [{}])[0]).get("case_id"),
-            "submitter_id": ((hit.get("cases") or [{}])[0]).get("submitter_id"),
-        })
-
-meta = pd.DataFrame(rows)
-meta.to_csv(out_path, sep="\t", index=False)
+with run.stage("fetch") as st:
+    hits, stats = fetch_file_metadata(ids, FILE_FIELDS, base_url=args.base_url, concurrency=args.concurrency,
+                                      batch_size=args.batch_size, refresh=args.refresh,
+                                      cache_dir=DEFAULT_CACHE if args.cache else None)
+    st.rows = len(hits)
+print(f"fetched {len(hits)} hits for {len(ids)} ids in {st.wall_s:.1f}s |",
+      f"requests: {stats['requests']}, cache hits: {stats['cache_hits']}, retries: {stats['retries']}")
+
+with run.stage("write") as st:
+    meta = file_metadata_table(hits)
+    meta.to_csv(out_path, sep="\t", index=False)
+    st.rows, st.bytes = len(meta), nbytes(out_path)
 print("wrote", out_path, "shape", meta.shape)
 print(meta.groupby(["sample_type","workflow_type","data_type"]).size().sort_values(ascending=False).head(10))
 print(meta['sample_type_id'].value_counts())  # expect '01' > '11' > '06' tiny
@@ -8,7 +8,7 @@ Prepare METABRIC expression:
   - Save parquet (float32) and a text list of matched sample IDs
 
 Inputs:
-  - data_raw/cbioportal/data_mrna_illumina_microarray.txt
+  - data_raw/cbioportal/data_mrna_illumina_microarray.txt (or straight from brca_metabric.tar.gz)
   - data_proc/metabric_sample_survival.tsv
 
 Outputs:
@@ -16,20 +16,29 @@ Outputs:
   - data_proc/metabric_matched_samples.txt
 """
 
+import sys
 import pandas as pd
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.cbio_bundle import study_files
+from src.instrument import RunReport
+
+run = RunReport.start(__file__)
+
 mb_dir = Path("data_raw/metabric/cbioportal")
 
 # 1) Find the RAW microarray expression file (not the z-scores one)
-expr_candidates = sorted([p for p in mb_dir.glob("data_mrna*microarray*.txt")
-                          if "zscore" not in p.name.lower()])
-assert expr_candidates, f"No raw microarray expression file found in {mb_dir}"
+expr_candidates = [p for p in study_files("data_mrna*microarray*.txt", mb_dir)
+                   if "zscore" not in p.name.lower()]
+assert expr_candidates, f"No raw microarray expression file found in {mb_dir} (or its .tar.gz)"
 expr_path = expr_candidates[0]
 print("Using expression file:", expr_path.name)
 
 # 2) Read only the header row (cheap)
-cols = list(pd.read_csv(expr_path, sep="\t", comment="#", nrows=0).columns)
+with run.stage("read_header") as st, expr_path.open("rb") as fh:
+    cols = list(pd.read_csv(fh, sep="\t", comment="#", nrows=0).columns)
+    st.rows = len(cols)
 
 # 3) Separate gene/meta columns vs sample columns
 meta_like = {"HUGO_SYMBOL","GENE_SYMBOL","GENE","ENTREZ_GENE_ID","ENTREZ_GENE_IDS"}
@@ -40,13 +49,15 @@ print(f"Total columns: {len(cols)} | gene/meta: {len(gene_meta_cols)} | sample c
 print("Gene/meta columns guessed:", gene_meta_cols)
 
 # 4) Compare against our survival table SAMPLE_IDs
-samp_surv = pd.read_csv("data_proc/metabric_sample_survival.tsv", sep="\t")
-expr_samples = set(map(str, sample_cols))
-surv_samples = set(map(str, samp_surv["SAMPLE_ID"]))
+with run.stage("match_samples") as st:
+    samp_surv = pd.read_csv("data_proc/metabric_sample_survival.tsv", sep="\t")
+    expr_samples = set(map(str, sample_cols))
+    surv_samples = set(map(str, samp_surv["SAMPLE_ID"]))
 
-inter = expr_samples & surv_samples
-miss_in_expr = surv_samples - expr_samples   # samples we have labels for but no expression
-miss_in_surv = expr_samples - surv_samples   # samples in matrix but no labels
+    inter = expr_samples & surv_samples
+    miss_in_expr = surv_samples - expr_samples   # samples we have labels for but no expression
+    miss_in_surv = expr_samples - surv_samples   # samples in matrix but no labels
+    st.rows = len(samp_surv)
 
 print("Matched samples:", len(inter))
 print("Missing in expression (should be ~0):", len(miss_in_expr))
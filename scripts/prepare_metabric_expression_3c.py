@@ -7,70 +7,55 @@
 # 3C-1) Pick columns to read (header-only, zero risk)
 
 
+import sys
 import pandas as pd, numpy as np
 from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from src.cbio_bundle import study_files
+from src.cbio_utils import read_cbio_expression
+from src.preprocess.collapse import collapse_duplicates
+from src.instrument import RunReport, nbytes
+
+run = RunReport.start(__file__)
+
 mb_dir = Path("data_raw/metabric/cbioportal")
-expr_candidates = sorted([p for p in mb_dir.glob("data_mrna*microarray*.txt")
-                          if "zscore" not in p.name.lower()])
-assert expr_candidates, f"No raw microarray expression file found in {mb_dir}"
+expr_candidates = [p for p in study_files("data_mrna*microarray*.txt", mb_dir)
+                   if "zscore" not in p.name.lower()]
+assert expr_candidates, f"No raw microarray expression file found in {mb_dir} (or its .tar.gz)"
 expr_path = expr_candidates[0]
 print("Using expression file:", expr_path.name)
 
-# read header only
-all_cols = list(pd.read_csv(expr_path, sep="\t", comment="#", nrows=0).columns)
-
-# gene/meta columns often look like this
-meta_like = {"HUGO_SYMBOL","GENE_SYMBOL","GENE","ENTREZ_GENE_ID","ENTREZ_GENE_IDS"}
-gene_meta_cols = [c for c in all_cols if c.upper().replace(".","_").replace(" ","_") in meta_like]
-
-# our matched sample list from 3B-3
+# our matched sample list from 3B-3 (the reader projects the header down to these)
 keep_samples = pd.read_csv("data_proc/metabric_matched_samples.txt")["SAMPLE_ID"].tolist()
-cols_set = set(all_cols)
-keep_samples = [c for c in keep_samples if c in cols_set]  # intersection, preserves order
-
-usecols = gene_meta_cols + keep_samples
-print(f"Meta cols: {gene_meta_cols}")
-print(f"Samples to load: {len(keep_samples)} / header samples {len(all_cols) - len(gene_meta_cols)}")
 
 
 
 
 # 3C-2) Load just those columns (memory-friendly)
 
-# build dtype map: strings for gene cols, float32 for expression
-dtype_map = {c: "string" for c in gene_meta_cols}
-for c in keep_samples: dtype_map[c] = np.float32
-
-expr_df = pd.read_csv(
-    expr_path, sep="\t", comment="#",
-    usecols=usecols, dtype=dtype_map,
-    na_values=["NA","na","NaN","#N/A","null","NULL"]
-)
-print("raw expr_df shape:", expr_df.shape)
-print(expr_df.head(2))
-
-
+# pyarrow block parser, projected to symbol + matched samples, straight to float32;
+# symbols stripped/uppercased and empty/NA symbol rows dropped (src/cbio_utils.py)
+# (one pass over the file: the header is sniffed from the same stream)
+with run.stage("read_expression") as st, expr_path.open("rb") as fh:
+    X, parse_stats = read_cbio_expression(fh, samples=keep_samples)
+    st.rows, st.bytes = len(X), parse_stats["bytes"]
+print(f"Meta cols: {parse_stats['meta_cols']} | symbol column: {parse_stats['symbol_col']}")
+print(f"Samples to load: {parse_stats['samples']} / header samples {parse_stats['header_samples']}")
+print("raw expr shape:", X.shape, "| parse MB/s:", round(parse_stats["mb_per_s"], 1),
+      f"({parse_stats['bytes'] / 1e6:.1f} MB in {parse_stats['seconds']:.2f}s)")
+print(X.iloc[:2, :5])
 
 
 
-# 3C-3) Clean gene symbols & collapse duplicates
 
-# decide which column is the symbol
-cands = [c for c in gene_meta_cols if c.lower().startswith(("hugo","gene"))]
-assert cands, f"Could not find a gene symbol column among {gene_meta_cols}"
-sym_col = cands[0]
 
-# basic cleaning
-expr_df[sym_col] = expr_df[sym_col].astype("string").str.strip().str.upper()
-expr_df = expr_df.dropna(subset=[sym_col])
-expr_df = expr_df[expr_df[sym_col] != ""]  # drop empty symbol rows
+# 3C-3) Collapse duplicate symbols
 
-# separate numeric matrix
-X = expr_df.drop(columns=[c for c in gene_meta_cols if c != sym_col]).copy()
-X = X.rename(columns={sym_col: "SYMBOL"})
-# groupby SYMBOL and take median across samples
-Xg = (X.groupby("SYMBOL", as_index=True)
-        .median(numeric_only=True))
+# median across duplicate-symbol rows (same result as groupby("SYMBOL").median())
+with run.stage("collapse") as st:
+    Xg = collapse_duplicates(X, "median")
+    st.rows, st.bytes = len(X), nbytes(X)
 
 print("post-collapse shape (genes x samples):", Xg.shape)
 # drop genes that are entirely NA after collapse
@@ -95,7 +80,9 @@ print("in-memory size ~", round(mem_mb, 1), "MB")
 # 3C-4) Save compact matrix + aligned labels (no leakage)
 # write expression as Parquet (fast I/O, smaller on disk)
 out_expr = Path("data_proc/metabric_expr_raw.parquet")
-Xg.to_parquet(out_expr, index=True)
+with run.stage("write_parquet") as st:
+    Xg.to_parquet(out_expr, index=True)
+    st.rows, st.bytes = len(Xg), nbytes(Xg)
 print("saved:", out_expr, "size (MB) ~", round(out_expr.stat().st_size / 1e6, 1))
 
 # build labels aligned to columns order (sample axis)
@@ -106,7 +93,9 @@ labels = (samp_surv.set_index("SAMPLE_ID")
                     .rename(columns={"index":"SAMPLE_ID"}))
 
 out_lab = Path("data_proc/metabric_labels.tsv")
-labels.to_csv(out_lab, sep="\t", index=False)
+with run.stage("write_labels") as st:
+    labels.to_csv(out_lab, sep="\t", index=False)
+    st.rows, st.bytes = len(labels), nbytes(out_lab)
 print("saved labels:", out_lab, "shape:", labels.shape)
 
 # final sanity: sets must match perfectly
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the ingest, normalization and alignment path on synthetic data.
+
+Data: src/synthetic.py trees under data_proc/bench/<label>/ (label = scale, e.g. "1k",
+or "<samples>x<genes>"), generated on first use and reused while synthetic.json
+matches the requested size. The clinical core and join scripts run once (untimed)
+so the counts build has its inputs.
+
+Benchmarks (each run --repeat times; the fastest repeat is kept):
+  read_star_counts     read_star_counts() over the first --star-files STAR files
+  assemble_counts      scripts/3d_c_build_tcga_counts.py in a subprocess (--no-cache);
+                       its own stages are folded in as assemble_counts/<stage>
+  logcpm               logcpm() on the assembled counts
+  read_microarray      read_cbio_expression() on the METABRIC-like matrix
+  collapse             collapse_duplicates(..., "median") on the microarray
+  align                align_cohorts() of logCPM TCGA and collapsed METABRIC (fresh registry)
+  zscale               ZScaler fit on TCGA + float32 transform of both cohorts
+
+Results are a src/instrument.py run report (data_proc/.runs/bench_<label>/). The
+first run of a label saves data_proc/bench/baseline-<label>.json; later runs are
+diffed against it stage by stage and exit 1 when a stage is slower (or uses more
+peak memory) than --threshold x the baseline. --save-baseline replaces it.
+
+CLI (run from the repo root):
+  python -m src.bench --scale 1k [--genes 60660] [--repeat 3] [--star-files 100] [--workers 1]
+  python -m src.bench --samples 200 --genes 20000 --save-baseline
+"""
+
+import argparse, gc, json, os, shutil, subprocess, sys, tempfile
+import pandas as pd
+from pathlib import Path
+
+from src.cbio_utils import read_cbio_expression
+from src.instrument import RunReport, print_report, load_report, list_runs, nbytes, print_diff
+from src.preprocess.collapse import collapse_duplicates
+from src.preprocess.gene_registry import GeneRegistry, align_cohorts
+from src.preprocess.normalize import logcpm
+from src.preprocess.scaler import ZScaler
+from src.star_utils import read_star_counts
+from src.synthetic import MANIFEST, MB_DIR, N_GENES, SCALES, STAR_DIR, generate
+
+BENCH_ROOT = Path("data_proc/bench")
+SCRIPTS = Path(__file__).resolve().parents[1] / "scripts"
+
+
+def ensure_data(root, n_samples, n_genes, seed=0, workers=1):
+    """Synthetic tree for this size (regenerated when synthetic.json does not match)."""
+    info_path = root / "synthetic.json"
+    if info_path.exists():
+        with open(info_path) as fh:
+            info = json.load(fh)
+        if (info["samples"], info["genes"], info["seed"]) == (n_samples, n_genes, seed):
+            return info
+        shutil.rmtree(root)
+    print(f"generating {n_samples} samples x {n_genes} genes under {root} ...", flush=True)
+    root.mkdir(parents=True, exist_ok=True)
+    return generate(root, n_samples, n_genes, seed=seed, workers=workers)
+
+
+def run_script(name, root, *args, report_dir=None):
+    """Run scripts/<name>.py with cwd=root -> its run report (None when report_dir is None)."""
+    env = {**os.environ, "RUN_REPORT_DIR": str(report_dir) if report_dir else ""}
+    proc = subprocess.run([sys.executable, str(SCRIPTS / f"{name}.py"), *args], cwd=root, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{name}.py failed:\n{proc.stdout[-2000:]}\n{proc.stderr[-2000:]}")
+    return load_report(list_runs(name, report_dir)[-1]) if report_dir else None
+
+
+def best_of(run, name, repeat, fn):
+    """fn(stage) `repeat` times, each in its own stage; the fastest record and its output are kept."""
+    recs, best, best_out = [], None, None
+    for _ in range(repeat):
+        out = None
+        gc.collect()
+        with run.stage(name) as st:
+            out = fn(st)
+        recs.append(st)
+        if best is None or st.wall_s < best.wall_s:
+            best, best_out = st, out    # slower repeats' outputs are dropped right away
+    run.stages = [s for s in run.stages if s is best or all(s is not r for r in recs)]
+    return best_out, best
+
+
+def run_benchmarks(root, run, repeat=3, star_files=100, workers=1):
+    """Time every benchmark on the tree at `root` into `run` (see module docstring)."""
+    manifest = pd.read_csv(root / MANIFEST, sep="\t")
+    star_paths = [root / STAR_DIR / i / f for i, f in zip(manifest["id"], manifest["filename"])][:star_files]
+
+    def read_star(st):
+        for p in star_paths:
+            s = read_star_counts(p)
+        st.rows, st.bytes = len(s) * len(star_paths), nbytes(*star_paths)
+    best_of(run, "read_star_counts", repeat, read_star)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def assemble(st):
+            rep = run_script("3d_c_build_tcga_counts", root, "--no-cache", "--workers", str(workers),
+                             report_dir=Path(tmp) / str(len(os.listdir(tmp))))
+            st.rows, st.bytes = len(manifest), int(manifest["size"].sum())
+            return rep
+        rep, st = best_of(run, "assemble_counts", repeat, assemble)
+        st.peak_rss_mb, st.peak_scope = rep["peak_rss_mb"], "subprocess"     # the script's peak, not ours
+        run.adopt(rep, "assemble_counts")
+
+    Xc = pd.read_parquet(root / "data_proc/tcga_counts_raw.parquet")
+
+    def norm(st):
+        st.rows, st.bytes = len(Xc), nbytes(Xc)
+        return logcpm(Xc)
+    X_tcga, _ = best_of(run, "logcpm", repeat, norm)
+    del Xc
+
+    expr = root / MB_DIR / "data_mrna_illumina_microarray.txt"
+
+    def read_mb(st):
+        X, stats = read_cbio_expression(expr)
+        st.rows, st.bytes = len(X), stats["bytes"]
+        return X
+    X_mb, _ = best_of(run, "read_microarray", repeat, read_mb)
+
+    def collapse(st):
+        st.rows, st.bytes = len(X_mb), nbytes(X_mb)
+        return collapse_duplicates(X_mb, "median")
+    X_mb, _ = best_of(run, "collapse", repeat, collapse)
+
+    def align(st):
+        st.rows, st.bytes = len(X_tcga) + len(X_mb), nbytes(X_tcga, X_mb)
+        return align_cohorts(GeneRegistry(), X_tcga, X_mb)[0]
+    (tcga_a, mb_a), _ = best_of(run, "align", repeat, align)
+
+    def zscale(st):
+        st.rows, st.bytes = len(tcga_a), nbytes(tcga_a, mb_a)
+        scaler = ZScaler(eps=1e-6).fit(tcga_a)
+        return scaler.transform(tcga_a), scaler.transform(mb_a)
+    best_of(run, "zscale", repeat, zscale)
+    return run
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Synthetic-data benchmarks (see module docstring).")
+    ap.add_argument("--scale", choices=list(SCALES), default="1k")
+    ap.add_argument("--samples", type=int, default=None, help="overrides --scale")
+    ap.add_argument("--genes", type=int, default=N_GENES, help="rows per synthetic STAR file")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--root", type=Path, default=BENCH_ROOT)
+    ap.add_argument("--repeat", type=int, default=3, help="runs per benchmark (fastest kept)")
+    ap.add_argument("--star-files", type=int, default=100, help="files timed by read_star_counts")
+    ap.add_argument("--workers", type=int, default=1, help="3d_c parser processes / generator processes")
+    ap.add_argument("--baseline", type=Path, default=None, help="default: <root>/baseline-<label>.json")
+    ap.add_argument("--save-baseline", action="store_true", help="replace the baseline with this run")
+    ap.add_argument("--threshold", type=float, default=1.25, help="flag stages slower than this x baseline")
+    ap.add_argument("--min-seconds", type=float, default=0.5)
+    ap.add_argument("--min-mb", type=float, default=50.0)
+    args = ap.parse_args(argv)
+
+    n = args.samples or SCALES[args.scale]
+    label = args.scale if args.samples is None and args.genes == N_GENES else f"{n}x{args.genes}"
+    data = args.root / label
+    info = ensure_data(data, n, args.genes, args.seed, args.workers)
+    print(f"data: {data} | {info['samples']} x {info['genes']} STAR, "
+          f"{info['metabric_samples']} x {info['metabric_probes']} microarray", flush=True)
+    for name in ("build_tcga_clinical_core", "join_tcga_clinical_counts"):
+        run_script(name, data)
+
+    run = RunReport(f"bench_{label}")
+    run_benchmarks(data, run, args.repeat, args.star_files, args.workers)
+    path = run.write()
+    current = load_report(path)
+    print_report(current)
+    print("report:", path)
+
+    baseline = args.baseline or args.root / f"baseline-{label}.json"
+    if args.save_baseline or not baseline.exists():
+        shutil.copyfile(path, baseline)
+        print("saved baseline:", baseline)
+        return 0
+    base = load_report(baseline)
+    return 1 if print_diff(base, current, args.threshold, args.min_seconds, args.min_mb) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
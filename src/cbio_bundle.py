@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+"""
+Read cBioPortal study files straight out of the downloaded .tar.gz (no extraction).
+
+StudyBundle(path)
+  - .members -> pd.DataFrame (member, name, offset, size): one row per regular file;
+    offset is where the member's bytes start in the uncompressed tar stream
+  - The member index is built with one pass over the archive and saved next to it
+    (<bundle>.index.json, keyed by the tarball's size + mtime), so later opens go
+    straight to a member without walking tar headers
+  - .open(member) -> binary file object limited to that member's bytes
+  - .iter_members(members) -> (member, file object) in archive order, one pass for
+    several members; decompression stops after the last one requested
+  - Random access: with the optional `indexed_gzip` package a gzip seek-point index
+    (<bundle>.gzidx) is saved too and open() only inflates from the nearest seek point;
+    with the stdlib, open() inflates (but does not write or parse) everything before
+    the member
+
+study_files(pattern, mb_dir=DEFAULT_DIR, bundle=DEFAULT_BUNDLE) -> list
+  - Extracted files matching `pattern` in mb_dir if there are any, else the matching
+    tarball members (BundleMember: .name, .suffix, .size, .open("rb") like pathlib.Path)
+
+CLI (run from the repo root):
+  python -m src.cbio_bundle list [--bundle PATH] [--rebuild]
+"""
+
+import argparse, fnmatch, gzip, io, json, os, sys, tarfile
+import pandas as pd
+from pathlib import Path, PurePosixPath
+
+try:
+    import indexed_gzip
+except ImportError:  # stdlib gzip: members are reached by inflating from the start
+    indexed_gzip = None
+
+DEFAULT_DIR = Path("data_raw/metabric/cbioportal")
+DEFAULT_BUNDLE = DEFAULT_DIR / "brca_metabric.tar.gz"
+
+INDEX_VERSION = 1
+SEEK_SPACING = 4 << 20   # uncompressed bytes between gzip seek points (indexed_gzip only)
+
+
+class _MemberReader(io.RawIOBase):
+    """Raw stream over `size` bytes of an already positioned file object."""
+
+    def __init__(self, fh, size):
+        self._fh, self._left, self._pos = fh, size, 0
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def readinto(self, b):
+        n = min(len(b), self._left)
+        if n <= 0:
+            return 0
+        data = self._fh.read(n)
+        b[:len(data)] = data
+        self._left -= len(data)
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._fh.close()
+        super().close()
+
+
+class _Unclosed:
+    """Shares one decompressed stream between members (closing a member keeps it open)."""
+
+    def __init__(self, fh):
+        self._fh = fh
+
+    def read(self, n):
+        return self._fh.read(n)
+
+    def close(self):
+        pass
+
+
+class BundleMember:
+    """One study file inside a bundle; quacks like the pathlib.Path the scripts glob for."""
+
+    def __init__(self, bundle, member, size):
+        self.bundle, self.member, self.size = bundle, member, size
+        self.name = PurePosixPath(member).name
+        self.suffix = PurePosixPath(member).suffix
+
+    def open(self, mode="rb"):
+        if mode != "rb":
+            raise ValueError("bundle members are opened as binary streams (mode='rb')")
+        return self.bundle.open(self.member)
+
+    def __repr__(self):
+        return f"BundleMember({self.bundle.path.name}:{self.member})"
+
+
+class StudyBundle:
+    """Member index + readers for one cBioPortal .tar.gz (see module docstring)."""
+
+    def __init__(self, path=DEFAULT_BUNDLE, rebuild=False):
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + ".index.json")
+        self.gzidx_path = self.path.with_name(self.path.name + ".gzidx")
+        self.members = self._load_index(rebuild)
+        self._by_member = self.members.set_index("member")
+
+    def _stamp(self):
+        st = self.path.stat()
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    def _gzip(self):
+        if indexed_gzip is None:
+            return gzip.open(self.path, "rb")
+        fh = indexed_gzip.IndexedGzipFile(str(self.path), spacing=SEEK_SPACING)
+        if self.gzidx_path.exists():
+            fh.import_index(str(self.gzidx_path))
+        return fh
+
+    def _load_index(self, rebuild):
+        if not rebuild and self.index_path.exists():
+            with open(self.index_path) as fh:
+                meta = json.load(fh)
+            if meta.get("version") == INDEX_VERSION and meta.get("stamp") == self._stamp():
+                return pd.DataFrame(meta["members"], columns=["member", "name", "offset", "size"])
+        return self.build_index()
+
+    def build_index(self):
+        """One pass over the archive: record every regular member's offset and size."""
+        rows = []
+        with self._gzip() as gz, tarfile.open(fileobj=gz, mode="r|") as tar:
+            for ti in tar:
+                if ti.isfile():
+                    rows.append({"member": ti.name, "name": PurePosixPath(ti.name).name,
+                                 "offset": ti.offset_data, "size": ti.size})
+            if indexed_gzip is not None:
+                gz.build_full_index()
+                gz.export_index(str(self.gzidx_path))
+        meta = {"version": INDEX_VERSION, "stamp": self._stamp(), "members": rows}
+        tmp = self.index_path.with_name(f"{self.index_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as fh:
+            json.dump(meta, fh, indent=1)
+        os.replace(tmp, self.index_path)
+        return pd.DataFrame(rows, columns=["member", "name", "offset", "size"])
+
+    def find(self, pattern):
+        """Members whose file name (not path) matches a glob pattern, sorted by name."""
+        hit = self.members[[fnmatch.fnmatchcase(n, pattern) for n in self.members["name"]]]
+        return [BundleMember(self, m, int(s)) for m, s in
+                hit.sort_values("name")[["member", "size"]].itertuples(index=False)]
+
+    def open(self, member):
+        """Binary file object over one member's bytes (seeks the decompressed stream)."""
+        row = self._by_member.loc[member]
+        gz = self._gzip()
+        gz.seek(int(row["offset"]))
+        return io.BufferedReader(_MemberReader(gz, int(row["size"])))
+
+    def iter_members(self, members):
+        """Yield (member, file object) for several members in archive order, in one pass.
+
+        Read each file object before advancing: they share one decompressed stream.
+        """
+        rows = self._by_member.loc[list(members)].sort_values("offset")
+        with self._gzip() as gz:
+            for member, row in rows.iterrows():
+                gz.seek(int(row["offset"]))   # forward only: skips the bytes in between
+                yield member, io.BufferedReader(_MemberReader(_Unclosed(gz), int(row["size"])))
+
+
+def study_files(pattern, mb_dir=DEFAULT_DIR, bundle=DEFAULT_BUNDLE):
+    """Extracted files matching `pattern` if present, else matching members of the bundle."""
+    found = sorted(Path(mb_dir).glob(pattern))
+    if found or not Path(bundle).exists():
+        return found
+    return StudyBundle(bundle).find(pattern)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="List (and index) the members of a cBioPortal study bundle.")
+    ap.add_argument("command", choices=["list"])
+    ap.add_argument("--bundle", type=Path, default=DEFAULT_BUNDLE)
+    ap.add_argument("--rebuild", action="store_true", help="rebuild the member index")
+    args = ap.parse_args(argv)
+
+    b = StudyBundle(args.bundle, rebuild=args.rebuild)
+    print("bundle:", b.path, "| index:", b.index_path.name,
+          "| seek points:", "indexed_gzip" if indexed_gzip is not None else "none (stdlib gzip)")
+    print(b.members.assign(MB=(b.members["size"] / 1e6).round(2))[["member", "offset", "MB"]].to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
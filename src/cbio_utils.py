@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""
+Readers for cBioPortal study files (METABRIC and any other cBioPortal study).
+
+read_cbio_expression(src, samples=None, engine="auto") -> (pd.DataFrame, dict)
+  - Any cBioPortal expression matrix (microarray, z-scores, RNA-seq): a gene symbol
+    column (Hugo_Symbol / Gene_Symbol / Gene), optional Entrez_Gene_Id, then one
+    column per sample; leading '#' lines are skipped
+  - Column projection: only the symbol column and the requested `samples` are parsed
+    (samples missing from the header are dropped; columns keep file order; None = all)
+  - Values land in one float32 (genes × samples) array; symbols are cleaned on the
+    gene column only (strip, upper) and rows with a missing/empty symbol are dropped
+  - Returns the un-collapsed matrix (index "SYMBOL", may repeat; see
+    src/preprocess/collapse.py) and parse stats: bytes, rows, seconds, mb_per_s
+  - `src` is a path (.txt/.tsv, optionally .gz) or a binary file object such as a
+    tar member, so a study does not need to be extracted first
+
+expression_header(src) -> (skip, header tuple)
+expression_columns(header) -> (symbol column, [gene/meta columns], [sample columns])
+
+Engines:
+  - "pyarrow": streaming multithreaded block parser; record batches are copied
+    straight into the preallocated float32 array (grown in place when needed)
+  - "pandas":  C parser with usecols (fallback when pyarrow is missing)
+  - "auto":    pyarrow if importable, else pandas
+  Both engines return identical frames: the same NA tokens (pandas defaults plus
+  cBioPortal's), values parsed as float64 then cast to float32.
+"""
+
+import gzip, io, time
+import pandas as pd, numpy as np
+from pathlib import Path
+
+from src.star_utils import NA_TOKENS, resolve_engine
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # pandas engine only
+    pa = pacsv = None
+
+# gene/meta columns of cBioPortal expression files (normalized: upper, '.'/' ' -> '_')
+META_LIKE = {"HUGO_SYMBOL", "GENE_SYMBOL", "GENE", "ENTREZ_GENE_ID", "ENTREZ_GENE_IDS"}
+
+# extra missing-value tokens seen in cBioPortal files, on top of pandas' defaults
+CBIO_NA = ["NA", "na", "NaN", "#N/A", "null", "NULL"]
+EXPR_NA = sorted(set(NA_TOKENS) | set(CBIO_NA))
+
+# the header must fit in the first buffer we peek at (METABRIC: ~2k samples, ~25 KB)
+_PEEK = 1 << 22
+
+
+def _norm(c):
+    return c.upper().replace(".", "_").replace(" ", "_")
+
+
+def _buffered(src):
+    """Open `src` as a buffered binary stream that can peek at least _PEEK bytes."""
+    if isinstance(src, (str, Path)):
+        if str(src).endswith(".gz"):
+            return io.BufferedReader(gzip.open(src, "rb"), buffer_size=_PEEK)
+        return open(src, "rb", buffering=_PEEK)
+    return io.BufferedReader(src, buffer_size=_PEEK)
+
+
+def _sniff(fh):
+    head = fh.peek(_PEEK)
+    skip = 0
+    for line in head.split(b"\n")[:-1]:        # last piece may be a partial line
+        if line.startswith(b"#"):
+            skip += 1
+            continue
+        return skip, tuple(line.rstrip(b"\r").decode().split("\t"))
+    raise ValueError("No complete header line in the first "
+                     f"{_PEEK >> 20} MB (comment block or header too long)")
+
+
+def expression_header(src):
+    """Return (number of leading '#' lines, header column tuple)."""
+    with _buffered(src) as fh:
+        return _sniff(fh)
+
+
+def expression_columns(header):
+    """Split a header into (symbol column, gene/meta columns, sample columns)."""
+    meta = [c for c in header if _norm(c) in META_LIKE]
+    cands = [c for c in meta if c.lower().startswith(("hugo", "gene"))]
+    if not cands:
+        raise ValueError(f"Could not find a gene symbol column among {meta or list(header)[:5]}")
+    return cands[0], meta, [c for c in header if c not in meta]
+
+
+def _clean_symbols(sym):
+    # strip + upper on the gene column only; missing/empty symbols -> dropped rows
+    sym = pd.Series(sym, dtype="string").str.strip().str.upper()
+    keep = (sym.notna() & (sym != "")).to_numpy(dtype=bool)
+    return pd.Index(sym[keep], name="SYMBOL"), keep
+
+
+def _read_pyarrow(fh, skip, sym_col, samples, block_size):
+    read = pacsv.ReadOptions(skip_rows=skip, use_threads=True, block_size=block_size)
+    parse = pacsv.ParseOptions(delimiter="\t")
+    types = {c: pa.float64() for c in samples}
+    types[sym_col] = pa.string()
+    convert = pacsv.ConvertOptions(include_columns=[sym_col] + samples, column_types=types,
+                                   null_values=EXPR_NA, strings_can_be_null=True)
+    reader = pacsv.open_csv(fh, read_options=read, parse_options=parse, convert_options=convert)
+
+    out = np.empty((0, len(samples)), dtype=np.float32)
+    syms, n = [], 0
+    for batch in reader:
+        k = batch.num_rows
+        if n + k > out.shape[0]:
+            out.resize((max(2 * out.shape[0], n + k), len(samples)), refcheck=False)
+        for j in range(len(samples)):
+            out[n:n + k, j] = batch.column(j + 1).to_numpy(zero_copy_only=False)
+        syms.append(batch.column(0))
+        n += k
+    out.resize((n, len(samples)), refcheck=False)
+    sym = pa.chunked_array(syms, pa.string()).to_pandas() if syms else []
+    return sym, out
+
+
+def _read_pandas(fh, sym_col, samples):
+    dtype = {c: np.float64 for c in samples}
+    dtype[sym_col] = "string"
+    df = pd.read_csv(fh, sep="\t", comment="#", usecols=[sym_col] + samples, dtype=dtype,
+                     na_values=CBIO_NA, engine="c")
+    return df[sym_col], df[samples].to_numpy(dtype=np.float32)
+
+
+def read_cbio_expression(src, samples=None, engine="auto", block_size=1 << 24):
+    """Parse a cBioPortal expression matrix -> (genes × samples float32 DataFrame, stats)."""
+    t0 = time.perf_counter()
+    with _buffered(src) as fh:
+        skip, header = _sniff(fh)
+        sym_col, meta_cols, all_samples = expression_columns(header)
+        if samples is None:
+            samples = all_samples
+        else:
+            wanted = set(samples)
+            samples = [s for s in all_samples if s in wanted]   # intersection, file order
+        if resolve_engine(engine) == "pyarrow":
+            sym, values = _read_pyarrow(fh, skip, sym_col, samples, block_size)
+        else:
+            sym, values = _read_pandas(fh, sym_col, samples)
+        n_bytes = fh.tell()
+
+    index, keep = _clean_symbols(sym)
+    if not keep.all():
+        values = values[keep]
+    X = pd.DataFrame(values, index=index, columns=pd.Index(samples), copy=False)
+    secs = time.perf_counter() - t0
+    stats = {"bytes": n_bytes, "rows": int(len(keep)), "genes": int(keep.sum()),
+             "samples": len(samples), "header_samples": len(all_samples), "symbol_col": sym_col,
+             "meta_cols": meta_cols,
+             "seconds": secs, "mb_per_s": n_bytes / 1e6 / max(secs, 1e-9)}
+    return X, stats
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Vectorized clinical processing for GDC/TCGA exports (BRCA or pan-cancer).
+
+find_col(df, targets) -> column name | None
+  - Case-insensitive match on the name or its last dotted part (GDC exports use
+    e.g. demographic.vital_status)
+
+clinical_core(clin, fup=None) -> pd.DataFrame
+  - One row per submitter_id (sorted): submitter_id, case_id, os_event,
+    os_time_days, os_time_months
+  - os_event: any record DEAD/DECEASED or with days_to_death > 0 (max per patient)
+  - os_time_days: max days_to_death for patients with an event and a death time,
+    else max days_to_last_follow_up (clinical.tsv first, follow_up.tsv max as the
+    fallback); clipped at 1 day, patients without any time dropped
+  - case_id is taken from the patient's first record
+  - Patients are factorized to integer codes once and collapsed with named groupby
+    aggregations (no Python call per patient); vital status and day columns are
+    parsed once per distinct value
+
+clean_ids(s) -> pd.Series
+  - str(x).strip().upper() on present values; missing values stay missing
+
+parse_barcodes(barcodes) -> pd.DataFrame (categorical columns)
+  - patient_id (first three '-' fields, TCGA-XX-YYYY), project, tss, participant,
+    sample_type_id (two digits opening the fourth field, if any)
+  - Values with fewer than three fields (or missing) -> NaN in every column
+  - Each distinct barcode is parsed once and results are spread back by
+    factorize codes, so repeated barcodes cost nothing
+patient_ids(barcodes) -> pd.Series (object)
+
+primary_tumor(meta) -> pd.DataFrame
+  - Rows with sample_type_id == "01"; when no row has that code, rows whose
+    sample_type is PRIMARY TUMOR / PRIMARY SOLID TUMOR
+"""
+
+import pandas as pd, numpy as np
+
+SUBMITTER = ["submitter_id", "case_submitter_id"]
+LAST_FOLLOW_UP = ["days_to_last_follow_up", "days_to_last_followup"]
+DEAD = ["DEAD", "DECEASED"]
+PRIMARY = ["PRIMARY SOLID TUMOR", "PRIMARY TUMOR"]
+DAYS_PER_MONTH = 30.44
+
+# TCGA-XX-YYYY[-01A-...]; search() anchors at the start, anything after the 4th field is ignored
+_BARCODE = r"^(?P<project>[^-]*)-(?P<tss>[^-]*)-(?P<participant>[^-]*)(?:-(?P<sample_type_id>\d\d))?"
+
+
+def find_col(df, targets):
+    targets = [t.lower() for t in targets]
+    for c in df.columns:
+        lc = c.lower()
+        if lc in targets: return c
+        if any(lc.endswith("." + t) for t in targets): return c
+    return None
+
+
+def _per_unique(s, fn, fill=np.nan):
+    """fn() over the distinct values of `s` only, spread back by factorize codes."""
+    codes, uniq = pd.factorize(s)
+    vals = np.asarray(fn(pd.Series(uniq, dtype=object)))
+    return np.append(vals, np.asarray([fill], dtype=vals.dtype))[codes]
+
+
+def _days(df, col):
+    # GDC exports write "'--" for missing; a few thousand distinct values at most
+    if not col:
+        return np.full(len(df), np.nan)
+    return _per_unique(df[col], lambda u: pd.to_numeric(u, errors="coerce").astype(float))
+
+
+def clinical_core(clin, fup=None):
+    """Per-patient OS table from a GDC clinical export (+ optional follow_up table)."""
+    col_submitter = find_col(clin, SUBMITTER)
+    col_case      = find_col(clin, ["case_id"])
+    col_vital     = find_col(clin, ["vital_status"])
+    if not (col_submitter and col_vital):
+        raise ValueError("key clinical columns missing (submitter_id / vital_status)")
+
+    # patients as sorted integer codes: every per-patient step below works on these
+    codes, patients = pd.factorize(clin[col_submitter].astype(str), sort=True)
+    dead = _per_unique(clin[col_vital], lambda u: u.astype(str).str.upper().str.strip().isin(DEAD),
+                       fill=False)   # missing -> "NAN", never dead
+    death = _days(clin, find_col(clin, ["days_to_death"]))
+    lfu = _days(clin, find_col(clin, LAST_FOLLOW_UP))
+
+    # follow_up.tsv: patient max fills records without a last follow-up
+    if fup is not None:
+        fup_submitter, fup_dlfu = find_col(fup, SUBMITTER), find_col(fup, LAST_FOLLOW_UP)
+        if fup_submitter and fup_dlfu:
+            best = pd.Series(_days(fup, fup_dlfu)).groupby(fup[fup_submitter].to_numpy()).max()
+            lfu = np.where(np.isnan(lfu), best.reindex(patients).to_numpy()[codes], lfu)
+
+    event = (dead | (np.nan_to_num(death) > 0)).astype("int8")
+
+    # collapse to one row per patient
+    agg = pd.DataFrame({"os_event": event, "death": death, "lfu": lfu}).groupby(codes).agg(
+        os_event=("os_event", "max"),
+        death=("death", "max"),
+        lfu=("lfu", "max"),
+    )
+    first = np.unique(codes, return_index=True)[1]   # each patient's first record
+    use_death = agg["os_event"].eq(1) & agg["death"].notna()
+    out = pd.DataFrame({
+        "submitter_id": patients,
+        "case_id": clin[col_case].to_numpy()[first] if col_case else np.nan,
+        "os_event": agg["os_event"].to_numpy(),
+        "os_time_days": np.where(use_death, agg["death"], agg["lfu"]),
+    })
+    out = out.dropna(subset=["os_time_days"]).reset_index(drop=True)
+    out["os_time_days"] = out["os_time_days"].clip(lower=1.0)
+    out["os_time_months"] = out["os_time_days"] / DAYS_PER_MONTH
+    return out
+
+
+def clean_ids(s):
+    """Strip + upper the present values of an id/label column (missing stay missing)."""
+    return s.where(s.isna(), s.astype(str).str.strip().str.upper())
+
+
+def parse_barcodes(barcodes):
+    """Split barcodes into categorical parts, parsing each distinct value once."""
+    s = pd.Series(barcodes)
+    codes, uniq = pd.factorize(s)
+    parts = pd.Series(uniq, dtype=object).astype(str).str.extract(_BARCODE)
+    parts.insert(0, "patient_id", parts["project"] + "-" + parts["tss"] + "-" + parts["participant"])
+    out = {}
+    for c in parts.columns:
+        part_codes, cats = pd.factorize(parts[c])
+        # codes == -1 (missing barcode) picks the appended -1 (missing part)
+        out[c] = pd.Categorical.from_codes(np.append(part_codes, -1)[codes], cats)
+    return pd.DataFrame(out, index=s.index)
+
+
+def patient_ids(barcodes):
+    """TCGA-XX-YYYY-... -> TCGA-XX-YYYY (NaN when there are fewer than three fields)."""
+    return parse_barcodes(barcodes)["patient_id"].astype(object)
+
+
+def primary_tumor(meta):
+    """Primary tumor rows: sample_type_id "01", else a PRIMARY (SOLID) TUMOR sample_type."""
+    if "sample_type_id" in meta and (meta["sample_type_id"] == "01").any():
+        return meta[meta["sample_type_id"] == "01"].copy()
+    st = meta["sample_type"].str.replace(r"\s+", " ", regex=True)
+    return meta[st.isin(PRIMARY)].copy()
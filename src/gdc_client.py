@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+Async, batched, cached client for the GDC API (https://api.gdc.cancer.gov).
+
+GDCClient(base_url=GDC_API, concurrency=8, batch_size=200, page_size=1000, ...)
+  - async query(endpoint, filters, fields) -> list[dict]
+      all hits of one query; the first page reports pagination.total and the
+      remaining pages are fetched concurrently
+  - async files_by_id(ids, fields) -> list[dict]
+      file ids in batches of `batch_size` ("in" filter), every batch paginated; hits
+      come back in batch order, as the sequential loop returned them
+  - Requests run under an asyncio.Semaphore(concurrency); transport errors, 429 and
+    5xx are retried with exponential backoff + jitter (Retry-After honoured); other
+    4xx raise httpx.HTTPStatusError
+  - Raw JSON responses are cached on disk (data_proc/cache/gdc/<sha256>.json, keyed by
+    endpoint + canonical payload): re-fetching the same ids costs no requests.
+    cache_dir=None disables it; refresh=True refetches and overwrites
+  - `transport=` (e.g. httpx.MockTransport) or base_url="http://127.0.0.1:<port>" with
+    src/gdc_stub.py runs everything offline
+
+fetch_file_metadata(ids, fields=FILE_FIELDS, **client_kwargs) -> (hits, stats)   (sync wrapper)
+file_metadata_table(hits) -> pd.DataFrame
+  - One row per file: file_id, file_name, data_category, data_type,
+    experimental_strategy, workflow_type, sample_type, sample_type_id, case_id, submitter_id
+"""
+
+import asyncio, hashlib, json, os, random
+import pandas as pd
+from pathlib import Path
+
+import httpx
+
+GDC_API = "https://api.gdc.cancer.gov"
+DEFAULT_CACHE = Path("data_proc/cache/gdc")
+
+FILE_FIELDS = [
+    "file_id", "file_name", "data_category", "data_type", "experimental_strategy",
+    "analysis.workflow_type", "cases.samples.sample_type", "cases.samples.sample_type_id",
+    "cases.case_id", "cases.submitter_id",
+]
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class GDCClient:
+    """See module docstring. Use as `async with GDCClient(...) as gdc:`."""
+
+    def __init__(self, base_url=GDC_API, concurrency=8, batch_size=200, page_size=1000,
+                 retries=5, backoff=0.5, timeout=120, cache_dir=DEFAULT_CACHE, refresh=False,
+                 transport=None):
+        self.base_url = base_url.rstrip("/")
+        self.batch_size, self.page_size = batch_size, page_size
+        self.retries, self.backoff = retries, backoff
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.refresh = refresh
+        self._sem = asyncio.Semaphore(concurrency)
+        self._http = httpx.AsyncClient(base_url=self.base_url, timeout=timeout, transport=transport,
+                                       headers={"Content-Type": "application/json"})
+        self.stats = {"requests": 0, "cache_hits": 0, "retries": 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._http.aclose()
+
+    # ---- cache ----
+    def _cache_path(self, endpoint, payload):
+        key = json.dumps({"url": self.base_url, "endpoint": endpoint, "payload": payload}, sort_keys=True)
+        return self.cache_dir / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    def _cache_get(self, path):
+        if path is None or self.refresh or not path.exists():
+            return None
+        try:
+            with open(path) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):   # unreadable entry: refetch and overwrite
+            return None
+
+    def _cache_put(self, path, data):
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{id(data)}.tmp")
+        with open(tmp, "w") as fh:
+            json.dump(data, fh)
+        os.replace(tmp, path)
+
+    # ---- requests ----
+    async def post(self, endpoint, payload):
+        """POST one payload (cached, retried, concurrency-limited) -> response JSON."""
+        path = self._cache_path(endpoint, payload) if self.cache_dir is not None else None
+        data = self._cache_get(path)
+        if data is not None:
+            self.stats["cache_hits"] += 1
+            return data
+        for attempt in range(self.retries + 1):
+            wait = None
+            try:
+                async with self._sem:
+                    self.stats["requests"] += 1
+                    r = await self._http.post(f"/{endpoint}", content=json.dumps(payload))
+                if r.status_code not in RETRY_STATUS:
+                    r.raise_for_status()
+                    data = r.json()
+                    self._cache_put(path, data)
+                    return data
+                wait = _retry_after(r)
+                error = httpx.HTTPStatusError(f"{r.status_code} from {endpoint}", request=r.request, response=r)
+            except httpx.TransportError as ex:
+                error = ex
+            if attempt == self.retries:
+                raise error
+            self.stats["retries"] += 1
+            await asyncio.sleep(wait if wait is not None else
+                                self.backoff * 2 ** attempt * (0.5 + random.random()))
+
+    async def query(self, endpoint, filters, fields, page_size=None):
+        """All hits of one filtered query; pages after the first are fetched concurrently."""
+        size = page_size or self.page_size
+        base = {"filters": filters, "format": "JSON", "fields": ",".join(fields), "size": size}
+        first = await self.post(endpoint, {**base, "from": 0})
+        hits = list(first["data"]["hits"])
+        total = first["data"].get("pagination", {}).get("total", len(hits))
+        if total > len(hits):
+            pages = await asyncio.gather(*(self.post(endpoint, {**base, "from": start})
+                                           for start in range(len(hits), total, size)))
+            for page in pages:
+                hits += page["data"]["hits"]
+        return hits
+
+    async def files_by_id(self, ids, fields=FILE_FIELDS):
+        """Metadata hits for file ids, in batches of `batch_size` (all batches in flight)."""
+        ids = list(ids)
+        batches = [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+        results = await asyncio.gather(*(
+            self.query("files", {"op": "in", "content": {"field": "files.file_id", "value": chunk}},
+                       fields, page_size=len(chunk))
+            for chunk in batches))
+        return [hit for hits in results for hit in hits]
+
+
+def _retry_after(r):
+    try:
+        return float(r.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def fetch_file_metadata(ids, fields=FILE_FIELDS, **client_kwargs):
+    """Sync wrapper: file metadata hits for `ids` -> (hits, client stats)."""
+    async def go():
+        async with GDCClient(**client_kwargs) as gdc:
+            hits = await gdc.files_by_id(ids, fields)
+            return hits, gdc.stats
+    return asyncio.run(go())
+
+
+def file_metadata_table(hits):
+    """Flatten /files hits (first case, first sample) into the tcga_file_metadata table."""
+    rows = []
+    for hit in hits:
+        case = (hit.get("cases") or [{}])[0]
+        sample = (case.get("samples") or [{}])[0]
+        rows.append({
+            "file_id": hit.get("file_id"),
+            "file_name": hit.get("file_name"),
+            "data_category": hit.get("data_category"),
+            "data_type": hit.get("data_type"),
+            "experimental_strategy": hit.get("experimental_strategy"),
+            "workflow_type": (hit.get("analysis") or {}).get("workflow_type"),
+            "sample_type": sample.get("sample_type"),
+            "sample_type_id": sample.get("sample_type_id"),
+            "case_id": case.get("case_id"),
+            "submitter_id": case.get("submitter_id"),
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the GDC /files endpoint (offline runs of src/gdc_client.py).
+
+serve(hits, port=0, latency=0.0, fail_rate=0.0, seed=0) -> (server, base_url)
+  - ThreadingHTTPServer on 127.0.0.1 answering POST /files like the GDC API:
+    "in" / "=" filters on files.* fields (or no filter), from/size pagination with
+    data.pagination.total, hits in stored order
+  - latency: seconds added to every response (to see batches overlap)
+  - fail_rate: fraction of requests answered 503 (exercises retry/backoff); every
+    fourth failure is a 429 with Retry-After: 0
+  - server.requests counts requests served; call server.shutdown() when done
+
+hits_from_table(df) -> list[dict]
+  - Rebuilds nested /files hits from a tcga_file_metadata.tsv-shaped table, so the
+    stub serves exactly what file_metadata_table() flattened
+synthetic_hits(n, seed=0) -> list[dict]
+
+CLI (run from the repo root):
+  python -m src.gdc_stub --table data_proc/tcga_file_metadata.tsv --port 8765
+  python -m src.gdc_stub --synthetic 11000 --latency 0.3 --fail-rate 0.05
+  then e.g.: python scripts/fetch_tcga_file_metadata.py --base-url http://127.0.0.1:8765
+"""
+
+import argparse, json, random, sys, threading, time
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def hits_from_table(df):
+    """Nested /files hits from the flattened metadata table (NaN cells -> field absent)."""
+    hits = []
+    for r in df.astype(object).where(df.notna(), None).to_dict("records"):
+        sample = {k: r[k] for k in ("sample_type", "sample_type_id") if r.get(k) is not None}
+        case = {k: r[k] for k in ("case_id", "submitter_id") if r.get(k) is not None}
+        case["samples"] = [sample]
+        hit = {k: r[k] for k in ("file_id", "file_name", "data_category", "data_type",
+                                 "experimental_strategy") if r.get(k) is not None}
+        if r.get("workflow_type") is not None:
+            hit["analysis"] = {"workflow_type": r["workflow_type"]}
+        hit["cases"] = [case]
+        hits.append(hit)
+    return hits
+
+
+def synthetic_hits(n, seed=0):
+    rng = random.Random(seed)
+    types = [("Primary Tumor", "01"), ("Solid Tissue Normal", "11"), ("Metastatic", "06")]
+    hits = []
+    for i in range(n):
+        st, sid = types[0] if rng.random() < 0.9 else rng.choice(types[1:])
+        case = f"TCGA-{rng.choice(['BRCA', 'LUAD', 'COAD', 'KIRC'])}-{i:06d}"
+        hits.append({
+            "file_id": f"{i:08x}-0000-4000-8000-{rng.getrandbits(48):012x}",
+            "file_name": f"{i:08x}.rna_seq.augmented_star_gene_counts.tsv",
+            "data_category": "Transcriptome Profiling", "data_type": "Gene Expression Quantification",
+            "experimental_strategy": "RNA-Seq", "analysis": {"workflow_type": "STAR - Counts"},
+            "cases": [{"case_id": f"case-{i:06d}", "submitter_id": case,
+                       "samples": [{"sample_type": st, "sample_type_id": sid}]}],
+        })
+    return hits
+
+
+def _get(hit, field):
+    """Values of a dotted files.* field (lists are flattened, like GDC's nested docs)."""
+    vals = [hit]
+    for part in field.removeprefix("files.").split("."):
+        nxt = []
+        for v in vals:
+            v = v.get(part) if isinstance(v, dict) else None
+            nxt += v if isinstance(v, list) else [v]
+        vals = nxt
+    return [v for v in vals if v is not None]
+
+
+def _match(hits, filters):
+    if not filters:
+        return hits
+    op, content = filters["op"], filters["content"]
+    if op == "and":
+        for f in content:
+            hits = _match(hits, f)
+        return hits
+    if op not in ("in", "="):
+        raise ValueError(f"stub supports 'in', '=' and 'and' filters, not {op!r}")
+    want = set(content["value"]) if op == "in" else {content["value"]}
+    if content["field"] == "files.file_id":   # common case: direct lookup, keep stored order
+        return [h for h in hits if h.get("file_id") in want]
+    return [h for h in hits if want & set(_get(h, content["field"]))]
+
+
+def serve(hits, port=0, latency=0.0, fail_rate=0.0, seed=0):
+    """Start the stub in a daemon thread -> (server, base_url)."""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code, body, headers=()):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with lock:
+                server.requests += 1
+                fail = rng.random() < fail_rate
+                if fail:
+                    server.failures += 1
+                    n_fail = server.failures
+            if latency:
+                time.sleep(latency)
+            if self.path.rstrip("/") != "/files":
+                return self._send(404, {"message": f"stub serves /files only, not {self.path}"})
+            if fail:
+                if n_fail % 4 == 0:
+                    return self._send(429, {"message": "rate limited"}, [("Retry-After", "0")])
+                return self._send(503, {"message": "unavailable"})
+            found = _match(hits, payload.get("filters"))
+            start, size = int(payload.get("from", 0)), int(payload.get("size", 10))
+            page = found[start:start + size]
+            self._send(200, {"data": {"hits": page, "pagination": {
+                "count": len(page), "total": len(found), "size": size, "from": start,
+                "page": start // max(size, 1) + 1, "pages": -(-len(found) // max(size, 1))}},
+                "warnings": {}})
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.requests = server.failures = 0
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Serve a local stand-in for GDC POST /files.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--table", help="tcga_file_metadata.tsv-shaped table to serve")
+    src.add_argument("--synthetic", type=int, help="serve N generated file hits")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added per response")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of 503/429 responses")
+    args = ap.parse_args(argv)
+
+    hits = hits_from_table(pd.read_csv(args.table, sep="\t", dtype=str)) if args.table else synthetic_hits(args.synthetic)
+    server, url = serve(hits, args.port, args.latency, args.fail_rate)
+    print(f"GDC stub: {len(hits)} files at {url}/files (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+"""
+Stage-level timing and peak-memory instrumentation with JSON run reports.
+
+RunReport.start(script) -> RunReport
+  - One report per script run; written atomically at interpreter exit to
+    data_proc/.runs/<script stem>/<YYYYmmdd-HHMMSS>-<pid>.json
+    ($RUN_REPORT_DIR overrides the root; RUN_REPORT_DIR="" disables writing)
+  - with run.stage(name) as st: ...; st.rows = n; st.bytes = b
+      records wall time, CPU time (this process + reaped children, e.g. a
+      ProcessPoolExecutor), RSS at start/end, peak RSS within the stage, rows/bytes
+      processed and throughput (rows/s, MB/s). An exception marks the stage (and
+      the run) failed and propagates
+  - @run.timed(name) decorator: the same for every call of a function
+  - Peak RSS per stage resets the kernel high-water mark (/proc/self/clear_refs)
+    when the stage opens; where that is not possible (non-Linux, no permission) the
+    process-lifetime ru_maxrss is recorded and the stage is marked peak_scope="process"
+  - Nested stages are allowed; an outer stage's peak includes its inner stages
+  - run.adopt(report, prefix) appends the stages of another report (a script run as a
+    subprocess) as "prefix/<stage>"
+
+nbytes(*objs) -> int
+  - In-memory size of DataFrames/Series/arrays (shallow), or on-disk size of paths
+
+load_report(ref) -> dict (a report path, or the latest run of a script name)
+diff_reports(a, b, threshold=1.25, min_seconds=0.5, min_mb=50.0) -> pd.DataFrame
+  - One row per stage (+ <total>): A/B wall, CPU, peak RSS, throughput, ratios and a
+    flag for changes beyond `threshold` that also exceed the absolute floors
+print_diff(a, b, ...) -> number of flagged regressions (prints the table)
+print_report(rep) -> prints one report (totals + per-stage table)
+
+CLI (run from the repo root):
+  python -m src.instrument list [SCRIPT]          # recorded runs, newest last
+  python -m src.instrument show REPORT|SCRIPT     # one run, stage by stage
+  python -m src.instrument diff A [B] [--threshold 1.25] [--min-seconds 0.5]
+      compares two runs stage by stage (wall, CPU, peak RSS, throughput) and flags
+      slowdowns / memory growth beyond the threshold ratio; exit code 1 if any.
+      A and B are report paths or script names (latest run of each); a single
+      script name compares its previous run to its latest
+"""
+
+import argparse, atexit, json, os, platform, socket, sys, time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+
+import pandas as pd, numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows: no ru_maxrss
+
+RUNS_DIR = Path("data_proc/.runs")
+REPORT_VERSION = 1
+MB = 1e6
+
+
+# ---- memory probes ----
+def _status_kb(field):
+    """VmRSS / VmHWM from /proc/self/status in kB (None off Linux)."""
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def rss_mb():
+    kb = _status_kb("VmRSS")
+    if kb is not None:
+        return kb * 1024 / MB
+    return _maxrss_mb()
+
+
+def _maxrss_mb():
+    if resource is None:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb * (1 if sys.platform == "darwin" else 1024) / MB   # bytes on macOS, kB elsewhere
+
+
+def _reset_peak():
+    """Reset the kernel RSS high-water mark; False when the platform does not allow it."""
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_mb():
+    kb = _status_kb("VmHWM")
+    return kb * 1024 / MB if kb is not None else _maxrss_mb()
+
+
+def _cpu_s():
+    t = os.times()
+    return t.user + t.system, t.children_user + t.children_system
+
+
+def nbytes(*objs):
+    """Shallow in-memory size of frames/series/arrays, on-disk size of paths."""
+    total = 0
+    for o in objs:
+        if isinstance(o, pd.DataFrame):
+            total += int(o.memory_usage(index=True).sum())
+        elif isinstance(o, (pd.Series, pd.Index)):
+            total += int(o.memory_usage(index=True)) if isinstance(o, pd.Series) else int(o.memory_usage())
+        elif isinstance(o, np.ndarray):
+            total += o.nbytes
+        elif isinstance(o, (str, Path)):
+            p = Path(o)
+            total += p.stat().st_size if p.is_file() else sum(f.stat().st_size for f in p.rglob("*") if f.is_file())
+        else:
+            total += int(getattr(o, "nbytes", 0))
+    return total
+
+
+# ---- records ----
+class StageRecord:
+    """One timed stage; callers set .rows / .bytes (or add to them) inside the block."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = self.bytes = None
+        self.status = "running"
+        self.error = None
+        self.peak_scope = "stage"
+        self.wall_s = self.cpu_s = self.cpu_children_s = None
+        self.rss_start_mb = self.rss_end_mb = self.peak_rss_mb = None
+
+    def add(self, rows=0, bytes=0):
+        self.rows = (self.rows or 0) + rows
+        self.bytes = (self.bytes or 0) + bytes
+        return self
+
+    def as_dict(self):
+        wall = self.wall_s or 0.0
+        return {
+            "name": self.name, "status": self.status,
+            "wall_s": _r(self.wall_s), "cpu_s": _r(self.cpu_s), "cpu_children_s": _r(self.cpu_children_s),
+            "rss_start_mb": _r(self.rss_start_mb), "rss_end_mb": _r(self.rss_end_mb),
+            "peak_rss_mb": _r(self.peak_rss_mb), "peak_scope": self.peak_scope,
+            "rows": self.rows, "bytes": self.bytes,
+            "rows_per_s": _r(self.rows / wall) if self.rows is not None and wall > 0 else None,
+            "mb_per_s": _r(self.bytes / MB / wall) if self.bytes is not None and wall > 0 else None,
+            "error": self.error,
+        }
+
+
+def _r(x, nd=4):
+    return None if x is None else round(float(x), nd)
+
+
+class RunReport:
+    """Stages of one script run (see module docstring)."""
+
+    def __init__(self, script, out_dir=None):
+        self.script = Path(script).stem
+        root = os.environ.get("RUN_REPORT_DIR", str(RUNS_DIR)) if out_dir is None else str(out_dir)
+        self.out_dir = Path(root).absolute() / self.script if root else None   # immune to later chdir
+        self.stages = []
+        self.failed = False
+        self._open = []              # stack of (record, running peak) for nesting
+        self._pid = os.getpid()
+        self._written = None
+        self.started = datetime.now()
+        self._t0 = time.perf_counter()
+        self._cpu0 = _cpu_s()
+
+    @classmethod
+    def start(cls, script, out_dir=None):
+        """Report for this process; written at exit (forked workers never write it)."""
+        run = cls(script, out_dir)
+        atexit.register(run.write)
+        hook = sys.excepthook
+
+        def excepthook(*exc):
+            run.failed = True
+            hook(*exc)
+        sys.excepthook = excepthook
+        return run
+
+    # ---- stages ----
+    @contextmanager
+    def stage(self, name):
+        rec = StageRecord(name)
+        # fold the high-water mark so far into open (outer) stages before resetting it
+        if self._open:
+            peak = _peak_mb()
+            for entry in self._open:
+                entry[1] = max(entry[1] or 0.0, peak or 0.0)
+        if not _reset_peak():
+            rec.peak_scope = "process"
+        rec.rss_start_mb = rss_mb()
+        entry = [rec, None]
+        self._open.append(entry)
+        self.stages.append(rec)
+        t0, (c0, cc0) = time.perf_counter(), _cpu_s()
+        try:
+            yield rec
+            rec.status = "ok"
+        except BaseException as ex:
+            rec.status = "failed"
+            rec.error = f"{type(ex).__name__}: {ex}"[:500]
+            self.failed = True
+            raise
+        finally:
+            c1, cc1 = _cpu_s()
+            rec.wall_s = time.perf_counter() - t0
+            rec.cpu_s, rec.cpu_children_s = c1 - c0, cc1 - cc0
+            rec.rss_end_mb = rss_mb()
+            peak = _peak_mb()
+            rec.peak_rss_mb = max(x for x in (peak, entry[1], rec.rss_start_mb, rec.rss_end_mb, 0.0)
+                                  if x is not None)
+            self._open.pop()
+            for outer in self._open:
+                outer[1] = max(outer[1] or 0.0, rec.peak_rss_mb)
+            if rec.peak_scope == "process":
+                for outer in self._open:
+                    outer[0].peak_scope = "process"
+
+    def adopt(self, report, prefix):
+        """Append another run's stages (e.g. a script run as a subprocess) as `prefix/<stage>`."""
+        for s in report["stages"]:
+            rec = StageRecord(f"{prefix}/{s['name']}")
+            for k in ("status", "error", "peak_scope", "wall_s", "cpu_s", "cpu_children_s",
+                      "rss_start_mb", "rss_end_mb", "peak_rss_mb", "rows", "bytes"):
+                setattr(rec, k, s.get(k))
+            self.stages.append(rec)
+            self.failed |= rec.status != "ok"
+
+    def timed(self, name=None):
+        """Decorator: every call of the function is one stage (default name: its __name__)."""
+        def deco(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name or fn.__name__):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return deco
+
+    # ---- report ----
+    def as_dict(self):
+        cpu1 = _cpu_s()
+        stages = [s.as_dict() for s in self.stages]
+        peaks = [s["peak_rss_mb"] for s in stages if s["peak_rss_mb"] is not None]
+        return {
+            "version": REPORT_VERSION,
+            "script": self.script,
+            "argv": sys.argv[1:],
+            "started": self.started.isoformat(timespec="seconds"),
+            "status": "failed" if self.failed or any(s["status"] != "ok" for s in stages) else "ok",
+            "host": socket.gethostname(), "platform": platform.platform(),
+            "python": platform.python_version(), "cpu_count": os.cpu_count(), "pid": self._pid,
+            "wall_s": _r(time.perf_counter() - self._t0),
+            "cpu_s": _r(cpu1[0] - self._cpu0[0]), "cpu_children_s": _r(cpu1[1] - self._cpu0[1]),
+            # lifetime peak: stage resets lower VmHWM, so take the max with the stage peaks
+            "peak_rss_mb": _r(max([*peaks, _maxrss_mb() or 0.0])),
+            "stages": stages,
+        }
+
+    def write(self):
+        """Write the JSON report (once, from the process that started the run) -> path | None."""
+        if self.out_dir is None or os.getpid() != self._pid or self._written is not None:
+            return self._written
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f"{self.started:%Y%m%d-%H%M%S}-{self._pid}.json"
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w") as fh:
+            json.dump(self.as_dict(), fh, indent=1)
+        os.replace(tmp, path)
+        self._written = path
+        return path
+
+
+# ---- reading / comparing reports ----
+def list_runs(script=None, root=None):
+    root = Path(root or os.environ.get("RUN_REPORT_DIR") or RUNS_DIR)
+    pattern = f"{Path(script).stem}/*.json" if script else "*/*.json"
+    return sorted(root.glob(pattern), key=lambda p: (p.parent.name, p.name))
+
+
+def load_report(ref, root=None):
+    """Report dict from a path, or the latest run of a script name."""
+    p = Path(ref)
+    if not p.is_file():
+        runs = list_runs(ref, root)
+        if not runs:
+            raise FileNotFoundError(f"no run report {ref!r}")
+        p = runs[-1]
+    with open(p) as fh:
+        rep = json.load(fh)
+    rep["_path"] = str(p)
+    return rep
+
+
+def stage_table(rep):
+    """Stages of one report as a DataFrame (repeated stage names are numbered #2, #3...)."""
+    df = pd.DataFrame(rep["stages"])
+    if df.empty:
+        return df
+    k = df.groupby("name").cumcount()
+    df["name"] = np.where(k > 0, df["name"] + "#" + (k + 1).astype(str), df["name"])
+    return df.set_index("name")
+
+
+def diff_reports(a, b, threshold=1.25, min_seconds=0.5, min_mb=50.0):
+    """Per-stage comparison b vs a; `flag` lists regressions beyond `threshold`."""
+    ta, tb = stage_table(a), stage_table(b)
+    names = list(ta.index) + [n for n in tb.index if n not in ta.index]
+    cols = ["wall_s", "cpu_s", "peak_rss_mb", "rows_per_s", "mb_per_s"]
+    rows = []
+    for n in names + ["<total>"]:
+        if n == "<total>":
+            ra, rb = pd.Series(a), pd.Series(b)
+        else:
+            ra = ta.loc[n] if n in ta.index else pd.Series(dtype=object)
+            rb = tb.loc[n] if n in tb.index else pd.Series(dtype=object)
+        row = {"stage": n}
+        for c in cols:
+            row[f"{c}_a"], row[f"{c}_b"] = ra.get(c), rb.get(c)
+        flags = []
+        if ra.empty or rb.empty:
+            flags.append("only in A" if rb.empty else "only in B")
+        else:
+            for c, floor, label in (("wall_s", min_seconds, "slower"), ("cpu_s", min_seconds, "more cpu"),
+                                    ("peak_rss_mb", min_mb, "more memory")):
+                va, vb = ra.get(c), rb.get(c)
+                if va is None or vb is None or pd.isna(va) or pd.isna(vb):
+                    continue
+                row[f"{c}_ratio"] = round(vb / va, 3) if va > 0 else None
+                if vb > max(va, 1e-9) * threshold and vb - va >= floor:
+                    flags.append(f"{label} x{vb / max(va, 1e-9):.2f}")
+            if ra.get("status", "ok") != "ok" or rb.get("status", "ok") != "ok":
+                flags.append(f"status {ra.get('status')} -> {rb.get('status')}")
+        row["flag"] = "; ".join(flags)
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("stage")
+
+
+def print_diff(a, b, threshold=1.25, min_seconds=0.5, min_mb=50.0):
+    """Print diff_reports(a, b) as a table -> number of flagged regressions."""
+    d = diff_reports(a, b, threshold, min_seconds, min_mb)
+    print(f"{'stage':<36}{'wall A':>9}{'wall B':>9}{'x':>7}{'peak A':>9}{'peak B':>9}{'x':>7}  flag")
+    for n, r in d.iterrows():
+        print(f"{str(n)[:35]:<36}{_fmt(r['wall_s_a']):>9}{_fmt(r['wall_s_b']):>9}{_fmt(r.get('wall_s_ratio')):>7}"
+              f"{_fmt(r['peak_rss_mb_a'], 1):>9}{_fmt(r['peak_rss_mb_b'], 1):>9}{_fmt(r.get('peak_rss_mb_ratio')):>7}"
+              f"  {r['flag']}")
+    flagged = int(d["flag"].str.contains("slower|more|status").sum())
+    print(f"{flagged} regression(s) at threshold x{threshold}")
+    return flagged
+
+
+def _fmt(x, nd=2):
+    return "-" if x is None or (isinstance(x, float) and np.isnan(x)) else f"{x:.{nd}f}"
+
+
+def print_report(rep):
+    """Print one run report: totals, then a per-stage table."""
+    print(f"{rep['script']}  {rep['started']}  status={rep['status']}  argv={' '.join(rep['argv']) or '-'}")
+    print(f"wall {_fmt(rep['wall_s'])}s | cpu {_fmt(rep['cpu_s'])}s (+children {_fmt(rep['cpu_children_s'])}s)"
+          f" | peak RSS {_fmt(rep['peak_rss_mb'], 1)} MB | {rep['host']} ({rep['cpu_count']} cpu)")
+    print(f"{'stage':<36}{'wall s':>9}{'cpu s':>9}{'peak MB':>10}{'rows':>11}{'MB':>10}{'rows/s':>12}{'MB/s':>9}")
+    for s in rep["stages"]:
+        print(f"{s['name'][:35]:<36}{_fmt(s['wall_s']):>9}{_fmt(s['cpu_s']):>9}{_fmt(s['peak_rss_mb'], 1):>10}"
+              f"{s['rows'] if s['rows'] is not None else '-':>11}"
+              f"{_fmt(s['bytes'] / MB if s['bytes'] is not None else None, 1):>10}"
+              f"{_fmt(s['rows_per_s'], 0):>12}{_fmt(s['mb_per_s'], 1):>9}"
+              + (f"  [{s['status']}]" if s["status"] != "ok" else ""))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Inspect and compare stage run reports (see module docstring).")
+    ap.add_argument("command", choices=["list", "show", "diff"])
+    ap.add_argument("refs", nargs="*", help="report paths or script names")
+    ap.add_argument("--root", type=Path, default=None, help=f"reports root (default: {RUNS_DIR})")
+    ap.add_argument("--threshold", type=float, default=1.25, help="diff: flag ratios B/A above this")
+    ap.add_argument("--min-seconds", type=float, default=0.5, help="diff: ignore time changes below this")
+    ap.add_argument("--min-mb", type=float, default=50.0, help="diff: ignore peak RSS changes below this")
+    args = ap.parse_args(argv)
+
+    if args.command == "list":
+        for p in list_runs(args.refs[0] if args.refs else None, args.root):
+            with open(p) as fh:
+                r = json.load(fh)
+            print(f"{p}  {r['status']:<6} wall {_fmt(r['wall_s']):>8}s  peak {_fmt(r['peak_rss_mb'], 1):>8} MB")
+        return 0
+    if not args.refs:
+        ap.error(f"{args.command} needs a report path or script name")
+    if args.command == "show":
+        print_report(load_report(args.refs[0], args.root))
+        return 0
+
+    if len(args.refs) == 1:
+        runs = list_runs(args.refs[0], args.root)
+        if len(runs) < 2:
+            ap.error(f"need two runs of {args.refs[0]!r} to compare (found {len(runs)})")
+        refs = [str(runs[-2]), str(runs[-1])]
+    else:
+        refs = args.refs[:2]
+    a, b = (load_report(r, args.root) for r in refs)
+    print("A:", a["_path"])
+    print("B:", b["_path"])
+    return 1 if print_diff(a, b, args.threshold, args.min_seconds, args.min_mb) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+"""
+Bootstrap confidence intervals for survival metrics, resampled in parallel over shared memory.
+
+All n_boot index sets are drawn up front from one seed; they, the labels, the risk
+scores and the survival curves are copied once into multiprocessing.shared_memory
+blocks that every worker maps in its pool initializer, so a task is only a (start,
+stop) range of replicates and no array is pickled per task. A replicate is scored as a
+column of per-sample multiplicities (sample_weight of src/modeling/concordance.py and
+src/modeling/metrics.py, which score many columns in one call). Replicates are cut into
+fixed blocks of `block` columns that are scored by the same code whichever process
+runs them, so the output is bit-for-bit identical for any number of workers.
+
+Metrics (column names):
+  harrell_c, uno_c      concordance index; Uno's IPCW weights from the censoring
+                        Kaplan-Meier of the training labels (fixed across replicates)
+  auc@<t>, mean_auc     cumulative/dynamic AUC at times (when times are given)
+  brier@<t>, ibs        Brier score / integrated Brier score (when surv is given)
+
+bootstrap_indices(n, n_boot, seed=0) -> (n_boot, n) int32 resample index sets
+
+bootstrap_metrics(time, event, risk, times=None, surv=None, censoring=None, tau=None,
+                  n_boot=2000, seed=0, workers=1, block=100, bca=True) -> BootstrapResult
+  - surv: (n, len(times)) predicted survival probabilities (Brier / IBS)
+  - censoring: concordance.CensoringKM of the training labels (default: the evaluated
+    ones); tau truncates Uno's C (needed when follow-up outlasts the training labels)
+  - bca: also score the n leave-one-out (jackknife) replicates for the BCa acceleration
+
+BootstrapResult
+  - .estimate (Series), .replicates (n_boot × metrics), .jackknife (n × metrics or None)
+  - .table(alpha=0.05) -> per metric: estimate, se, percentile and BCa interval
+
+CLI (run from the repo root):
+  python -m src.modeling.bootstrap --risk risk.tsv --labels data_proc/metabric_labels.tsv \\
+      [--times 36 60 120] [--train-labels data_proc/tcga_labels.tsv --train-risk tcga_risk.tsv] \\
+      [--tau 120] [--n-boot 2000] [--seed 0] [--workers 4] [--out ci.tsv]
+"""
+
+import argparse, sys, time
+import pandas as pd, numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+from statistics import NormalDist
+
+from src.modeling.concordance import CensoringKM, concordance_index, read_labels
+from src.modeling.metrics import BreslowBaseline, grid_metrics
+
+_DATA = _CONF = None
+_SHM = []
+
+
+def bootstrap_indices(n, n_boot, seed=0):
+    """(n_boot, n) int32 index sets, drawn in one call from default_rng(seed)."""
+    return np.random.default_rng(seed).integers(0, n, (n_boot, n)).astype(np.int32)
+
+
+class _SharedArrays:
+    """Arrays copied into named shared-memory blocks; .spec re-attaches them in a worker."""
+
+    def __init__(self, arrays):
+        self.blocks, self.spec = [], {}
+        for key, a in arrays.items():
+            a = np.ascontiguousarray(a)
+            shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+            np.ndarray(a.shape, a.dtype, buffer=shm.buf)[...] = a
+            self.blocks.append(shm)
+            self.spec[key] = (shm.name, a.shape, a.dtype.str)
+
+    def release(self):
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+
+
+def _init_worker(spec, conf, arrays=None):
+    """Map the shared blocks named in spec (or use `arrays` as is, in-process)."""
+    global _DATA, _CONF
+    _DATA, _CONF = dict(arrays or {}), conf
+    for key, (name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _SHM.append(shm)                       # keep the mapping alive with the process
+        _DATA[key] = np.ndarray(shape, dtype, buffer=shm.buf)
+
+
+def _evaluate(W, d, conf):
+    """Every metric for the weight columns W (n, b) -> (b, n_metrics) float64."""
+    t, e, r = d["time"], d["event"], d["risk"]
+    cols = [concordance_index(t, e, r, W)[0], concordance_index(t, e, r, W, d["uno_weight"])[0]]
+    times = conf["times"]
+    if times is not None:
+        res = grid_metrics(t, e, times, r, d.get("surv"), conf["censoring"], W)
+        cols += [*res["auc"], res["mean_auc"], *res.get("brier", []), *([res["ibs"]] if "ibs" in res else [])]
+    return np.column_stack(cols)
+
+
+def _score_block(job):
+    """Worker: ("boot" | "jack", start, stop) -> (stop - start, n_metrics) metric values."""
+    kind, a, b = job
+    n = len(_DATA["time"])
+    if kind == "boot":
+        idx = _DATA["idx"][a:b].astype(np.int64) + (np.arange(b - a) * n)[:, None]
+        W = np.bincount(idx.ravel(), minlength=(b - a) * n).reshape(b - a, n).T
+    else:
+        W = np.ones((n, b - a), dtype=np.int64)
+        W[np.arange(a, b), np.arange(b - a)] = 0
+    return _evaluate(W, _DATA, _CONF)
+
+
+def _metric_names(times, surv):
+    names = ["harrell_c", "uno_c"]
+    if times is not None:
+        names += [f"auc@{t:g}" for t in times] + ["mean_auc"]
+        if surv is not None:
+            names += [f"brier@{t:g}" for t in times] + (["ibs"] if len(times) > 1 else [])
+    return names
+
+
+class BootstrapResult:
+    """Point estimates, bootstrap and jackknife replicates (see module docstring)."""
+
+    def __init__(self, estimate, replicates, jackknife=None):
+        self.estimate, self.replicates, self.jackknife = estimate, replicates, jackknife
+
+    def table(self, alpha=0.05):
+        nd, rows = NormalDist(), []
+        for m in self.estimate.index:
+            est, boot = self.estimate[m], self.replicates[m].dropna().to_numpy()
+            row = {"metric": m, "estimate": est, "se": boot.std(ddof=1) if len(boot) > 1 else np.nan,
+                   "pct_lo": np.nan, "pct_hi": np.nan, "bca_lo": np.nan, "bca_hi": np.nan, "n_boot": len(boot)}
+            if len(boot):
+                row["pct_lo"], row["pct_hi"] = np.quantile(boot, [alpha / 2, 1 - alpha / 2])
+            if len(boot) and self.jackknife is not None and np.isfinite(est):
+                p = ((boot < est).sum() + 0.5 * (boot == est).sum()) / len(boot)
+                jack = self.jackknife[m].dropna().to_numpy()
+                dev = jack.mean() - jack
+                den = 6 * ((dev ** 2).sum()) ** 1.5
+                if 0 < p < 1 and den > 0:
+                    z0, acc = nd.inv_cdf(p), (dev ** 3).sum() / den
+                    q = [nd.cdf(z0 + (z0 + z) / (1 - acc * (z0 + z)))
+                         for z in (nd.inv_cdf(alpha / 2), nd.inv_cdf(1 - alpha / 2))]
+                    row["bca_lo"], row["bca_hi"] = np.quantile(boot, q)
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def bootstrap_metrics(time, event, risk, times=None, surv=None, censoring=None, tau=None, n_boot=2000,
+                      seed=0, workers=1, block=100, bca=True):
+    """Bootstrap (and jackknife) replicates of every metric; see module docstring."""
+    time = np.asarray(time, dtype=np.float64)
+    event = np.asarray(event).astype(bool)
+    risk = np.asarray(risk, dtype=np.float64)
+    n = len(time)
+    if times is not None:
+        times = np.unique(np.atleast_1d(np.asarray(times, dtype=np.float64)))
+    if censoring is None:
+        censoring = CensoringKM(time, event)
+    arrays = {"time": time, "event": event, "risk": risk, "uno_weight": np.square(censoring.ipcw(time, event, tau)),
+              "idx": bootstrap_indices(n, n_boot, seed)}
+    if surv is not None:
+        if times is None:
+            raise ValueError("surv needs the times it was evaluated at")
+        arrays["surv"] = np.asarray(surv, dtype=np.float64).reshape(n, len(times))
+    conf = {"times": times, "censoring": censoring}
+    names = _metric_names(times, surv)
+
+    jobs = [("boot", a, min(a + block, n_boot)) for a in range(0, n_boot, block)]
+    n_boot_jobs = len(jobs)
+    if bca:
+        jobs += [("jack", a, min(a + block, n)) for a in range(0, n, block)]
+    if workers <= 1:
+        _init_worker({}, conf, arrays)
+        parts = list(map(_score_block, jobs))
+    else:
+        shared = _SharedArrays(arrays)
+        try:
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared.spec, conf)) as ex:
+                parts = list(ex.map(_score_block, jobs))
+        finally:
+            shared.release()
+    estimate = _evaluate(np.ones((n, 1), dtype=np.int64), arrays, conf)[0]
+    return BootstrapResult(pd.Series(estimate, index=names),
+                           pd.DataFrame(np.vstack(parts[:n_boot_jobs]), columns=names),
+                           pd.DataFrame(np.vstack(parts[n_boot_jobs:]), columns=names) if bca else None)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Bootstrap CIs of C-index, time-dependent AUC and Brier score.")
+    ap.add_argument("--risk", type=Path, required=True, help="TSV: sample id, risk")
+    ap.add_argument("--labels", type=Path, default=Path("data_proc/tcga_labels.tsv"))
+    ap.add_argument("--times", type=float, nargs="*", default=None, help="AUC / Brier time points")
+    ap.add_argument("--train-labels", type=Path, default=None, help="censoring KM / Breslow baseline labels")
+    ap.add_argument("--train-risk", type=Path, default=None, help="training risk for the Breslow baseline")
+    ap.add_argument("--time-col", default="os_time_months")
+    ap.add_argument("--event-col", default="os_event")
+    ap.add_argument("--tau", type=float, default=None, help="truncation time for Uno's C")
+    ap.add_argument("--n-boot", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--block", type=int, default=100, help="replicates per task")
+    ap.add_argument("--alpha", type=float, default=0.05)
+    ap.add_argument("--no-bca", action="store_true", help="skip the jackknife (percentile intervals only)")
+    ap.add_argument("--out", type=Path, default=None, help="interval table TSV")
+    args = ap.parse_args(argv)
+
+    risk = pd.read_csv(args.risk, sep="\t", index_col=0).iloc[:, 0]
+    lab = read_labels(args.labels, args.time_col, args.event_col)
+    lab = lab.loc[lab.index.intersection(risk.index)]
+    t, e, r = lab[args.time_col].to_numpy(), lab[args.event_col].to_numpy(), risk.loc[lab.index].to_numpy()
+    train = lab if args.train_labels is None else read_labels(args.train_labels, args.time_col, args.event_col)
+    cens = CensoringKM(train[args.time_col], train[args.event_col])
+    times = np.unique(args.times) if args.times else None
+    surv = None
+    if times is not None:
+        train_risk = risk if args.train_risk is None else pd.read_csv(args.train_risk, sep="\t", index_col=0).iloc[:, 0]
+        fit = train.loc[train.index.intersection(train_risk.index)]
+        surv = BreslowBaseline(fit[args.time_col], fit[args.event_col], train_risk.loc[fit.index]).survival(r, times)
+    print(f"{len(lab)} samples, {int(e.sum())} events | {args.n_boot} resamples, {args.workers} workers")
+
+    t0 = time.perf_counter()
+    res = bootstrap_metrics(t, e, r, times, surv, cens, args.tau, args.n_boot, args.seed, args.workers,
+                            args.block, not args.no_bca)
+    table = res.table(args.alpha)
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    print(f"done in {time.perf_counter() - t0:.1f}s")
+    if args.out:
+        table.to_csv(args.out, sep="\t", index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
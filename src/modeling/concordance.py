@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+"""
+Concordance index (Harrell, and Uno's IPCW version) in O(n log n), batched over columns.
+
+Definitions follow scikit-survival's concordance_index_censored / concordance_index_ipcw
+exactly: a pair (i, j) is comparable when i has an event and j is still at risk after
+t_i (t_j > t_i, or t_j == t_i with j censored; tied event times are not comparable); it
+is concordant when risk_i > risk_j, and counts 1/2 when |risk_i - risk_j| <= tied_tol.
+
+Instead of scanning all j for every event (O(n^2)), samples are put in time order once
+(events before censored samples at a tied time) so the comparable set of every event is
+a suffix of that order; "how many j in the suffix have risk < x" is then a 2-D dominance
+count, answered for all events and all columns together by a merge-sort tree: one
+sorted key array per level (column, block of 2^level time positions, risk rank) and one
+searchsorted per level for the blocks that make up each event's prefix.
+
+concordance_index(time, event, risk, sample_weight=None, pair_weight=None, tied_tol=1e-8)
+  -> (cindex, concordant, discordant, tied_risk, tied_time)
+  - risk: (n,) or (n, m) — m models / resamples scored at once; every output is then
+    an (m,) array (nan c-index for a column without comparable pairs)
+  - sample_weight: non-negative integer multiplicities, (n,) or (n, m) (bootstrap
+    counts); the result equals scikit-survival on the expanded sample. A 1-D risk with
+    2-D weights (one model, many resamples) shares the sort work across columns
+  - pair_weight: (n,) weight of every pair whose earlier member is i (IPCW); it enters
+    the c-index ratio only, the returned pair counts stay unweighted
+
+concordance_index_ipcw(time, event, risk, train_time=None, train_event=None, tau=None,
+                       sample_weight=None, tied_tol=1e-8)
+  - Uno's C: pair_weight = 1 / G(t_i)^2, G the censoring Kaplan-Meier of the training
+    labels (default: the evaluated labels themselves); events at or after tau get weight 0
+
+CensoringKM(time, event)
+  - Kaplan-Meier of the censoring distribution (events precede censoring at tied times,
+    as scikit-survival's CensoringDistributionEstimator); G(t) = km(t),
+    .ipcw(time, event, tau=None) -> 1 / G(t_i) for events before tau, else 0
+
+Shared helpers (also used by src/modeling/metrics.py):
+  - dominance_sums(seq, q, thr, weights=None) -> per column and query, total weight of
+    time positions before q with risk rank below thr (the merge-sort tree)
+  - rank_thresholds(risk, rows, tied_tol) -> (ranks, counts of risks < r - tol, <= r + tol)
+  - read_labels(path, time_col, event_col) -> labels TSV indexed by SAMPLE_ID, time > 0
+
+CLI (run from the repo root):
+  python -m src.modeling.concordance --risk risk.tsv --labels data_proc/metabric_labels.tsv \\
+      [--train-labels data_proc/tcga_labels.tsv] [--tau 120]
+  risk.tsv: sample id column, then one risk column per model (e.g. scorer output)
+"""
+
+import argparse, sys
+import pandas as pd, numpy as np
+from pathlib import Path
+
+MAX_KEYS = 1 << 22          # tree elements (columns × samples) per chunk
+LEAF_BITS = 4               # blocks under 16 time positions are counted by direct comparison
+
+
+class CensoringKM:
+    """Kaplan-Meier estimate of the censoring survival function (see module docstring)."""
+
+    def __init__(self, time, event):
+        time = np.asarray(time, dtype=np.float64)
+        event = np.asarray(event).astype(bool)
+        uniq, inv = np.unique(time, return_inverse=True)
+        total = np.bincount(inv)
+        d = np.bincount(inv, weights=event, minlength=len(uniq))
+        c = total - d
+        at_risk = len(time) - np.cumsum(total) + total - d
+        ratio = np.divide(c, at_risk, out=np.zeros(len(uniq)), where=c != 0)
+        self.times = np.r_[-np.inf, uniq]
+        self.prob = np.r_[1.0, np.cumprod(1.0 - ratio)]
+
+    def __call__(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        if self.prob[-1] > 0 and (t > self.times[-1]).any():
+            raise ValueError(f"censoring distribution undefined beyond the last training time "
+                             f"{self.times[-1]:g}; pass tau")
+        return np.where(t > self.times[-1], 0.0, self.prob[np.searchsorted(self.times, t, "right") - 1])
+
+    def ipcw(self, time, event, tau=None):
+        """1 / G(t_i) for events (before tau), 0 for censored samples (and times >= tau)."""
+        time = np.asarray(time, dtype=np.float64)
+        event = np.asarray(event).astype(bool) & (True if tau is None else time < tau)
+        G = self(time[event])
+        if (G == 0).any():
+            raise ValueError("censoring survival is zero at one or more event times")
+        w = np.zeros(len(event))
+        w[event] = 1.0 / G
+        return w
+
+
+def dominance_sums(seq, q, thr, weights=None):
+    """Per column and query e: total weight of time positions p < q[e] with seq[p] < thr[e].
+
+    seq: (mr, n) risk ranks in time order; q: (E,); thr: (mr, E); weights: None or
+    (mw, n) in time order, mw == mr or (shared ranks) mr == 1. Integer weights are packed
+    into the sort keys; float weights (and shared ranks) are summed along an argsort of
+    the keys instead. The last q mod 2^LEAF_BITS positions are compared directly, the
+    rest come from tree levels.
+    """
+    mr, n = seq.shape
+    floating = weights is not None and weights.dtype.kind == "f"
+    shared = weights is not None and mr == 1 and len(weights) > 1
+    W1 = 1 if weights is None or shared or floating else int(weights.max()) + 1
+    out = np.zeros((mr if weights is None else max(mr, len(weights)), len(q)),
+                   dtype=np.float64 if floating else np.int64)
+    for j in range(1 << LEAF_BITS):
+        sel = np.flatnonzero(((q >> LEAF_BITS) << LEAF_BITS) + j < q)
+        if not len(sel):
+            break
+        pos = ((q[sel] >> LEAF_BITS) << LEAF_BITS) + j
+        hit = seq[:, pos] < thr[:, sel]
+        out[:, sel] += hit if weights is None else hit * weights[:, pos]
+    c = np.arange(mr, dtype=np.int64)[:, None]
+    p = np.arange(n, dtype=np.int64)
+    low = seq * W1 + (weights if W1 > 1 else 0)      # rank (and packed weight) part of each key
+    for lvl in range(LEAF_BITS, n.bit_length()):
+        sel = np.flatnonzero((q >> lvl) & 1)
+        if not len(sel):
+            continue
+        nn = ((n - 1) >> lvl) + 1
+        key = low + (c * (nn * n * W1) + (p >> lvl) * (n * W1))
+        node = (q[sel] >> lvl) - 1                   # the level's block inside [0, q)
+        needle = ((c * nn + node) * n + thr[:, sel]) * W1
+        start = c * n + (node << lvl)
+        if shared:
+            perm = np.argsort(key[0])
+            C = np.zeros((len(weights), n + 1), dtype=weights.dtype)
+            np.cumsum(weights[:, perm], axis=1, out=C[:, 1:])
+            idx = np.searchsorted(key[0, perm], needle[0])
+            out[:, sel] += C[:, idx] - C[:, start[0]]
+            continue
+        if floating:
+            perm = np.argsort(key, axis=None)
+            C = np.r_[0.0, np.cumsum(weights.ravel()[perm])]
+            out[:, sel] += C[np.searchsorted(key.ravel()[perm], needle)] - C[start]
+            continue
+        K = np.sort(key, axis=None)
+        flat = needle.ravel()
+        o = np.argsort(flat)                         # sorted needles: cache-friendly search
+        idx = np.empty_like(o)
+        idx[o] = np.searchsorted(K, flat[o])
+        idx = idx.reshape(needle.shape)
+        if W1 == 1:
+            out[:, sel] += idx - start
+        else:
+            C = np.r_[0, np.cumsum(K % W1)]
+            out[:, sel] += C[idx] - C[start]
+    return out
+
+
+def rank_thresholds(risk, rows, tied_tol):
+    """Per column: risk ranks, and for `rows` the counts of risks < r - tol and <= r + tol."""
+    n, m = risk.shape
+    order = np.argsort(risk, axis=0, kind="stable")
+    rank = np.empty((n, m), dtype=np.int64)
+    np.put_along_axis(rank, order, np.arange(n, dtype=np.int64)[:, None], axis=0)
+    srt = np.take_along_axis(risk, order, axis=0)
+    lo = np.empty((m, len(rows)), dtype=np.int64)
+    hi = np.empty((m, len(rows)), dtype=np.int64)
+    for k in range(m):
+        r = risk[rows, k]
+        lo[k] = np.searchsorted(srt[:, k], r - tied_tol, "left")
+        hi[k] = np.searchsorted(srt[:, k], r + tied_tol, "right")
+    return rank, lo, hi
+
+
+def concordance_index(time, event, risk, sample_weight=None, pair_weight=None, tied_tol=1e-8):
+    """Harrell's C (or any pair-weighted variant) for one or many risk columns; see module docstring."""
+    time = np.asarray(time, dtype=np.float64)
+    event = np.asarray(event).astype(bool)
+    risk = np.asarray(risk, dtype=np.float64)
+    n = len(time)
+    if time.ndim != 1 or event.shape != time.shape or risk.shape[0] != n:
+        raise ValueError("time, event and risk must have the same number of samples")
+    if not np.isfinite(risk).all():
+        raise ValueError("risk scores must be finite")
+    squeeze = risk.ndim == 1 and (sample_weight is None or np.ndim(sample_weight) == 1)
+    risk = risk.reshape(n, -1)
+    if sample_weight is None:
+        W = None
+    else:
+        W = np.asarray(sample_weight)
+        if W.shape[0] != n or (W < 0).any() or (W != np.round(W)).any():
+            raise ValueError("sample_weight must be non-negative integer counts per sample")
+        W = W.reshape(n, -1).astype(np.int64)
+        if W.shape[1] not in (1, risk.shape[1]) and risk.shape[1] != 1:
+            raise ValueError(f"sample_weight has {W.shape[1]} columns for {risk.shape[1]} risk columns")
+    pw = np.ones(n) if pair_weight is None else np.asarray(pair_weight, dtype=np.float64)
+
+    # time order, events first among tied times: each event's comparable set is [q, n)
+    order = np.lexsort((~event, time))
+    t, e = time[order], event[order]
+    ev = np.flatnonzero(e)
+    t_ev = t[ev]
+    n_tied_ev = np.searchsorted(t_ev, t_ev, "right") - np.searchsorted(t_ev, t_ev, "left")
+    q = np.searchsorted(t, t_ev, "left") + n_tied_ev
+    block_end = np.searchsorted(t, t_ev, "right")
+
+    Wt = np.ones((n, 1), dtype=np.int64) if W is None else W[order]
+    suffix = np.zeros((n + 1, Wt.shape[1]), dtype=np.int64)
+    suffix[:-1] = np.cumsum(Wt[::-1], axis=0)[::-1]
+    comparable = suffix[q].T                                  # (mw, E)
+    tied_time = (suffix[q] - suffix[block_end]).T
+    w_ev = Wt[ev].T * pw[order][ev]                           # (mw, E) weight of each event row
+
+    mr, mw = risk.shape[1], Wt.shape[1]
+    shared = mr == 1 and mw > 1
+    res = {k: np.zeros(max(mr, mw)) for k in ("num", "den", "con", "dis", "tie", "ttime")}
+    step = mr if shared else max(1, MAX_KEYS // n)
+    for a in range(0, mr, step):
+        cols = slice(a, min(a + step, mr))
+        pick = (lambda v: v) if shared or mw == 1 else (lambda v: v[cols])
+        rank, lo, hi = rank_thresholds(risk[order, cols], ev, tied_tol)
+        w = pick(Wt.T)
+        # weight of all samples with rank < T, minus those before q (the merge-sort tree)
+        if shared:
+            cs = np.zeros((n + 1, mw), dtype=np.int64)
+            cs[1:] = np.cumsum(Wt[np.argsort(rank[:, 0])], axis=0)
+            below_lo, below_hi = cs[lo[0]].T, cs[hi[0]].T
+        else:
+            w = np.broadcast_to(w, rank.T.shape)
+            by_rank = np.empty(rank.shape, dtype=np.int64)
+            np.put_along_axis(by_rank, rank, w.T, axis=0)
+            cs = np.zeros((n + 1, rank.shape[1]), dtype=np.int64)
+            cs[1:] = np.cumsum(by_rank, axis=0)
+            ci = np.arange(rank.shape[1])[:, None]
+            below_lo, below_hi = cs[lo, ci], cs[hi, ci]
+        tree_w = None if W is None else w
+        before = dominance_sums(rank.T, np.r_[q, q], np.hstack([lo, hi]), tree_w)
+        less, leq = below_lo - before[:, :len(q)], below_hi - before[:, len(q):]
+        ties, comp, wi = leq - less, pick(comparable), pick(Wt[ev].T)
+        out = slice(None) if shared else cols
+        res["num"][out] = (pick(w_ev) * (less + 0.5 * ties)).sum(axis=1)
+        res["den"][out] = (pick(w_ev) * comp).sum(axis=1)
+        res["con"][out] = (wi * less).sum(axis=1)
+        res["tie"][out] = (wi * ties).sum(axis=1)
+        res["dis"][out] = (wi * (comp - leq)).sum(axis=1)
+        res["ttime"][out] = (wi * pick(tied_time)).sum(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cindex = np.where(res["den"] > 0, res["num"] / res["den"], np.nan)
+    counts = [res[k].astype(np.int64) for k in ("con", "dis", "tie", "ttime")]
+    if squeeze:
+        return (float(cindex[0]), *(int(v[0]) for v in counts))
+    return (cindex, *counts)
+
+
+def concordance_index_ipcw(time, event, risk, train_time=None, train_event=None, tau=None,
+                           sample_weight=None, tied_tol=1e-8):
+    """Uno's IPCW C-index (scikit-survival concordance_index_ipcw); see module docstring."""
+    time = np.asarray(time, dtype=np.float64)
+    event = np.asarray(event).astype(bool)
+    km = CensoringKM(time if train_time is None else train_time, event if train_event is None else train_event)
+    return concordance_index(time, event, risk, sample_weight, np.square(km.ipcw(time, event, tau)), tied_tol)
+
+
+def read_labels(path, time_col, event_col):
+    """Labels TSV (SAMPLE_ID + time/event columns) -> rows with both set and time > 0."""
+    lab = pd.read_csv(path, sep="\t").set_index("SAMPLE_ID")[[time_col, event_col]].dropna()
+    return lab[lab[time_col] > 0]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Harrell / Uno C-index of risk score columns.")
+    ap.add_argument("--risk", type=Path, required=True, help="TSV: sample id, then one column per model")
+    ap.add_argument("--labels", type=Path, default=Path("data_proc/tcga_labels.tsv"))
+    ap.add_argument("--train-labels", type=Path, default=None, help="censoring KM for Uno's C (default: --labels)")
+    ap.add_argument("--time-col", default="os_time_months")
+    ap.add_argument("--event-col", default="os_event")
+    ap.add_argument("--tau", type=float, default=None, help="truncation time for Uno's C")
+    args = ap.parse_args(argv)
+
+    risk = pd.read_csv(args.risk, sep="\t", index_col=0)
+    lab = read_labels(args.labels, args.time_col, args.event_col)
+    lab = lab.loc[lab.index.intersection(risk.index)]
+    risk = risk.loc[lab.index]
+    t, e = lab[args.time_col].to_numpy(), lab[args.event_col].to_numpy()
+    train = lab if args.train_labels is None else read_labels(args.train_labels, args.time_col, args.event_col)
+    print(f"{len(lab)} samples, {int(e.sum())} events, {risk.shape[1]} risk columns")
+
+    harrell = concordance_index(t, e, risk.to_numpy())
+    uno = concordance_index_ipcw(t, e, risk.to_numpy(), train[args.time_col], train[args.event_col], args.tau)
+    out = pd.DataFrame({"harrell_c": harrell[0], "uno_c": uno[0], "concordant": harrell[1],
+                        "discordant": harrell[2], "tied_risk": harrell[3], "tied_time": harrell[4]},
+                       index=risk.columns)
+    print(out.to_string(float_format=lambda v: f"{v:.4f}"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
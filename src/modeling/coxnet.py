@@ -0,0 +1,511 @@
+#!/usr/bin/env python
+"""
+Elastic-net penalized Cox regression over a lambda path (coordinate descent).
+
+Objective at each lambda (glmnet / scikit-survival CoxnetSurvivalAnalysis convention):
+  -loglik(beta) / n + lambda * (l1_ratio * |beta|_1 + (1 - l1_ratio) / 2 * |beta|_2^2)
+where loglik is the Breslow or Efron partial log-likelihood.
+
+RiskSets(time, event, ties="breslow")
+  - The sort order, event-time groups and tie ranks of one (time, event) sample, built
+    once and reused by every likelihood evaluation (and by every gene in the univariate
+    screen)
+  - .risk_sums(v) -> per event row, sum of v over its risk set (Efron: minus the tied
+    events' share); v is in sorted order, (n,) or (n, m)
+  - .derivatives(eta) -> (loss, gradient, diagonal Hessian) of -loglik / n with respect
+    to the linear predictor; eta is (n,) or (n, m) (m columns scored at once), in the
+    caller's sample order. One reverse cumsum + a few reduceat/cumsum passes, O(n)
+  - .hessian(XS, eta) -> exact Hessian w.r.t. the coefficients of the genes in XS;
+    .weights(eta) and .hessian_factors(XS, weights) -> its factors (Y, m), with
+    Hessian = (Y'Y - m'm) / n
+
+coxnet_path(X, time, event, l1_ratio=0.5, lambdas=None, n_lambda=100,
+            lambda_min_ratio=None, ties="breslow", tol=1e-7, max_iter=100,
+            max_features=None) -> CoxnetPath
+  - X: genes × samples (DataFrame or ndarray; the aligned z-scored matrix, used as is:
+    no standardization, float32 stays float32 for the full-width gradient)
+  - Decreasing lambdas from lambda_max (smallest lambda with all-zero coefficients)
+    down to lambda_min_ratio * lambda_max (default 0.01 if genes > samples else 1e-4),
+    each fit warm-started from the previous solution
+  - max_features: stop the path after the first lambda with more nonzero genes
+    (glmnet's dfmax); the saturated end of a p >> n path is by far its slowest part
+  - Sequential strong rules pick the genes to solve for; after convergence the full
+    gradient is checked (KKT) and violators are added back, so the path is exact
+  - Per set: proximal Newton on the Hessian of the set's genes (risk-set weighted
+    covariance, from the same cumulative sums), step halving if the penalized
+    objective would go up; stops when the quadratic model (or, on a fresh Hessian,
+    the actual objective) gains less than tol relative
+  - The Hessian is reused over Newton steps and lambdas (new genes add only their
+    rows) and rebuilt when a step shows it is stale; each quadratic model is solved
+    exactly by active-set steps on a Cholesky factor extended as genes enter, with
+    coordinate descent (Anderson extrapolation) as the fallback. The gradient and
+    objective are always exact, so the solutions are unchanged. A full 100-lambda
+    path on 18k genes × 1100 samples (~1600 genes at the end) takes about 10 s on
+    one core
+
+CoxnetPath
+  - .lambdas, .coef (genes × lambdas float64), .loss (-loglik / n), .n_nonzero, .n_iter
+  - .coef_at(i) -> pd.Series of nonzero coefficients at lambda index i
+  - .table() -> per-lambda summary DataFrame
+  - .save_coefficients(path, i) -> SYMBOL/coef TSV (read by src/modeling/scorer.py)
+
+genes_matrix(X) -> (values, gene Index): the genes × samples input convention shared
+  with src/modeling/univariate.py
+
+CLI (run from the repo root):
+  python -m src.modeling.coxnet --expr data_proc/aligned/tcga_expr_z_v1.parquet \\
+      --labels data_proc/tcga_labels.tsv [--l1-ratio 0.5] [--n-lambda 100] [--ties breslow] \\
+      [--max-features N] [--lambda-index -1] [--out-dir data_proc/models]
+  writes <out-dir>/coxnet_path.tsv (lambda, n_nonzero, loss, n_iter),
+  coxnet_path_coef.parquet (genes ever selected × lambdas) and cox_coefficients.tsv
+"""
+
+import argparse, sys, time
+import pandas as pd, numpy as np
+from pathlib import Path
+
+try:
+    from scipy.linalg import cho_solve, cholesky, solve_triangular
+    from scipy.linalg.blas import daxpy
+except ImportError:  # numpy fallbacks (slower coordinate updates and active-set solves)
+    cholesky = daxpy = None
+
+TIES = ("breslow", "efron")
+DEFAULT_OUT = Path("data_proc/models")
+
+
+class RiskSets:
+    """Sorted risk-set structure of one survival sample (see module docstring)."""
+
+    def __init__(self, time, event, ties="breslow"):
+        if ties not in TIES:
+            raise ValueError(f"unknown ties {ties!r}; choose from {TIES}")
+        time = np.asarray(time, dtype=np.float64)
+        event = np.asarray(event).astype(bool)
+        if time.ndim != 1 or time.shape != event.shape:
+            raise ValueError("time and event must be 1-D arrays of the same length")
+        if not event.any():
+            raise ValueError("no events: the partial likelihood is constant")
+        self.ties, self.n = ties, len(time)
+        self.order = np.argsort(time, kind="stable")
+        t, self.event = time[self.order], event[self.order]
+        self.ev = np.flatnonzero(self.event)                    # event rows (sorted positions)
+        self.times, self.start, self.d = np.unique(t[self.ev], return_index=True, return_counts=True)
+        self.grp = np.repeat(np.arange(len(self.times)), self.d)
+        self.first = np.searchsorted(t, self.times, "left")     # first row at risk at each event time
+        self.last = np.searchsorted(self.times, t, "right") - 1 # last event time <= t, per row (-1: none)
+        # Efron: the l-th of d tied events sees the risk set minus l/d of the tied events
+        rank = np.arange(len(self.ev)) - np.repeat(self.start, self.d)
+        self.frac = rank / np.repeat(self.d, self.d) if ties == "efron" else np.zeros(len(self.ev))
+
+    def _col(self, a, ndim):
+        return a.reshape(-1, *([1] * (ndim - 1)))
+
+    def risk_sums(self, v):
+        """Risk-set sums of sorted v at every event row, (E,) or (E, m)."""
+        rc = np.cumsum(v[::-1], axis=0)[::-1]
+        s = rc[self.first][self.grp]
+        if self.ties == "efron":
+            s = s - self._col(self.frac, v.ndim) * np.add.reduceat(v[self.ev], self.start, axis=0)[self.grp]
+        return s
+
+    def _per_row(self, per_event, weight=None):
+        """Sum over event rows with time <= each row's time (+ Efron own-group correction)."""
+        total = np.add.reduceat(per_event, self.start, axis=0)
+        cum = np.cumsum(total, axis=0)
+        out = np.zeros((self.n,) + per_event.shape[1:])
+        at = self.last >= 0
+        out[at] = cum[self.last[at]]
+        if weight is not None:
+            # tied events only count (1 - l/d)^k of their own group's terms
+            own = np.add.reduceat(per_event * self._col(weight, per_event.ndim), self.start, axis=0)
+            out[self.ev] += (own - total)[self.grp]
+        return out
+
+    def derivatives(self, eta):
+        """(loss, gradient, diagonal Hessian) of -loglik / n w.r.t. eta (see module docstring)."""
+        eta = np.asarray(eta, dtype=np.float64)[self.order]
+        top = eta.max(axis=0)
+        r = np.exp(eta - top)                   # scale-free: every term below is a ratio
+        s = self.risk_sums(r)
+        inv = 1.0 / s
+        efron = self.ties == "efron"
+        a = self._per_row(inv, 1.0 - self.frac if efron else None)
+        b = self._per_row(inv * inv, (1.0 - self.frac) ** 2 if efron else None)
+        loss = -(eta[self.ev].sum(axis=0) - (np.log(s) + top).sum(axis=0)) / self.n
+        ev = self._col(self.event, eta.ndim)
+        ra = r * a
+        grad, hess = np.empty_like(eta), np.empty_like(eta)
+        grad[self.order] = (ra - ev) / self.n
+        hess[self.order] = (ra - r * r * b) / self.n
+        return loss, grad, hess
+
+    def weights(self, eta):
+        """(r, s, w) in sorted order: exp(eta) (rescaled), risk-set sums, sqrt(r * a) row weights."""
+        eta = np.asarray(eta, dtype=np.float64)[self.order]
+        r = np.exp(eta - eta.max())
+        s = self.risk_sums(r)
+        a = self._per_row(1.0 / s, 1.0 - self.frac if self.ties == "efron" else None)
+        return r, s, np.sqrt(r * a)
+
+    def hessian_factors(self, XS, weights):
+        """(Y, m) with Hessian = (Y'Y - m'm) / n for the genes in XS, at weights(eta)."""
+        r, s, w = weights
+        Z = XS[:, self.order].T                # samples (sorted) × genes
+        return Z * w[:, None], self.risk_sums(r[:, None] * Z) / s[:, None]
+
+    def hessian(self, XS, eta):
+        """Exact Hessian of -loglik / n w.r.t. beta, for eta = XS' beta (XS: genes × samples)."""
+        Y, m = self.hessian_factors(XS, self.weights(eta))
+        return (Y.T @ Y - m.T @ m) / self.n
+
+
+class _Curvature:
+    """Hessian of the strong-set genes and a Cholesky factor of it, kept across steps.
+
+    The Hessian H is built at one linear predictor and reused over Newton steps and
+    lambdas until refresh(): genes joining the set only add their own rows (at that
+    same predictor). The factor is of K = H + l2_ref I (l2_ref: the l2 at the
+    rebuild) and grows with the coordinates the active-set solver touches; at a later,
+    smaller l2 the model Hessian is H + (l2_ref - l2) I, so K and its factor stay valid.
+    """
+
+    def __init__(self, rs):
+        self.rs, self.genes = rs, None
+
+    def refresh(self):
+        self.genes = None
+
+    def arrange(self, S):
+        """The gene set to solve for: the stored genes (in stored order), then S's new ones."""
+        if self.genes is None:
+            return S
+        return np.concatenate([self.genes, S[~np.isin(S, self.genes)]])
+
+    def matrix(self, S, XS, eta, l2):
+        """(H, fresh) for genes S = arrange(...) (rows of XS); rebuilt at eta after refresh()."""
+        rs, fresh = self.rs, self.genes is None
+        if fresh:
+            self.weights, self.l2 = rs.weights(eta), l2
+            self.Y, self.m = self._factors(XS)
+            self.H = self._product(self.Y, self.m, self.Y, self.m)
+            self.genes, self.fac, self.L = S, np.empty(0, dtype=np.int64), np.empty((0, 0))
+        elif len(S) > len(self.genes):
+            Y, m = self._factors(XS[len(self.genes):])
+            cross = self._product(Y, m, self.Y, self.m)
+            self.H = np.block([[self.H, cross.T], [cross, self._product(Y, m, Y, m)]])
+            self.Y, self.m, self.genes = np.hstack([self.Y, Y]), np.hstack([self.m, m]), S
+        return self.H, fresh
+
+    def _factors(self, XS):
+        # single precision: H only shapes the steps (the gradient and objective are exact),
+        # and the k × k products are the bulk of a rebuild
+        return [f.astype(np.float32) for f in self.rs.hessian_factors(XS, self.weights)]
+
+    def _product(self, Y1, m1, Y2, m2):
+        return (Y1.T @ Y2 - m1.T @ m2).astype(np.float64) / self.rs.n
+
+    def _K(self, rows, cols):
+        K = self.H[np.ix_(rows, cols)]
+        K[rows[:, None] == cols] += self.l2
+        return K
+
+    def solve(self, A, rhs):
+        """x_A with (H + l2_ref I)[A, A] x_A = rhs."""
+        if cholesky is None:
+            return np.linalg.solve(self._K(A, A), rhs)
+        add = A[~np.isin(A, self.fac)]
+        if len(add):                           # extend the factor by a block of rows
+            C = solve_triangular(self.L, self._K(self.fac, add), lower=True, check_finite=False)
+            L22 = cholesky(self._K(add, add) - C.T @ C, lower=True, check_finite=False)
+            L = np.zeros((len(self.fac) + len(add),) * 2, order="F")  # LAPACK's layout: no copies
+            L[:len(self.fac), :len(self.fac)] = self.L
+            L[len(self.fac):] = np.hstack([C.T, L22])
+            self.L = L
+            self.fac = np.concatenate([self.fac, add])
+        drop = np.flatnonzero(~np.isin(self.fac, A))
+        if len(drop) > 16:                     # refactor rather than carry many zeros
+            self.fac, self.L = A, cholesky(self._K(A, A), lower=True, check_finite=False)
+            drop = drop[:0]
+        where = np.full(len(self.genes), -1)
+        where[self.fac] = np.arange(len(self.fac))
+        c = np.zeros(len(self.fac))
+        c[where[A]] = rhs
+        y = cho_solve((self.L, True), c, check_finite=False)
+        if len(drop):                          # dropped coordinates held at zero (Schur complement)
+            E = np.zeros((len(self.fac), len(drop)))
+            E[drop, np.arange(len(drop))] = 1.0
+            V = solve_triangular(self.L, E, lower=True, check_finite=False)
+            mu = np.linalg.solve(V.T @ V, y[drop])
+            y -= solve_triangular(self.L, V @ mu, lower=True, trans="T", check_finite=False)
+        return y[where[A]]
+
+
+def _soft(u, t):
+    return u - t if u > t else (u + t if u < -t else 0.0)
+
+
+def _objective(G, b, x, l1, l2):
+    return 0.5 * x @ (G @ x) - b @ x + l1 * np.abs(x).sum() + 0.5 * l2 * (x @ x)
+
+
+def _qp(G, b, x, l1, l2, solve, max_steps=200):
+    """Minimize the _cd objective by active-set (feature-sign) steps, in place on x.
+
+    Each step solves the linear system of the current support and signs (solve(A, rhs):
+    (G + l2 I)[A, A] x_A = rhs) and moves towards it up to the first sign change
+    (Lee et al. 2007); coordinates violating |b - (G + l2 I) x| <= l1 join the support
+    only once it is optimal. Returns None if it has not converged in max_steps.
+    """
+    solved, top = False, -1
+    for _ in range(max_steps):
+        s = np.sign(x)
+        if solved:
+            r = b - G @ x - l2 * x
+            viol = np.flatnonzero((x == 0) & (np.abs(r) > l1 * (1 + 1e-9)))
+            if not len(viol):
+                return x
+            s[viol] = np.sign(r[viol])
+            top = viol[np.abs(r[viol]).argmax()]
+        while True:
+            A = np.flatnonzero(s)
+            try:
+                xA = solve(A, b[A] - l1 * s[A])
+            except np.linalg.LinAlgError:   # not positive definite on this support
+                return None
+            # entering coordinates whose sign comes out wrong are left out; the largest
+            # violator stays (entering alone, a coordinate always keeps its sign)
+            wrong = A[(np.sign(xA) != s[A]) & (x[A] == 0) & (A != top)]
+            if not len(wrong):
+                break
+            s[wrong] = 0.0
+        flip = np.sign(xA) != s[A]
+        if not flip.any():
+            x[A], solved = xA, True
+            continue
+        d = xA - x[A]
+        t = np.full(len(A), np.inf)
+        t[flip] = -x[A][flip] / d[flip]
+        first = t.min()
+        x[A] += first * d
+        x[A[t <= first]] = 0.0
+        solved = False
+    return None
+
+
+def _cd(G, b, beta, l1, l2, tol, max_sweeps=1000, anderson=5):
+    """Minimize 1/2 x'Gx - b'x + l1 |x|_1 + l2/2 |x|^2 over x, in place on beta.
+
+    Cyclic coordinate descent with Anderson extrapolation: every `anderson` sweeps
+    over the nonzeros, the last iterates are combined into an extrapolated point,
+    kept only if it lowers the objective (Bertrand & Massias 2021). On the strongly
+    correlated Gram matrices at the end of a path this cuts the number of sweeps
+    several-fold.
+    """
+    diag = np.diag(G).tolist()
+    denom = (np.diag(G) + l2).tolist()
+    g = b - G @ beta                           # g_j = b_j - (G beta)_j, kept current
+    rows = list(G)                             # G is symmetric: row j == column j
+    full, last = True, []
+    for _ in range(max_sweeps):
+        idx = range(len(beta)) if full else np.flatnonzero(beta)
+        biggest = 0.0
+        for j in idx:
+            old = beta[j]
+            new = _soft(g[j] + diag[j] * old, l1) / denom[j]
+            if new != old:
+                delta = new - old
+                beta[j] = new
+                if daxpy is not None:
+                    g = daxpy(rows[j], g, a=-delta)     # in place, no temporary
+                else:
+                    g -= delta * rows[j]
+                biggest = max(biggest, delta * delta * denom[j])
+        if biggest < tol:
+            if full:
+                break
+            full, last = True, []              # nonzeros converged: confirm with a full sweep
+            continue
+        full = False                           # cycle on the nonzeros until they settle
+        last.append(beta.copy())
+        if len(last) > anderson:
+            X = np.array(last)
+            U = np.diff(X, axis=0)
+            try:
+                c = np.linalg.solve(U @ U.T + 1e-12 * np.eye(anderson), np.ones(anderson))
+            except np.linalg.LinAlgError:
+                c = None
+            if c is not None and np.isfinite(c).all() and c.sum() != 0:
+                extra = (c / c.sum()) @ X[1:]
+                if _objective(G, b, extra, l1, l2) < _objective(G, b, beta, l1, l2):
+                    beta[:] = extra
+                    g = b - G @ beta
+            last = []
+    return beta
+
+
+class CoxnetPath:
+    """Coefficient path of coxnet_path() (see module docstring)."""
+
+    def __init__(self, genes, lambdas, coef, loss, n_iter, l1_ratio, ties):
+        self.genes, self.lambdas, self.coef = genes, lambdas, coef
+        self.loss, self.n_iter = loss, n_iter
+        self.l1_ratio, self.ties = l1_ratio, ties
+        self.n_nonzero = (coef != 0).sum(axis=0)
+
+    def coef_at(self, i=-1):
+        c = pd.Series(self.coef[:, i], index=self.genes, name="coef")
+        return c[c != 0]
+
+    def table(self):
+        return pd.DataFrame({"lambda": self.lambdas, "n_nonzero": self.n_nonzero,
+                             "loss": self.loss, "n_iter": self.n_iter})
+
+    def save_coefficients(self, path, i=-1):
+        self.coef_at(i).to_frame().to_csv(path, sep="\t")
+        return path
+
+
+def _fit_set(S, XS, beta, curv, rs, l1, l2, tol, max_iter, state):
+    """Penalized proximal-Newton fit over the genes S (rows of XS), warm-started at beta."""
+    obj = state[0] + l1 * np.abs(beta).sum() + l2 / 2 * (beta @ beta)
+    eta, it, gain = XS.T @ beta, 0, np.inf
+    for it in range(1, max_iter + 1):
+        H, fresh = curv.matrix(S, XS, eta, l2)
+        shift = curv.l2 - l2                   # model Hessian: H + shift I
+        grad = XS @ state[1]
+        b = H @ beta + shift * beta - grad
+        nxt = _qp(H, b, beta.copy(), l1, curv.l2, curv.solve)
+        if nxt is None:
+            nxt = _cd(H + shift * np.eye(len(S)), b, beta.copy(), l1, l2, tol * 1e-2)
+        step = nxt - beta
+        # decrease predicted by the quadratic model; small -> this is the last step
+        pred = obj - (state[0] + grad @ step + 0.5 * step @ (H @ step) + shift / 2 * (step @ step)
+                      + l1 * np.abs(nxt).sum() + l2 / 2 * (nxt @ nxt))
+        last = pred <= tol * abs(obj)
+        t = 1.0
+        while True:                            # step halving on the penalized objective
+            cand = beta + t * step
+            eta = XS.T @ cand
+            new_state = rs.derivatives(eta)
+            new_obj = new_state[0] + l1 * np.abs(cand).sum() + l2 / 2 * (cand @ cand)
+            if new_obj <= obj + 1e-12 * abs(obj) or t < 1e-6:
+                break
+            t /= 2
+        done = last or fresh and obj - new_obj <= tol * abs(new_obj)
+        # a reused Hessian is rebuilt once the model stops predicting the objective, or
+        # converges slowly (each step should gain far less than the one before)
+        if t < 1 or obj - new_obj < 0.5 * pred or pred > 0.1 * gain:
+            curv.refresh()
+        beta, obj, state, gain = cand, new_obj, new_state, pred
+        if done:
+            break
+    return beta, state, it
+
+
+def genes_matrix(X):
+    """(values, gene Index) of a genes × samples DataFrame or array (RangeIndex "gene")."""
+    if isinstance(X, pd.DataFrame):
+        return X.to_numpy(), pd.Index(X.index, name="SYMBOL")
+    X = np.asarray(X)
+    return X, pd.RangeIndex(X.shape[0], name="gene")
+
+
+def coxnet_path(X, time, event, l1_ratio=0.5, lambdas=None, n_lambda=100, lambda_min_ratio=None,
+                ties="breslow", tol=1e-7, max_iter=100, max_features=None):
+    """Elastic-net Cox fit over a decreasing lambda path (see module docstring)."""
+    values, genes = genes_matrix(X)
+    if values.dtype not in (np.float32, np.float64):
+        values = values.astype(np.float64)
+    p, n = values.shape
+    rs = RiskSets(time, event, ties)
+    if len(rs.order) != n:
+        raise ValueError(f"X has {n} samples, labels have {len(rs.order)}")
+
+    state = rs.derivatives(np.zeros(n))
+    full_grad = values @ state[1].astype(values.dtype)
+    if lambdas is None:
+        lam_max = np.abs(full_grad).max() / max(l1_ratio, 1e-3)
+        ratio = lambda_min_ratio or (0.01 if p > n else 1e-4)
+        lambdas = lam_max * np.logspace(0, np.log10(ratio), n_lambda)
+    lambdas = np.asarray(lambdas, dtype=np.float64)
+
+    beta = np.zeros(p)
+    coef = np.zeros((p, len(lambdas)))
+    losses, iters = np.zeros(len(lambdas)), np.zeros(len(lambdas), dtype=np.int64)
+    ever = np.zeros(p, dtype=bool)
+    curv = _Curvature(rs)
+    prev = lambdas[0]
+    for k, lam in enumerate(lambdas):
+        l1, l2 = lam * l1_ratio, lam * (1 - l1_ratio)
+        # sequential strong rule, plus everything that has been nonzero
+        strong = ever | (np.abs(full_grad) >= l1_ratio * (2 * lam - prev))
+        while True:
+            # genes of the stored Hessian stay in the set until it is rebuilt (a
+            # superset of the strong set: the KKT check below is unchanged)
+            S = curv.arrange(np.flatnonzero(strong))
+            strong[S] = True
+            if len(S):
+                XS = values[S].astype(np.float64)
+                beta_S, state, it = _fit_set(S, XS, beta[S], curv, rs, l1, l2, tol, max_iter, state)
+                beta[:] = 0
+                beta[S] = beta_S
+                iters[k] += it
+            # KKT check over all genes: zero coefficients need |gradient + l2 beta| <= l1
+            full_grad = values @ state[1].astype(values.dtype)
+            viol = ~strong & (np.abs(full_grad) > l1 * (1 + 1e-6))
+            if not viol.any():
+                break
+            strong |= viol
+        ever |= beta != 0
+        coef[:, k] = beta
+        losses[k] = state[0]
+        prev = lam
+        if max_features is not None and (beta != 0).sum() > max_features:
+            k += 1
+            lambdas, coef, losses, iters = lambdas[:k], coef[:, :k], losses[:k], iters[:k]
+            break
+    return CoxnetPath(genes, lambdas, coef, losses, iters, l1_ratio, ties)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fit an elastic-net Cox path on a genes × samples matrix.")
+    ap.add_argument("--expr", type=Path, default=Path("data_proc/aligned/tcga_expr_z_v1.parquet"))
+    ap.add_argument("--labels", type=Path, default=Path("data_proc/tcga_labels.tsv"))
+    ap.add_argument("--time-col", default="os_time_months")
+    ap.add_argument("--event-col", default="os_event")
+    ap.add_argument("--l1-ratio", type=float, default=0.5)
+    ap.add_argument("--n-lambda", type=int, default=100)
+    ap.add_argument("--lambda-min-ratio", type=float, default=None)
+    ap.add_argument("--ties", choices=TIES, default="breslow")
+    ap.add_argument("--max-features", type=int, default=None, help="stop the path beyond this many genes")
+    ap.add_argument("--lambda-index", type=int, default=-1, help="path position saved as cox_coefficients.tsv")
+    ap.add_argument("--out-dir", type=Path, default=DEFAULT_OUT)
+    args = ap.parse_args(argv)
+
+    X = pd.read_parquet(args.expr)
+    labels = pd.read_csv(args.labels, sep="\t").set_index("SAMPLE_ID")
+    labels = labels.reindex(X.columns)[[args.time_col, args.event_col]].dropna()
+    labels = labels[labels[args.time_col] > 0]
+    X = X[labels.index]
+    print(f"fitting: {X.shape[0]} genes × {X.shape[1]} samples, {int(labels[args.event_col].sum())} events")
+
+    t0 = time.perf_counter()
+    path = coxnet_path(X, labels[args.time_col], labels[args.event_col], args.l1_ratio,
+                       n_lambda=args.n_lambda, lambda_min_ratio=args.lambda_min_ratio, ties=args.ties,
+                       max_features=args.max_features)
+    print(f"path: {len(path.lambdas)} lambdas in {time.perf_counter() - t0:.1f}s | "
+          f"nonzero at the end: {path.n_nonzero[-1]}")
+
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    path.table().to_csv(args.out_dir / "coxnet_path.tsv", sep="\t", index=False)
+    sel = (path.coef != 0).any(axis=1)
+    pd.DataFrame(path.coef[sel], index=path.genes[sel],
+                 columns=[f"{lam:.6g}" for lam in path.lambdas]).to_parquet(args.out_dir / "coxnet_path_coef.parquet")
+    out = path.save_coefficients(args.out_dir / "cox_coefficients.tsv", args.lambda_index)
+    print(f"saved: {out} ({path.n_nonzero[args.lambda_index]} genes at lambda={path.lambdas[args.lambda_index]:.4g})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+"""
+Time-dependent AUC and Brier score (scikit-survival definitions) over a time grid, batched.
+
+Every metric takes optional sample_weight: non-negative integer multiplicities, (n,) or
+(n, B); B weight columns (bootstrap resamples) are scored in one call and the result
+equals scikit-survival on each expanded sample. Predictions are batched the same way:
+risk (n, M) / surv (n, T, M) score M models at once (weight and prediction columns
+pair up; either may be a single column). The censoring distribution G is a
+src/modeling/concordance.py CensoringKM, fitted once on the training labels (default:
+the evaluated labels) and kept fixed across columns and time points.
+
+A dense grid costs about as much as a few points: every case/control pair (i, j) with
+t_i < t_j counts for the grid points t_i <= t < t_j, so with samples in time order the
+AUC numerator at t is a prefix sum of per-sample pair weights (later lower-risk
+samples of each event minus earlier higher-risk cases of each sample, two merge-sort
+tree passes of concordance.py), read off at every grid point with one searchsorted.
+Grids under GRID_POINTS points are scored point by point (cheaper there).
+
+BreslowBaseline(time, event, risk)
+  - Breslow cumulative baseline hazard H0 of a fitted linear predictor
+  - .survival(risk, times) -> (n, T) S(t | x) = exp(-H0(t) * exp(risk))
+
+cumulative_dynamic_auc(time, event, risk, times, censoring=None, sample_weight=None,
+                       tied_tol=1e-8) -> (auc, mean_auc)
+  - cases: event at or before t, weighted 1 / G(t_i); controls: event-free after t;
+    risk ties count 1/2. auc: (T,) or (T, columns); mean_auc: AUC averaged over the
+    Kaplan-Meier event distribution of the evaluated sample (single t: auc itself)
+
+brier_score(time, event, surv, times, censoring=None, sample_weight=None) -> (T,) or (T, columns)
+  - surv: (n, T) predicted survival probabilities at times, or (n, T, M)
+integrated_brier_score(...) -> trapezoid of brier_score over times / (t_max - t_min)
+
+grid_metrics(time, event, times, risk=None, surv=None, censoring=None, sample_weight=None,
+             tied_tol=1e-8) -> {"auc", "mean_auc", "brier", "ibs"} (those computable)
+  - one censoring fit for everything; ibs needs at least two time points
+
+CLI (run from the repo root):
+  python -m src.modeling.metrics --risk risk.tsv --labels data_proc/metabric_labels.tsv \\
+      --times 36 60 120 [--train-labels data_proc/tcga_labels.tsv --train-risk tcga_risk.tsv]
+  python -m src.modeling.metrics --risk risk.tsv --labels data_proc/metabric_labels.tsv --grid 12 120 200
+  risk.tsv: sample id, then one risk column per model; survival curves use the Breslow
+  baseline of the training risk/labels (default: the evaluated sample)
+"""
+
+import argparse, sys
+import pandas as pd, numpy as np
+from pathlib import Path
+
+from src.modeling.concordance import MAX_KEYS, CensoringKM, dominance_sums, rank_thresholds, read_labels
+
+GRID_POINTS = 24            # from this many time points on, AUC takes the single pass over time order
+
+
+class BreslowBaseline:
+    """Breslow cumulative baseline hazard of a linear predictor (see module docstring)."""
+
+    def __init__(self, time, event, risk):
+        time = np.asarray(time, dtype=np.float64)
+        event = np.asarray(event).astype(bool)
+        risk = np.asarray(risk, dtype=np.float64)
+        self.times, inv = np.unique(time, return_inverse=True)
+        d = np.bincount(inv, weights=event, minlength=len(self.times))
+        r = np.bincount(inv, weights=np.exp(risk - risk.max()), minlength=len(self.times))
+        at_risk = np.cumsum(r[::-1])[::-1]
+        self.cumhaz = np.cumsum(d / at_risk) * np.exp(-risk.max())
+
+    def survival(self, risk, times):
+        idx = np.searchsorted(self.times, np.asarray(times, dtype=np.float64), "right") - 1
+        h0 = np.where(idx >= 0, self.cumhaz[np.maximum(idx, 0)], 0.0)
+        return np.exp(-np.outer(np.exp(np.asarray(risk, dtype=np.float64)), h0))
+
+
+def _prepare(time, event, times, censoring, sample_weight):
+    time = np.asarray(time, dtype=np.float64)
+    event = np.asarray(event).astype(bool)
+    times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+    if time.ndim != 1 or event.shape != time.shape:
+        raise ValueError("time and event must be 1-D arrays of the same length")
+    if censoring is None:
+        censoring = CensoringKM(time, event)
+    W = np.ones((len(time), 1), dtype=np.int64) if sample_weight is None else np.asarray(sample_weight)
+    if W.shape[0] != len(time) or (W < 0).any() or (W != np.round(W)).any():
+        raise ValueError("sample_weight must be non-negative integer counts per sample")
+    squeeze = sample_weight is None or W.ndim == 1
+    return time, event, times, censoring, W.reshape(len(time), -1).astype(np.float64), squeeze
+
+
+def _check_columns(m, W, what):
+    if W.shape[1] not in (1, m) and m != 1:
+        raise ValueError(f"sample_weight has {W.shape[1]} columns for {m} {what} columns")
+
+
+def _km(time, event, W, times):
+    """Weighted Kaplan-Meier of the evaluated sample at times, (T, B)."""
+    uniq, inv = np.unique(time, return_inverse=True)
+    d = np.zeros((len(uniq), W.shape[1]))
+    total = np.zeros_like(d)
+    np.add.at(d, inv[event], W[event])
+    np.add.at(total, inv, W)
+    at_risk = np.cumsum(total[::-1], axis=0)[::-1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        S = np.cumprod(1.0 - np.where(d > 0, d / at_risk, 0.0), axis=0)
+    idx = np.searchsorted(uniq, times, "right") - 1
+    return np.where((idx >= 0)[:, None], S[np.maximum(idx, 0)], 1.0)
+
+
+def _rank_totals(rank, w, thr):
+    """(columns, queries) weight of all samples with rank < thr; w: (mw, n) in time order."""
+    if rank.shape[1] == 1:
+        cs = np.zeros((len(w), len(rank) + 1), dtype=w.dtype)
+        np.cumsum(w[:, np.argsort(rank[:, 0])], axis=1, out=cs[:, 1:])
+        return cs[:, thr[0]]
+    by_rank = np.empty(rank.T.shape, dtype=w.dtype)
+    np.put_along_axis(by_rank, rank.T, np.broadcast_to(w, by_rank.shape), axis=1)
+    cs = np.zeros((len(by_rank), len(rank) + 1), dtype=w.dtype)
+    np.cumsum(by_rank, axis=1, out=cs[:, 1:])
+    return np.take_along_axis(cs, thr, axis=1)
+
+
+def _pair_sums(t, e, risk, Wt, wc, tied_tol):
+    """Per sample p in time order (n, columns): wc_p * P_p - w_p * Q_p, where
+    P_p = weight of later samples with a lower risk (events only) and Q_p = case weight
+    of earlier events with a higher risk (risk ties 1/2). Summed over the samples with
+    t_p <= t this is the case/control pair weight at t of the cumulative/dynamic AUC:
+    every pair i (event) / j with t_i < t_j counts for t_i <= t < t_j."""
+    n, mr = risk.shape
+    mw = Wt.shape[1]
+    ev = np.flatnonzero(e)
+    after, before = np.searchsorted(t, t, "right"), np.searchsorted(t, t, "left")
+    unit = (Wt == 1).all()
+    out = np.zeros((n, max(mr, mw)))
+    step = mr if mr == 1 else max(1, MAX_KEYS // n)
+    for a in range(0, mr, step):
+        cols = slice(a, min(a + step, mr))
+        rank, lo, hi = rank_thresholds(risk[:, cols], np.arange(n), tied_tol)
+        m = rank.shape[1]
+        pick = (lambda v: v) if mw == 1 or mr == 1 else (lambda v: v[cols])
+        w, c = pick(Wt.T), pick(wc.T)
+        if mr > 1:
+            w, c = np.broadcast_to(w, (m, n)), np.ascontiguousarray(np.broadcast_to(c, (m, n)))
+        # P: all lower-risk weight minus the part at or before t_i (merge-sort tree)
+        tree_w = None if unit else w.astype(np.int64)
+        lower = _rank_totals(rank, w, np.hstack([lo[:, ev], hi[:, ev]]))
+        lower = lower - dominance_sums(rank.T, np.r_[after[ev], after[ev]], np.hstack([lo[:, ev], hi[:, ev]]), tree_w)
+        P = (lower[:, :len(ev)] + lower[:, len(ev):]) / 2
+        # Q: earlier case weight minus its part with risk below (half of the ties)
+        cum = np.zeros((len(c), n + 1))
+        np.cumsum(c, axis=1, out=cum[:, 1:])
+        lower = dominance_sums(rank.T, np.r_[before, before], np.hstack([lo, hi]), c)
+        Q = cum[:, before] - (lower[:, :n] + lower[:, n:]) / 2
+        res = -(w * Q)
+        res[:, ev] += c[:, ev] * P
+        out[:, slice(None) if mr == 1 else cols] = res.T
+    return out
+
+
+def _auc_by_point(time, event, risk, W, ipcw, times, tied_tol):
+    """(T, columns) AUC numerators, one control cumsum in risk order per time point."""
+    mr, mw = risk.shape[1], W.shape[1]
+    num = np.empty((len(times), max(mr, mw)))
+    for c in range(mr):
+        w = W if mr == 1 or mw == 1 else W[:, c:c + 1]
+        order = np.argsort(risk[:, c], kind="stable")
+        srt = risk[order, c]
+        for k, t in enumerate(times):
+            cases = np.flatnonzero(event & (time <= t))
+            cs = np.zeros((len(time) + 1, w.shape[1]))
+            np.cumsum((w * (time > t)[:, None])[order], axis=0, out=cs[1:])   # control weight by risk rank
+            lo = cs[np.searchsorted(srt, risk[cases, c] - tied_tol, "left")]
+            hi = cs[np.searchsorted(srt, risk[cases, c] + tied_tol, "right")]
+            num[k, slice(None) if mr == 1 else c] = (w[cases] * ipcw[cases, None] * (lo + hi)).sum(axis=0) / 2
+    return num
+
+
+def cumulative_dynamic_auc(time, event, risk, times, censoring=None, sample_weight=None, tied_tol=1e-8):
+    """Cumulative/dynamic AUC at each of times; see module docstring."""
+    time, event, times, censoring, W, squeeze = _prepare(time, event, times, censoring, sample_weight)
+    risk = np.asarray(risk, dtype=np.float64)
+    if risk.shape[0] != len(time) or not np.isfinite(risk).all():
+        raise ValueError("risk must hold finite scores for every sample")
+    squeeze = squeeze and risk.ndim == 1
+    risk = risk.reshape(len(time), -1)
+    _check_columns(risk.shape[1], W, "risk")
+    ipcw = censoring.ipcw(time, event, np.nextafter(times.max(), np.inf))   # only cases need G
+    order = np.argsort(time, kind="stable")
+    t, Wt = time[order], W[order]
+    wc = Wt * ipcw[order, None]
+    # every term is a prefix sum over time order, read off at each grid point
+    at = np.searchsorted(t, times, "right")
+    if len(times) < GRID_POINTS:
+        num = _auc_by_point(time, event, risk, W, ipcw, times, tied_tol)
+    else:
+        num = np.zeros((len(t) + 1, max(risk.shape[1], W.shape[1])))
+        np.cumsum(_pair_sums(t, event[order], risk[order], Wt, wc, tied_tol), axis=0, out=num[1:])
+        num = num[at]
+    cases = np.r_[np.zeros((1, W.shape[1])), np.cumsum(wc, axis=0)][at]
+    controls = Wt.sum(axis=0) - np.r_[np.zeros((1, W.shape[1])), np.cumsum(Wt, axis=0)][at]
+    den = cases * controls
+    with np.errstate(invalid="ignore", divide="ignore"):
+        auc = np.where(den > 0, num / den, np.nan)
+    if len(times) == 1:
+        mean_auc = auc[0]
+    else:
+        S = _km(time, event, W, times)
+        d = -np.diff(np.vstack([np.ones((1, W.shape[1])), S]), axis=0)
+        mean_auc = (auc * d).sum(axis=0) / (1.0 - S[-1])
+    return (auc[:, 0], float(mean_auc[0])) if squeeze else (auc, mean_auc)
+
+
+def brier_score(time, event, surv, times, censoring=None, sample_weight=None):
+    """Brier score of predicted survival curves at each of times; see module docstring."""
+    time, event, times, censoring, W, squeeze = _prepare(time, event, times, censoring, sample_weight)
+    surv = np.asarray(surv, dtype=np.float64)
+    squeeze = squeeze and surv.ndim <= 2
+    surv = surv.reshape(len(time), len(times), -1)
+    _check_columns(surv.shape[2], W, "surv")
+    G_t = censoring(times)
+    G_y = np.ones(len(time))
+    cases = event & (time <= times.max())
+    G_y[cases] = censoring(time[cases])
+    G_t[G_t == 0] = np.inf
+    G_y[G_y == 0] = np.inf
+    # (n, T) weight of S^2 (cases by t) and of (1 - S)^2 (still event-free after t)
+    case = (event[:, None] & (time[:, None] <= times)) / G_y[:, None]
+    control = (time[:, None] > times) / G_t
+    term = case[..., None] * surv ** 2 + control[..., None] * (1.0 - surv) ** 2
+    if surv.shape[2] == 1:
+        bs = term[..., 0].T @ W
+    else:
+        bs = np.einsum("itc,ic->tc", term, np.broadcast_to(W, (len(time), surv.shape[2])))
+    bs /= W.sum(axis=0)
+    return bs[:, 0] if squeeze else bs
+
+
+def integrated_brier_score(time, event, surv, times, censoring=None, sample_weight=None):
+    """Trapezoid of brier_score over times divided by the time span."""
+    times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+    if len(times) < 2:
+        raise ValueError("at least two time points are needed")
+    bs = brier_score(time, event, surv, times, censoring, sample_weight)
+    return np.trapezoid(bs, times, axis=0) / (times[-1] - times[0])
+
+
+def grid_metrics(time, event, times, risk=None, surv=None, censoring=None, sample_weight=None, tied_tol=1e-8):
+    """AUC / Brier / IBS over a whole time grid with one censoring fit; see module docstring."""
+    times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+    if censoring is None:
+        censoring = CensoringKM(time, event)
+    out = {}
+    if risk is not None:
+        out["auc"], out["mean_auc"] = cumulative_dynamic_auc(time, event, risk, times, censoring, sample_weight,
+                                                             tied_tol)
+    if surv is not None:
+        out["brier"] = brier_score(time, event, surv, times, censoring, sample_weight)
+        if len(times) > 1:
+            out["ibs"] = np.trapezoid(out["brier"], times, axis=0) / (times[-1] - times[0])
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Time-dependent AUC and Brier score of risk scores.")
+    ap.add_argument("--risk", type=Path, required=True, help="TSV: sample id, one risk column per model")
+    ap.add_argument("--labels", type=Path, default=Path("data_proc/tcga_labels.tsv"))
+    grid = ap.add_mutually_exclusive_group(required=True)
+    grid.add_argument("--times", type=float, nargs="+")
+    grid.add_argument("--grid", type=float, nargs=3, metavar=("START", "STOP", "N"), help="N evenly spaced times")
+    ap.add_argument("--train-labels", type=Path, default=None, help="censoring KM / Breslow baseline labels")
+    ap.add_argument("--train-risk", type=Path, default=None, help="risk of the training samples (Breslow)")
+    ap.add_argument("--time-col", default="os_time_months")
+    ap.add_argument("--event-col", default="os_event")
+    ap.add_argument("--out", type=Path, default=None, help="per-time AUC / Brier table TSV")
+    args = ap.parse_args(argv)
+
+    risk = pd.read_csv(args.risk, sep="\t", index_col=0)
+    lab = read_labels(args.labels, args.time_col, args.event_col)
+    lab = lab.loc[lab.index.intersection(risk.index)]
+    t, e, r = lab[args.time_col].to_numpy(), lab[args.event_col].to_numpy(), risk.loc[lab.index].to_numpy()
+    train = lab if args.train_labels is None else read_labels(args.train_labels, args.time_col, args.event_col)
+    train_risk = risk if args.train_risk is None else pd.read_csv(args.train_risk, sep="\t", index_col=0)
+    train = train.loc[train.index.intersection(train_risk.index)]
+    train_risk = train_risk.loc[train.index, risk.columns]
+    if args.grid:
+        times = np.linspace(args.grid[0], args.grid[1], int(args.grid[2]))
+    else:
+        times = np.unique(args.times)
+
+    cens = CensoringKM(train[args.time_col], train[args.event_col])
+    surv = np.stack([BreslowBaseline(train[args.time_col], train[args.event_col], train_risk[c]).survival(r[:, k], times)
+                     for k, c in enumerate(risk.columns)], axis=2)
+    res = grid_metrics(t, e, times, r, surv, cens)
+    out = pd.concat({m: pd.DataFrame(res[m], index=pd.Index(times, name="time"), columns=risk.columns)
+                     for m in ("auc", "brier")}, axis=1)
+    print(f"{len(lab)} samples, {int(e.sum())} events, {risk.shape[1]} models, {len(times)} time points")
+    print(out.to_string(float_format=lambda v: f"{v:.4f}", max_rows=20))
+    summary = pd.DataFrame({"mean_auc": res["mean_auc"]}, index=risk.columns)
+    if "ibs" in res:
+        summary["ibs"] = res["ibs"]
+    print(summary.to_string(float_format=lambda v: f"{v:.4f}"))
+    if args.out:
+        out.to_csv(args.out, sep="\t")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,438 @@
+#!/usr/bin/env python
+"""
+Low-latency risk scoring of new STAR count files against a fitted linear model.
+
+Everything that does not depend on the incoming sample is done once, at load time:
+the reference gene layout, the duplicate-symbol plan, the row positions of the model
+genes (via the gene registry), their scaler mean/std and the coefficient vector.
+Scoring a file is then: byte-level parse of the count column -> collapse -> log2(CPM+1)
+-> gather model genes -> float32 z-score -> dot product.
+
+CompiledLayout(reference, engine="auto")
+  - Precompiled reader for files on the reference layout: one pass over the raw bytes
+    finds the tab/newline offsets, checks the header and the gene_id/gene_name bytes
+    of every row against the reference (so a file is only read on the fast path when
+    it would pass the star_utils layout digest), and decodes the count column with
+    vectorized digit arithmetic
+  - .counts(text) -> int64 counts (layout.keep order) or None when the file is off
+    the reference layout or the count column holds anything but plain integers
+
+RiskScorer(reference, scaler=DEFAULT_SCALER, model=DEFAULT_MODEL, registry=DEFAULT_REGISTRY)
+  - scaler: ZScaler or tcga_scaler_stats.tsv; model: coefficient Series or TSV
+    (SYMBOL, coef; zero coefficients are dropped); registry: GeneRegistry, TSV path, or
+    None (symbols only)
+  - .vectors(sources) -> (names, samples × model genes float32 z matrix)
+  - .score(sources) -> pd.Series of risk scores (linear predictor), indexed by name
+  - sources are paths or raw file bytes (gzip allowed). Numbers equal the batch
+    pipeline: 3D-C (median collapse, int32 counts) -> 3D-D logCPM -> aligned genes ->
+    ZScaler float32 transform -> z @ coef. Files off the reference layout take the
+    read_star_counts() path (genes absent from the file count as 0, as in 3D-C)
+
+MicroBatcher(fn, max_batch=32, max_wait_ms=2.0)
+  - .submit(item) -> concurrent.futures.Future; one worker thread drains the queue,
+    waiting at most max_wait_ms for up to max_batch items, so requests that arrive
+    together share one stacked collapse/logCPM/z-score/dot pass
+
+serve(scorer, port=0, max_batch=32, max_wait_ms=2.0) -> (server, base_url)
+  - ThreadingHTTPServer on 127.0.0.1:
+    POST /score  body = one STAR file (raw or gzip) -> {"name", "risk", "ms"}
+                 (X-Sample-Id header names the sample)
+                 or JSON {"paths": [...]} -> {"results": [{"path", "risk"} | {"path", "error"}], "ms"}
+    GET /health  -> {"ok", "genes", "requests", "batches", "samples"}
+
+Model coefficients are written by the Cox fitting code (default
+data_proc/models/cox_coefficients.tsv).
+
+CLI (run from the repo root):
+  python -m src.modeling.scorer score data_raw/new_samples/ [more files/dirs] [--out risk.tsv]
+  python -m src.modeling.scorer serve --port 8766 [--max-batch 32 --max-wait-ms 2]
+  common: [--reference STAR_FILE] [--scaler PATH] [--model PATH] [--registry PATH]
+  then e.g.: curl --data-binary @sample.tsv http://127.0.0.1:8766/score
+"""
+
+import argparse, gzip, json, queue, sys, threading, time
+import pandas as pd, numpy as np
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from src.preprocess.collapse import DuplicatePlan, collapse_duplicates
+from src.preprocess.gene_registry import DEFAULT_PATH as DEFAULT_REGISTRY, GeneRegistry, encode_index
+from src.preprocess.normalize import library_divisors, logcpm_values
+from src.preprocess.scaler import ZScaler
+from src.star_utils import parse_star_file, sniff_header, star_columns, star_layout
+
+STAR_ROOT = Path("data_raw/gdc_star_counts_primary")
+DEFAULT_SCALER = Path("data_proc/aligned/tcga_scaler_stats.tsv")
+DEFAULT_MODEL = Path("data_proc/models/cox_coefficients.tsv")
+
+
+def _raw_text(src):
+    """(name, uncompressed bytes) for a path or in-memory file content."""
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        name, data = None, bytes(src)
+    else:
+        name, data = Path(src).name, Path(src).read_bytes()
+    return name, gzip.decompress(data) if data[:2] == b"\x1f\x8b" else data
+
+
+def default_reference(root=STAR_ROOT):
+    """First downloaded STAR file (every GDC file of one release shares its layout)."""
+    for p in sorted(Path(root).rglob("*")):
+        if p.is_file() and p.name.endswith((".tsv", ".tsv.gz")):
+            return p
+    raise FileNotFoundError(f"no STAR files under {root}; pass --reference")
+
+
+def load_model(path=DEFAULT_MODEL):
+    """Coefficient Series indexed by SYMBOL from a SYMBOL/coef TSV."""
+    df = pd.read_csv(path, sep="\t", dtype={"SYMBOL": str}, float_precision="round_trip")
+    return df.set_index("SYMBOL")["coef"].astype(np.float64)
+
+
+class CompiledLayout:
+    """Byte-level count reader for files on one reference layout (see module docstring)."""
+
+    def __init__(self, reference, engine="auto"):
+        self.layout = star_layout(reference, engine)
+        _, text = _raw_text(reference)
+        _, header = sniff_header(reference, text)
+        gene_id_col, gene_name_col, count_col = star_columns(header)
+        self.header = "\t".join(header).encode()
+        self.n_tabs = len(header) - 1
+        self.count_field = header.index(count_col)
+        self.key_field = max(header.index(c) for c in (gene_id_col, gene_name_col) if c is not None)
+        # the gene key bytes must end before the count field, or no two files would match
+        self.enabled = self.n_tabs > 0 and self.key_field < self.count_field
+        if not self.enabled:
+            return
+        fields = self._fields(text)
+        if fields is None:
+            raise ValueError(f"{reference}: not a rectangular tab-separated table")
+        a, starts, delims = fields
+        self.key_len = delims[1:, self.key_field] - starts[1:]
+        # offset of every key byte from its line start (reused for each file)
+        off = np.repeat(np.cumsum(self.key_len) - self.key_len, self.key_len)
+        self._within = np.arange(len(off), dtype=np.int64) - off
+        self.key = a[np.repeat(starts[1:], self.key_len) + self._within]
+        if self.counts(text) is None:
+            raise ValueError(f"{reference}: count column {count_col!r} is not plain integers")
+
+    def _fields(self, text):
+        """(uint8 bytes from the header line on, line starts, (lines × columns) field end offsets) or None."""
+        off = 0
+        while text.startswith(b"#", off):
+            off = text.index(b"\n", off) + 1
+        if not text.endswith(b"\n"):
+            text += b"\n"
+        a = np.frombuffer(text, dtype=np.uint8)[off:]
+        # one scan for tabs and newlines together (bytes < 9 fail the check below)
+        delims = np.flatnonzero(a <= 10)
+        n_cols = self.n_tabs + 1
+        if len(delims) % n_cols or len(delims) < 2 * n_cols:
+            return None
+        delims = delims.reshape(-1, n_cols)
+        # every line: exactly n_tabs tabs, then its newline
+        if not ((a[delims[:, -1]] == 10).all() and (a[delims[:, :-1]] == 9).all()):
+            return None
+        return a, np.r_[0, delims[:-1, -1] + 1], delims
+
+    def counts(self, text):
+        """Count column of a file on the reference layout (kept rows, int64), else None."""
+        if not self.enabled:
+            return None
+        fields = self._fields(text)
+        if fields is None:
+            return None
+        a, starts, delims = fields
+        if len(starts) - 1 != len(self.key_len) or a[:delims[0, -1]].tobytes() != self.header:
+            return None
+        if not np.array_equal(delims[1:, self.key_field] - starts[1:], self.key_len):
+            return None
+        if not np.array_equal(a[np.repeat(starts[1:], self.key_len) + self._within], self.key):
+            return None
+
+        f = self.count_field
+        e = delims[1:, f]
+        width = e - delims[1:, f - 1] - 1
+        values = np.zeros(len(e), dtype=np.int64)
+        scale = 1
+        # digits right to left; positions left of a short field are masked out
+        for j in range(1, int(width.max()) + 1):
+            if j > 18:
+                return None
+            d = a[e - j].astype(np.int64) - 48
+            d[width < j] = 0
+            if ((d < 0) | (d > 9)).any():
+                return None                    # signs, decimals, NA tokens: use the parser
+            values += d * scale
+            scale *= 10
+        return values[self.layout.keep]
+
+
+class RiskScorer:
+    """Load-once scorer: STAR files -> aligned float32 z vectors -> risk (see module docstring)."""
+
+    def __init__(self, reference, scaler=DEFAULT_SCALER, model=DEFAULT_MODEL, registry=DEFAULT_REGISTRY,
+                 engine="auto"):
+        self.engine = engine
+        self.reader = CompiledLayout(reference, engine)
+        self.plan = DuplicatePlan(self.reader.layout.index)
+        scaler = scaler if isinstance(scaler, ZScaler) else ZScaler.load(scaler)
+        coef = model if isinstance(model, pd.Series) else load_model(model)
+        if isinstance(registry, GeneRegistry):
+            self.registry = registry
+        else:
+            self.registry = GeneRegistry.load(registry) if registry and Path(registry).exists() else GeneRegistry()
+
+        coef = coef[coef != 0]
+        self.genes = pd.Index(coef.index, name="SYMBOL")
+        self.coef = coef.to_numpy(dtype=np.float64)
+        mean, std = scaler.aligned(self.genes)
+        self.mean, self.std = mean[:, None], std[:, None]
+        self._lock = threading.Lock()         # registry updates from off-layout files
+        self.registry.add(self.plan.index)
+        self.codes = self.registry.encode(self.genes)
+        if (self.codes < 0).any():
+            raise KeyError(f"{int((self.codes < 0).sum())} model genes unknown to the registry, "
+                           f"e.g. {list(self.genes[self.codes < 0][:5])}")
+        self.pos = self._positions(self.plan.index)
+        if (self.pos < 0).any():
+            raise KeyError(f"{int((self.pos < 0).sum())} model genes missing from the reference layout, "
+                           f"e.g. {list(self.genes[self.pos < 0][:5])}")
+
+    def _positions(self, index):
+        """Row of every model gene in a collapsed index (-1 when absent)."""
+        with self._lock:
+            self.registry.add(index)
+            codes, rows = encode_index(self.registry, index)
+            lut = np.full(len(self.registry), -1, dtype=np.int64)
+        lut[codes] = rows
+        return lut[self.codes]
+
+    def _parse(self, text):
+        """(int32 counts, None) in layout.keep order, or (collapsed counts, model-gene rows) off-layout."""
+        counts = self.reader.counts(text)
+        if counts is not None:
+            return counts.astype(np.int32), None
+        # off-layout (or non-integer) file: the read_star_counts() Series, collapsed on its own
+        s, _, _ = parse_star_file("sample.tsv", self.reader.layout, self.engine, data=text)
+        if isinstance(s, np.ndarray):
+            return s, None
+        Xc = collapse_duplicates(s.to_frame(), "median").fillna(0).astype("int32")
+        return Xc.iloc[:, 0].to_numpy(), self._positions(Xc.index)
+
+    def _z(self, fixed, other):
+        """z matrix (model genes × samples) for fast-path counts + (counts, rows) off-layout pairs."""
+        blocks = []
+        if fixed:
+            coll = self.plan.apply(np.stack(fixed, axis=1)).astype(np.int32)     # 3D-C: median -> int32
+            libs = coll.sum(axis=0, dtype=np.int64)
+            blocks.append(logcpm_values(coll[self.pos], library_divisors(libs)))
+        for counts, rows in other:
+            x = np.zeros((len(rows), 1), dtype=np.int32)
+            x[rows >= 0, 0] = counts[rows[rows >= 0]]                            # absent genes -> 0
+            libs = np.array([counts.sum(dtype=np.int64)])
+            blocks.append(logcpm_values(x, library_divisors(libs)))
+        x = np.concatenate(blocks, axis=1) if len(blocks) > 1 else blocks[0]
+        np.subtract(x, self.mean, out=x)
+        np.divide(x, self.std, out=x)
+        return x
+
+    def _batch(self, sources):
+        """Per-source (name, z column or Exception), z columns from one stacked pass."""
+        names, parsed = [], []
+        for i, src in enumerate(sources):
+            try:
+                name, text = _raw_text(src)
+                parsed.append(self._parse(text))
+            except Exception as e:             # one bad file must not fail its batch
+                name = e
+                parsed.append(None)
+            names.append(name)
+        ok = [i for i, p in enumerate(parsed) if p is not None]
+        fixed = [i for i in ok if parsed[i][1] is None]
+        other = [i for i in ok if parsed[i][1] is not None]
+        out = list(names)
+        if ok:
+            z = self._z([parsed[i][0] for i in fixed], [parsed[i] for i in other])
+            for j, i in enumerate(fixed + other):
+                out[i] = (names[i], z[:, j])
+        return out
+
+    def score_batch(self, sources):
+        """Risk per source (float or Exception); the MicroBatcher entry point."""
+        results = []
+        for r in self._batch(sources):
+            results.append(r if isinstance(r, Exception) else float(r[1].astype(np.float64) @ self.coef))
+        return results
+
+    def vectors(self, sources):
+        """(names, samples × model genes float32 z matrix); raises on the first unreadable source."""
+        rows = self._batch(sources)
+        for r in rows:
+            if isinstance(r, Exception):
+                raise r
+        names = [name or f"sample{i}" for i, (name, _) in enumerate(rows)]
+        return names, np.stack([z for _, z in rows]) if rows else np.empty((0, len(self.genes)), np.float32)
+
+    def score(self, sources):
+        names, z = self.vectors(sources)
+        return pd.Series(z.astype(np.float64) @ self.coef, index=pd.Index(names, name="sample"), name="risk")
+
+
+class MicroBatcher:
+    """Collect concurrent submissions into batches for one worker thread (see module docstring)."""
+
+    def __init__(self, fn, max_batch=32, max_wait_ms=2.0):
+        self.fn, self.max_batch, self.max_wait = fn, max_batch, max_wait_ms / 1000
+        self.batches = self.items = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        fut = Future()
+        self._queue.put((item, fut))
+        return fut
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while (first := self._queue.get()) is not None:
+            batch, deadline = [first], time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    nxt = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._queue.put(None)      # finish this batch, then stop
+                    break
+                batch.append(nxt)
+            items, futs = zip(*batch)
+            try:
+                results = self.fn(list(items))
+            except Exception as e:
+                results = [e] * len(futs)
+            self.batches += 1
+            self.items += len(futs)
+            for fut, r in zip(futs, results):
+                fut.set_exception(r) if isinstance(r, Exception) else fut.set_result(r)
+
+
+def serve(scorer, port=0, max_batch=32, max_wait_ms=2.0):
+    """Start the HTTP scorer (see module docstring) -> (server, base_url)."""
+    batcher = MicroBatcher(scorer.score_batch, max_batch, max_wait_ms)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code, body, headers=()):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") != "/health":
+                return self._send(404, {"message": f"unknown path {self.path}"})
+            self._send(200, {"ok": True, "genes": len(scorer.genes), "requests": server.requests,
+                             "batches": batcher.batches, "samples": batcher.items})
+
+        def do_POST(self):
+            t0 = time.perf_counter()
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                server.requests += 1
+            if self.path.rstrip("/") != "/score":
+                return self._send(404, {"message": f"unknown path {self.path}"})
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                try:
+                    paths = [str(p) for p in json.loads(body or b"{}")["paths"]]
+                except (ValueError, KeyError, TypeError) as e:
+                    return self._send(400, {"message": f"expected {{\"paths\": [...]}}: {e}"})
+                futs = [batcher.submit(p) for p in paths]
+                results = []
+                for p, fut in zip(paths, futs):
+                    try:
+                        results.append({"path": p, "risk": fut.result()})
+                    except Exception as e:
+                        results.append({"path": p, "error": str(e)})
+                return self._send(200, {"results": results, "ms": (time.perf_counter() - t0) * 1e3})
+            try:
+                risk = batcher.submit(body).result()
+            except Exception as e:
+                return self._send(422, {"message": str(e)})
+            self._send(200, {"name": self.headers.get("X-Sample-Id"), "risk": risk,
+                             "ms": (time.perf_counter() - t0) * 1e3})
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.requests = 0
+    server.daemon_threads = True
+    server.batcher = batcher
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _star_files(paths):
+    for p in map(Path, paths):
+        if p.is_dir():
+            yield from sorted(f for f in p.rglob("*") if f.is_file() and f.name.endswith((".tsv", ".tsv.gz")))
+        else:
+            yield p
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Score STAR count files with a fitted linear model.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sc = sub.add_parser("score", help="score files / directories in batch")
+    sc.add_argument("paths", nargs="+")
+    sc.add_argument("--out", type=Path, default=None, help="TSV (sample, risk); default stdout")
+    sc.add_argument("--batch", type=int, default=64, help="files per stacked pass")
+    sv = sub.add_parser("serve", help="local HTTP endpoint")
+    sv.add_argument("--port", type=int, default=8766)
+    sv.add_argument("--max-batch", type=int, default=32)
+    sv.add_argument("--max-wait-ms", type=float, default=2.0)
+    for p in (sc, sv):
+        p.add_argument("--reference", type=Path, default=None, help="STAR file with the reference layout")
+        p.add_argument("--scaler", type=Path, default=DEFAULT_SCALER)
+        p.add_argument("--model", type=Path, default=DEFAULT_MODEL)
+        p.add_argument("--registry", type=Path, default=DEFAULT_REGISTRY)
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    scorer = RiskScorer(args.reference or default_reference(), args.scaler, args.model, args.registry)
+    print(f"loaded {len(scorer.genes)} model genes in {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+
+    if args.cmd == "serve":
+        server, url = serve(scorer, args.port, args.max_batch, args.max_wait_ms)
+        print(f"scorer: POST STAR files to {url}/score (Ctrl-C to stop)", file=sys.stderr)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    files = list(_star_files(args.paths))
+    t0, parts = time.perf_counter(), []
+    for i in range(0, len(files), args.batch):
+        parts.append(scorer.score(files[i:i + args.batch]))
+    ms = (time.perf_counter() - t0) * 1e3
+    risk = pd.concat(parts) if parts else pd.Series(dtype=np.float64, name="risk")
+    risk.to_csv(args.out or sys.stdout, sep="\t", header=True)
+    print(f"scored {len(risk)} files in {ms:.0f} ms ({ms / max(len(risk), 1):.2f} ms/sample)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+"""
+Incremental DAG runner for the data pipeline (TCGA and METABRIC branches).
+
+Every stage declares its command, inputs and outputs (STAGES below). Dependencies
+follow from outputs -> inputs, so the TCGA and METABRIC branches are independent and
+run in parallel; the notebook 02 alignment joins them.
+
+A stage is fresh when its fingerprint matches the last successful run and its outputs
+are still the bytes that run wrote. The fingerprint hashes:
+  - code:   the script/notebook plus every src module it imports (followed recursively)
+  - params: the stage's extra CLI arguments
+  - inputs: file contents (globs and directories expanded to sorted file lists)
+Stale stages rerun; a stage whose upstream reran but wrote identical bytes stays fresh.
+
+File digests are cached by (size, mtime_ns) in data_proc/.pipeline/state.json, so a
+no-op rebuild only stats files (seconds, even over ~1.1k STAR files) instead of
+rehashing gigabytes. Stage logs go to data_proc/.pipeline/logs/<stage>.log.
+
+CLI (run from the repo root):
+  python -m src.pipeline status                 # fresh/stale per stage, with the reason
+  python -m src.pipeline run [STAGE ...] [--jobs 2] [--force] [--dry-run]
+      runs stale stages (targets + everything upstream of them; default: all)
+  python -m src.pipeline mark [STAGE ...]       # record current files as fresh (no run),
+                                                # e.g. to adopt outputs built before the runner
+  python -m src.pipeline dag                    # stages, dependencies, branches
+"""
+
+import argparse, fnmatch, glob, hashlib, json, os, re, subprocess, sys, threading, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import NamedTuple
+
+STATE_DIR = Path("data_proc/.pipeline")
+STATE_VERSION = 1
+
+
+class Stage(NamedTuple):
+    name: str
+    script: str            # scripts/*.py or notebooks/*.ipynb (run from the repo root)
+    inputs: tuple          # files, directories or glob patterns
+    outputs: tuple         # files written by the stage
+    params: tuple = ()     # extra CLI arguments (part of the fingerprint)
+    branch: str = ""
+
+    def command(self):
+        if self.script.endswith(".ipynb"):
+            # executes a copy; the tracked notebook (and its code hash) stay untouched
+            return [sys.executable, "-m", "nbconvert", "--to", "notebook", "--execute",
+                    "--ExecutePreprocessor.kernel_name=python3", "--ExecutePreprocessor.timeout=-1",
+                    "--output-dir", str(STATE_DIR / "notebooks"), self.script, *self.params]
+        return [sys.executable, self.script, *self.params]
+
+
+MB_RAW = "data_raw/metabric/cbioportal"
+MB_BUNDLE = f"{MB_RAW}/*.tar.gz"      # METABRIC scripts read extracted files or the tarball
+
+STAGES = [
+    # TCGA
+    Stage("tcga_file_metadata", "scripts/fetch_tcga_file_metadata.py",
+          ("data_raw/gdc/manifest_tcga_brca_star_counts_primary.txt",),
+          ("data_proc/tcga_file_metadata.tsv",), branch="tcga"),
+    Stage("tcga_clinical_core", "scripts/build_tcga_clinical_core.py",
+          ("data_raw/gdc/clinical/clinical.tsv", "data_raw/gdc/clinical/follow_up.tsv"),
+          ("data_proc/tcga_clinical_core.tsv",), branch="tcga"),
+    Stage("tcga_survival_join", "scripts/join_tcga_clinical_counts.py",
+          ("data_proc/tcga_clinical_core.tsv", "data_proc/tcga_file_metadata.tsv"),
+          ("data_proc/tcga_survival_join.tsv",), branch="tcga"),
+    Stage("tcga_counts", "scripts/3d_c_build_tcga_counts.py",
+          ("data_proc/tcga_survival_join.tsv", "data_raw/gdc_star_counts_primary",
+           "data_raw/gdc/manifest_tcga_brca_star_counts_primary.txt"),
+          ("data_proc/tcga_counts_raw.parquet", "data_proc/tcga_counts_integrity.tsv"), branch="tcga"),
+    Stage("tcga_logcpm", "scripts/3d_d_logcpm_and_labels.py",
+          ("data_proc/tcga_counts_raw.parquet", "data_proc/tcga_survival_join.tsv"),
+          ("data_proc/tcga_expr_logcpm.parquet", "data_proc/tcga_labels.tsv"), branch="tcga"),
+    # METABRIC
+    Stage("metabric_clinical_core", "scripts/build_metabric_clinical_core.py",
+          (f"{MB_RAW}/data_clinical_patient*", MB_BUNDLE),
+          ("data_proc/metabric_clinical_core.tsv",), branch="metabric"),
+    Stage("metabric_sample_survival", "scripts/build_metabric_sample_survival.py",
+          (f"{MB_RAW}/data_clinical_sample*", MB_BUNDLE, "data_proc/metabric_clinical_core.tsv"),
+          ("data_proc/metabric_sample_survival.tsv",), branch="metabric"),
+    Stage("metabric_matched_samples", "scripts/prepare_metabric_expression.py",
+          (f"{MB_RAW}/data_mrna*microarray*.txt", MB_BUNDLE, "data_proc/metabric_sample_survival.tsv"),
+          ("data_proc/metabric_matched_samples.txt",), branch="metabric"),
+    Stage("metabric_expression", "scripts/prepare_metabric_expression_3c.py",
+          (f"{MB_RAW}/data_mrna*microarray*.txt", MB_BUNDLE, "data_proc/metabric_matched_samples.txt",
+           "data_proc/metabric_sample_survival.tsv"),
+          ("data_proc/metabric_expr_raw.parquet", "data_proc/metabric_labels.tsv"), branch="metabric"),
+    # join: notebook 02 (intersect, align, scale)
+    Stage("align_scale", "notebooks/02_intersect_align_scale.ipynb",
+          ("data_proc/tcga_expr_logcpm.parquet", "data_proc/tcga_labels.tsv",
+           "data_proc/metabric_expr_raw.parquet", "data_proc/metabric_labels.tsv"),
+          ("data_proc/aligned/tcga_expr_aligned.parquet", "data_proc/aligned/metabric_expr_aligned.parquet",
+           "data_proc/aligned/tcga_scaler_stats.tsv", "data_proc/aligned/tcga_expr_z_v1.parquet",
+           "data_proc/aligned/metabric_expr_z_v1.parquet")),
+]
+
+
+# ---------- hashing ----------
+
+class FileHasher:
+    """blake2b content digests, cached by (size, mtime_ns) across runs (thread-safe)."""
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else {}
+        self.hashed = 0   # files actually read this run
+        self.lock = threading.Lock()
+
+    def digest(self, path):
+        st = os.stat(path)
+        key = str(path)
+        hit = self.cache.get(key)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            return hit[2]
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as fh:
+            while chunk := fh.read(1 << 20):
+                h.update(chunk)
+        with self.lock:   # --jobs workers hash concurrently with State.save()
+            self.cache[key] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+            self.hashed += 1
+        return h.hexdigest()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.cache)
+
+
+def expand(pattern):
+    """Sorted files for an input entry: a glob, a directory (recursive) or a single file."""
+    if glob.has_magic(pattern):
+        paths = glob.glob(pattern, recursive=True)
+    elif os.path.isdir(pattern):
+        paths = [str(p) for p in Path(pattern).rglob("*")]
+    else:
+        paths = [pattern]
+    return sorted(p for p in paths if os.path.isfile(p))
+
+
+_FROM = re.compile(r"^[ \t]*from\s+(src(?:\.\w+)*)\s+import\s+(\([^)]*\)|[\w \t,]+)", re.M)
+_IMPORT = re.compile(r"^[ \t]*import\s+(src(?:\.\w+)+)", re.M)
+
+
+def _source_text(path):
+    if str(path).endswith(".ipynb"):
+        with open(path) as fh:
+            nb = json.load(fh)
+        return "\n".join("".join(c["source"]) for c in nb["cells"] if c["cell_type"] == "code")
+    return Path(path).read_text()
+
+
+def code_files(script):
+    """The script plus every src module it imports, followed recursively."""
+    seen, todo = [], [Path(script)]
+    while todo:
+        p = todo.pop()
+        if p in seen or not p.exists():
+            continue
+        seen.append(p)
+        text = _source_text(p)
+        mods = [m for m, names in _FROM.findall(text)]
+        mods += [f"{m}.{n.split()[0]}" for m, names in _FROM.findall(text)
+                 for n in names.strip("()").split(",") if n.strip()]
+        mods += _IMPORT.findall(text)
+        for m in mods:
+            base = Path(*m.split("."))
+            todo += [base.with_suffix(".py"), base / "__init__.py"]
+    return sorted(seen)
+
+
+# ---------- state ----------
+
+class State:
+    def __init__(self, root=STATE_DIR):
+        self.path = Path(root) / "state.json"
+        self.lock = threading.Lock()
+        data = {}
+        if self.path.exists():
+            with open(self.path) as fh:
+                data = json.load(fh)
+            if data.get("version") != STATE_VERSION:
+                data = {}
+        self.stages = data.get("stages", {})
+        self.hasher = FileHasher(data.get("files", {}))
+
+    def save(self):
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f"state.{os.getpid()}.tmp")
+            with open(tmp, "w") as fh:
+                json.dump({"version": STATE_VERSION, "stages": self.stages,
+                           "files": self.hasher.snapshot()}, fh)
+            os.replace(tmp, self.path)
+
+
+def fingerprint(stage, hasher):
+    parts = {
+        "code": {str(p): hasher.digest(p) for p in code_files(stage.script)},
+        "params": list(stage.params),
+        "inputs": {pat: [(p, hasher.digest(p)) for p in expand(pat)] for pat in stage.inputs},
+    }
+    return hashlib.blake2b(json.dumps(parts, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def output_digests(stage, hasher):
+    return {p: hasher.digest(p) if os.path.isfile(p) else None for p in stage.outputs}
+
+
+def staleness(stage, state):
+    """None if the stage is fresh, else a short reason."""
+    rec = state.stages.get(stage.name)
+    if rec is None:
+        return "never run"
+    missing = [p for p in stage.outputs if not os.path.isfile(p)]
+    if missing:
+        return f"missing output {missing[0]}"
+    if rec["fingerprint"] != fingerprint(stage, state.hasher):
+        return "code/params/inputs changed"
+    if rec["outputs"] != output_digests(stage, state.hasher):
+        return "outputs modified since last run"
+    return None
+
+
+# ---------- graph ----------
+
+def dependencies(stages):
+    """{stage: set of upstream stage names} from outputs matched against input patterns."""
+    deps = {}
+    for s in stages:
+        deps[s.name] = {u.name for u in stages if u is not s and any(
+            out == pat or fnmatch.fnmatch(out, pat) or out.startswith(pat.rstrip("/") + "/")
+            for out in u.outputs for pat in s.inputs)}
+    return deps
+
+
+def with_upstream(targets, deps):
+    keep, todo = set(), list(targets)
+    while todo:
+        n = todo.pop()
+        if n not in keep:
+            keep.add(n)
+            todo += deps[n]
+    return keep
+
+
+def _execute(stage, state, force, dry_run):
+    """Decide (and run) one stage once its upstream is done -> (status, detail)."""
+    reason = "forced" if force else staleness(stage, state)
+    if reason is None:
+        return "fresh", ""
+    if dry_run:
+        return "would run", reason
+    log = STATE_DIR / "logs" / f"{stage.name}.log"
+    log.parent.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    with open(log, "w") as fh:
+        rc = subprocess.run(stage.command(), stdout=fh, stderr=subprocess.STDOUT).returncode
+    secs = time.perf_counter() - t0
+    if rc != 0:
+        return "failed", f"exit {rc} after {secs:.1f}s (see {log})"
+    missing = [p for p in stage.outputs if not os.path.isfile(p)]
+    if missing:
+        return "failed", f"did not write {missing[0]} (see {log})"
+    record(stage, state, secs)
+    return "ran", f"{reason}; {secs:.1f}s"
+
+
+def record(stage, state, secs=None):
+    rec = {"fingerprint": fingerprint(stage, state.hasher),
+           "outputs": output_digests(stage, state.hasher),
+           "finished": time.strftime("%Y-%m-%d %H:%M:%S"), "seconds": secs}
+    with state.lock:
+        state.stages[stage.name] = rec
+    state.save()
+
+
+def run(stages, targets=None, jobs=2, force=(), dry_run=False, state=None):
+    """Run stale stages in dependency order, independent ones in parallel -> {name: (status, detail)}.
+
+    `force` names stages to rerun even when fresh (their upstream still runs only if stale).
+    """
+    state = state or State()
+    by_name = {s.name: s for s in stages}
+    deps = dependencies(stages)
+    todo = with_upstream(targets or list(by_name), deps)
+    results, running = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while todo or running:
+            for name in sorted(todo):
+                up = deps[name]
+                if any(results[u][0] in ("failed", "blocked") for u in up if u in results):
+                    results[name] = ("blocked", "upstream failed")
+                    print(f"[{'blocked':>9}] {name}  upstream failed", flush=True)
+                    todo.discard(name)
+                elif all(u in results for u in up):
+                    if dry_run and any(results[u][0] == "would run" for u in up):
+                        # a dry run cannot know what upstream would write: assume it changes
+                        fut = pool.submit(lambda: ("would run", "upstream reruns"))
+                    else:
+                        fut = pool.submit(_execute, by_name[name], state, name in force, dry_run)
+                    running[fut] = name
+                    todo.discard(name)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                results[name] = fut.result()
+                print(f"[{results[name][0]:>9}] {name}  {results[name][1]}".rstrip(), flush=True)
+    if not dry_run:
+        state.save()
+    return results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Incremental pipeline runner (see module docstring).")
+    ap.add_argument("command", choices=["run", "status", "mark", "dag"])
+    ap.add_argument("stages", nargs="*", help="target stages (default: all)")
+    ap.add_argument("--jobs", type=int, default=2, help="stages run in parallel (independent branches)")
+    ap.add_argument("--force", action="store_true", help="run: rerun targets even if fresh")
+    ap.add_argument("--dry-run", action="store_true", help="run: only report what would run")
+    args = ap.parse_args(argv)
+
+    names = {s.name for s in STAGES}
+    unknown = [n for n in args.stages if n not in names]
+    if unknown:
+        ap.error(f"unknown stage(s) {unknown}; choose from {sorted(names)}")
+    deps = dependencies(STAGES)
+
+    if args.command == "dag":
+        for s in STAGES:
+            print(f"{s.name:<26} branch={s.branch or '-':<9} after: {', '.join(sorted(deps[s.name])) or '-'}")
+        return 0
+
+    t0 = time.perf_counter()
+    state = State()
+    if args.command == "status":
+        selected = [s for s in STAGES if not args.stages or s.name in args.stages]
+        for s in selected:
+            reason = staleness(s, state)
+            print(f"[{'fresh' if reason is None else 'stale':>5}] {s.name:<26} {reason or ''}".rstrip())
+        state.save()
+    elif args.command == "mark":
+        for s in STAGES:
+            if (not args.stages or s.name in args.stages) and all(os.path.isfile(p) for p in s.outputs):
+                record(s, state)
+                print("marked fresh:", s.name)
+    else:
+        if args.force and not args.stages:
+            ap.error("--force needs explicit target stages")
+        results = run(STAGES, args.stages or None, args.jobs, set(args.stages) if args.force else (),
+                      args.dry_run, state)
+        print(f"done in {time.perf_counter() - t0:.1f}s | files hashed: {state.hasher.hashed}")
+        return 1 if any(r[0] in ("failed", "blocked") for r in results.values()) else 0
+    print(f"({time.perf_counter() - t0:.2f}s, files hashed: {state.hasher.hashed})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Collapse duplicate gene symbols in a genes × samples matrix.
+
+collapse_duplicates(X, strategy="median") -> pd.DataFrame
+  - "median":   per-sample median over duplicate rows (NaN-skipping); identical to
+                X.groupby(level=0).median(numeric_only=True), including the sorted
+                index and the result dtype (float64 for ints, float32 stays float32)
+  - "max_mean": keep the duplicate row with the highest mean across samples
+  - "first":    keep the first duplicate row (original row order)
+
+Only the duplicated symbols (a few hundred out of ~60k) are touched: the plan finds
+duplicate groups once, unique rows are copied straight to their output slot, and
+medians are taken with NumPy on one (groups × size × samples) block per group size.
+DuplicatePlan can be built once and reused for any number of matrices (or single
+sample vectors) that share the same row labels.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+STRATEGIES = ("median", "max_mean", "first")
+
+
+class DuplicatePlan:
+    """Row grouping for one index: output labels, unique rows, duplicate blocks."""
+
+    def __init__(self, index):
+        index = pd.Index(index)
+        codes, labels = pd.factorize(index, sort=True)   # NaN labels -> -1 (dropped, like groupby)
+        self.index = pd.Index(labels, name=index.name)
+        self.n_rows = len(index)
+        sizes = np.bincount(codes[codes >= 0], minlength=len(labels))
+
+        rows = np.arange(len(codes))
+        single = (codes >= 0) & (sizes[np.maximum(codes, 0)] == 1)
+        self.unique_rows = rows[single]             # source rows copied as-is
+        self.unique_out = codes[single]             # ... and their output positions
+
+        # duplicate groups, bucketed by group size: out positions + (groups × size) source rows
+        dup = (codes >= 0) & ~single
+        order = rows[dup][np.argsort(codes[dup], kind="stable")]  # grouped, original order kept inside
+        self.blocks = []
+        if len(order):
+            grp_codes = codes[order]
+            starts = np.flatnonzero(np.r_[True, grp_codes[1:] != grp_codes[:-1]])
+            grp_sizes = np.diff(np.r_[starts, len(order)])
+            for k in np.unique(grp_sizes):
+                sel = starts[grp_sizes == k]
+                src = order[sel[:, None] + np.arange(k)]
+                self.blocks.append((grp_codes[sel], src))
+
+    @property
+    def n_duplicate_rows(self):
+        return int(sum(src.size for _, src in self.blocks))
+
+    def apply(self, values, strategy="median"):
+        """Collapse a (rows × samples) or (rows,) array; returns (len(self.index), ...) array."""
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown strategy {strategy!r}; choose from {STRATEGIES}")
+        values = np.asarray(values)
+        if values.shape[0] != self.n_rows:
+            raise ValueError(f"expected {self.n_rows} rows, got {values.shape[0]}")
+        if strategy == "median":
+            # groupby().median() semantics: ints -> float64, floats keep their dtype
+            dtype = values.dtype if values.dtype.kind == "f" else np.dtype(np.float64)
+        else:
+            dtype = values.dtype
+        out = np.empty((len(self.index),) + values.shape[1:], dtype=dtype)
+        # unique rows: copy in slabs so the gather temporary stays small
+        for i in range(0, len(self.unique_rows), 8192):
+            out[self.unique_out[i:i + 8192]] = values[self.unique_rows[i:i + 8192]]
+        for out_pos, src in self.blocks:
+            block = values[src]                       # (groups, k, ...)
+            if strategy == "median":
+                with warnings.catch_warnings():       # all-NaN groups -> NaN, as in pandas
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    out[out_pos] = np.nanmedian(block.astype(np.float64), axis=1)
+            elif strategy == "first":
+                out[out_pos] = block[:, 0]
+            else:
+                b = block.astype(np.float64).reshape(block.shape[0], block.shape[1], -1)
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    means = np.nanmean(b, axis=2)
+                means = np.where(np.isnan(means), -np.inf, means)
+                pick = np.argmax(means, axis=1)        # first row wins ties
+                out[out_pos] = block[np.arange(block.shape[0]), pick]
+        return out
+
+
+def collapse_duplicates(X, strategy="median", plan=None):
+    """Collapse duplicate row labels of a genes × samples DataFrame (see module docstring)."""
+    if plan is None:
+        plan = DuplicatePlan(X.index)
+    X = X.select_dtypes("number") if strategy == "median" else X
+    out = plan.apply(X.to_numpy(), strategy)
+    return pd.DataFrame(out, index=plan.index, columns=X.columns)
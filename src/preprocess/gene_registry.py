@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""
+Integer-coded gene registry for cross-cohort intersection and alignment.
+
+GeneRegistry()
+  - Stable integer codes: code i is row i of .symbols (canonical, upper-case); codes are
+    only ever appended, so a saved registry keeps its codes across runs
+  - Three lookup tiers, tried in order: canonical symbol, Ensembl gene id (version
+    stripped, e.g. ENSG00000141510.18 -> ENSG00000141510), alias / previous symbol
+  - .add(symbols) -> codes: registers labels that do not resolve yet
+  - .add_ensembl(gene_ids, symbols): links Ensembl ids to symbols (STAR gene_id /
+    gene_name columns); rows without a symbol register the bare Ensembl id
+  - .add_hgnc(path): approved symbols, Ensembl ids and alias/previous symbols from a
+    local HGNC complete-set TSV; aliases pointing at several genes are dropped
+  - .encode(labels, tiers=False) -> int32 codes (-1: unknown), vectorized hash lookups
+  - .decode(codes) -> canonical symbols
+  - .save(path) / GeneRegistry.load(path): TSV (code, symbol, ensembl_ids, aliases)
+
+encode_index(reg, index) -> (codes, rows)
+  - Codes of a matrix index with one row per code: when several rows resolve to the
+    same gene (e.g. a symbol and its alias), the best tier wins, then the first row
+common_codes(*codes) -> np.ndarray (NumPy intersection of the known codes)
+align_rows(X, reg, codes) -> pd.DataFrame
+  - Rows of X in `codes` order via one np.take; index relabelled to canonical symbols
+align_cohorts(reg, *frames) -> (aligned frames, codes)
+  - Shared genes (sorted by symbol) of every frame, each frame aligned to them; genes
+    whose names differ only by alias are matched instead of dropped
+
+CLI (run from the repo root):
+  python -m src.preprocess.gene_registry build --star <one STAR counts file> \
+      [--hgnc data_raw/hgnc/hgnc_complete_set.txt] [--out data_proc/gene_registry.tsv]
+  python -m src.preprocess.gene_registry info [--path data_proc/gene_registry.tsv]
+"""
+
+import argparse, functools, sys
+import pandas as pd, numpy as np
+from pathlib import Path
+
+DEFAULT_PATH = Path("data_proc/gene_registry.tsv")
+DEFAULT_HGNC = Path("data_raw/hgnc/hgnc_complete_set.txt")
+
+TIER_SYMBOL, TIER_ENSEMBL, TIER_ALIAS = 0, 1, 2
+
+
+def norm_symbols(labels):
+    return pd.Index(labels, dtype=object).astype(str).str.strip().str.upper()
+
+
+def norm_ensembl(ids):
+    # drop the version, keep GENCODE's _PAR_Y suffix (a separate gene row)
+    return norm_symbols(ids).str.replace(r"\.\d+(?=(_PAR_Y)?$)", "", regex=True)
+
+
+def _split(values):
+    """HGNC list cells ("A|B", quoted or empty) -> (row position, item) pairs."""
+    s = pd.Series(values, dtype=object).fillna("").astype(str).str.strip('"').str.split("|").explode()
+    s = s.str.strip()
+    s = s[s != ""]
+    return s.index.to_numpy(), s.to_numpy()
+
+
+class GeneRegistry:
+    """Symbol / Ensembl / alias -> stable integer code (see module docstring)."""
+
+    def __init__(self):
+        self.symbols = pd.Index([], dtype=object)
+        self._ensembl = pd.Series([], index=pd.Index([], dtype=object), dtype=np.int64)
+        self._alias = pd.Series([], index=pd.Index([], dtype=object), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    # ---- lookups ----
+    def encode(self, labels, tiers=False):
+        """int32 codes for labels (-1 if unknown); tiers=True also returns the tier used."""
+        keys = pd.Index(labels, dtype=object)
+        codes = self.symbols.get_indexer(keys).astype(np.int32)
+        if (codes < 0).any():
+            # only labels that miss as given pay for strip/upper
+            miss = codes < 0
+            keys = keys.to_numpy().copy()
+            keys[miss] = norm_symbols(keys[miss])
+            keys = pd.Index(keys, dtype=object)
+            codes[miss] = self.symbols.get_indexer(keys[miss])
+        tier = np.where(codes >= 0, TIER_SYMBOL, -1).astype(np.int8)
+        for t, table, norm in ((TIER_ENSEMBL, self._ensembl, norm_ensembl), (TIER_ALIAS, self._alias, None)):
+            miss = codes < 0
+            if not miss.any() or not len(table):
+                continue
+            k = keys[miss] if norm is None else norm(keys[miss])
+            pos = table.index.get_indexer(k)
+            hit = np.where(pos >= 0, table.to_numpy()[pos], -1)
+            codes[miss] = hit
+            tier[np.flatnonzero(miss)[hit >= 0]] = t
+        return (codes, tier) if tiers else codes
+
+    def decode(self, codes):
+        codes = np.asarray(codes)
+        out = self.symbols.to_numpy()[np.clip(codes, 0, None)] if len(self.symbols) else np.full(len(codes), None)
+        return np.where(codes >= 0, out, None)
+
+    # ---- registration ----
+    def _register(self, symbols):
+        """Codes for canonical symbols, appending the ones not registered yet."""
+        keys = norm_symbols(symbols)
+        codes = self.symbols.get_indexer(keys)
+        new = pd.unique(keys[codes < 0])
+        if len(new):
+            self.symbols = self.symbols.append(pd.Index(new, dtype=object))
+            codes = self.symbols.get_indexer(keys)
+        return codes.astype(np.int32)
+
+    def add(self, symbols):
+        """Register labels that resolve through no tier; returns the codes of all labels."""
+        codes = self.encode(symbols)
+        if (codes < 0).any():
+            codes[codes < 0] = self._register(pd.Index(symbols, dtype=object)[codes < 0])
+        return codes
+
+    def _link(self, table, keys, codes):
+        """Add key -> code pairs to a lookup table; keys pointing at several codes are dropped."""
+        pairs = pd.concat([table, pd.Series(codes, index=pd.Index(keys, dtype=object), dtype=np.int64)])
+        pairs = pairs[~pairs.index.isin(self.symbols)] if table is self._alias else pairs
+        df = pairs.reset_index().drop_duplicates()
+        df.columns = ["key", "code"]
+        ambiguous = df["key"].duplicated(keep=False)
+        df = df[~ambiguous]
+        return pd.Series(df["code"].to_numpy(), index=pd.Index(df["key"].to_numpy(), dtype=object), dtype=np.int64)
+
+    def add_ensembl(self, gene_ids, symbols=None):
+        """Link Ensembl ids to symbols (rows without a symbol register the bare id)."""
+        ens = norm_ensembl(gene_ids)
+        if symbols is None:
+            sym = ens
+        else:
+            sym = pd.Series(symbols, dtype=object).fillna("").astype(str).str.strip()
+            sym = norm_symbols(np.where(sym.to_numpy() == "", ens, sym.to_numpy()))
+        codes = self.add(sym)
+        self._ensembl = self._link(self._ensembl, ens, codes)
+        return self
+
+    def add_star(self, path):
+        """Ensembl links from one STAR counts file (gene_id / gene_name columns)."""
+        from src.star_utils import read_star_frame
+
+        df, (gene_id_col, gene_name_col, _), _ = read_star_frame(path)
+        ids = df[gene_id_col].astype(str)
+        keep = ~ids.str.startswith(("__", "N_"))
+        names = df.loc[keep, gene_name_col] if gene_name_col is not None else None
+        return self.add_ensembl(ids[keep], names)
+
+    def add_hgnc(self, path=DEFAULT_HGNC):
+        """Approved symbols, Ensembl ids and aliases from an HGNC complete-set TSV."""
+        hgnc = pd.read_csv(path, sep="\t", dtype=str, usecols=lambda c: c in
+                           ("symbol", "alias_symbol", "prev_symbol", "ensembl_gene_id"))
+        hgnc = hgnc.dropna(subset=["symbol"]).reset_index(drop=True)
+        codes = self._register(hgnc["symbol"])   # approved symbols are canonical as they are
+        if "ensembl_gene_id" in hgnc:
+            ok = hgnc["ensembl_gene_id"].notna().to_numpy()
+            self._ensembl = self._link(self._ensembl, norm_ensembl(hgnc["ensembl_gene_id"][ok]), codes[ok])
+        # aliases and previous symbols together, so a name used for two genes is dropped
+        split = [_split(hgnc[c]) for c in ("alias_symbol", "prev_symbol") if c in hgnc]
+        if split:
+            rows = np.concatenate([r for r, _ in split])
+            items = np.concatenate([i for _, i in split])
+            self._alias = self._link(self._alias, norm_symbols(items), codes[rows])
+        return self
+
+    # ---- persistence ----
+    def save(self, path=DEFAULT_PATH):
+        def joined(table):
+            s = pd.Series(table.index, index=table.to_numpy(), dtype=object)
+            return s.groupby(level=0).agg("|".join).reindex(range(len(self.symbols)), fill_value="")
+        pd.DataFrame({"code": np.arange(len(self.symbols)), "symbol": self.symbols,
+                      "ensembl_ids": joined(self._ensembl).to_numpy(),
+                      "aliases": joined(self._alias).to_numpy()}).to_csv(path, sep="\t", index=False)
+        return path
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        df = pd.read_csv(path, sep="\t", dtype=str, keep_default_na=False)
+        assert (df["code"].astype(int).to_numpy() == np.arange(len(df))).all(), "registry codes must be 0..n-1"
+        reg = cls()
+        reg.symbols = pd.Index(df["symbol"].to_numpy(), dtype=object)
+        codes = np.arange(len(df))
+        for attr, col in (("_ensembl", "ensembl_ids"), ("_alias", "aliases")):
+            rows, items = _split(df[col])
+            setattr(reg, attr, pd.Series(codes[rows], index=pd.Index(items, dtype=object), dtype=np.int64))
+        return reg
+
+
+def encode_index(reg, index):
+    """(codes, row positions) with one row per known code: best tier first, then first row."""
+    codes, tier = reg.encode(index, tiers=True)
+    rows = np.flatnonzero(codes >= 0)
+    rows = rows[np.lexsort((rows, tier[rows], codes[rows]))]     # by code, tier, position
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = codes[rows][1:] != codes[rows][:-1]
+    rows = np.sort(rows[first])
+    return codes[rows], rows
+
+
+def common_codes(*codes):
+    """Codes present in every array (sorted, unknown -1 dropped)."""
+    return functools.reduce(np.intersect1d, [np.asarray(c)[np.asarray(c) >= 0] for c in codes])
+
+
+def align_rows(X, reg, codes, encoded=None):
+    """Rows of X for `codes`, in that order; index relabelled to canonical symbols."""
+    x_codes, rows = encoded if encoded is not None else encode_index(reg, X.index)
+    lut = np.full(len(reg), -1, dtype=np.int64)
+    lut[x_codes] = rows
+    pos = lut[np.asarray(codes)]
+    if (pos < 0).any():
+        raise KeyError(f"{int((pos < 0).sum())} genes missing from matrix, e.g. {list(reg.decode(np.asarray(codes)[pos < 0][:5]))}")
+    out = pd.DataFrame(np.take(X.to_numpy(), pos, axis=0), index=pd.Index(reg.decode(codes), name=X.index.name),
+                       columns=X.columns, copy=False)
+    return out
+
+
+def align_cohorts(reg, *frames):
+    """Align every frame to the genes they all share (sorted by canonical symbol)."""
+    for X in frames:
+        reg.add(X.index)
+    encoded = [encode_index(reg, X.index) for X in frames]
+    shared = common_codes(*(codes for codes, _ in encoded))
+    shared = shared[np.argsort(reg.decode(shared).astype(str), kind="stable")]
+    return [align_rows(X, reg, shared, enc) for X, enc in zip(frames, encoded)], shared
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Build / inspect the integer-coded gene registry.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="(extend) the registry from a STAR file and an HGNC table")
+    b.add_argument("--star", type=Path, help="one STAR augmented_star_gene_counts.tsv (Ensembl links)")
+    b.add_argument("--hgnc", type=Path, default=None, help=f"HGNC complete set TSV (e.g. {DEFAULT_HGNC})")
+    b.add_argument("--out", type=Path, default=DEFAULT_PATH)
+    i = sub.add_parser("info", help="print registry size and lookup table sizes")
+    i.add_argument("--path", type=Path, default=DEFAULT_PATH)
+    args = ap.parse_args(argv)
+
+    if args.command == "build":
+        reg = GeneRegistry.load(args.out) if args.out.exists() else GeneRegistry()   # keep existing codes
+        n0 = len(reg)
+        # HGNC first: GENCODE names that are previous symbols then resolve to the approved gene
+        if args.hgnc:
+            reg.add_hgnc(args.hgnc)
+        if args.star:
+            reg.add_star(args.star)
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        reg.save(args.out)
+        print(f"saved: {args.out} | genes: {len(reg)} (+{len(reg) - n0})")
+        args.path = args.out
+    reg = GeneRegistry.load(args.path)
+    print(f"registry: {args.path} | symbols: {len(reg)} | ensembl ids: {len(reg._ensembl)} | aliases: {len(reg._alias)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
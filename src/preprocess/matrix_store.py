@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+"""
+Memory-mapped genes × samples matrix store (zero-copy loads and slices).
+
+A store is a directory:
+  <path>/values.npy    one C-contiguous float32/int32 array (.npy format, genes × samples)
+  <path>/index.json    sidecar index: shape, dtype, row/column labels and their names
+
+write_matrix(X, path, dtype=None) -> Path
+  - Saves a DataFrame (labels must be unique); written to a temp dir, then renamed
+write_matrix_parquet(src, path, memory_mb=512) -> Path
+  - Converts a pipeline Parquet matrix row batch by row batch (bounded memory)
+
+open_matrix(path) -> MatrixStore
+  - Maps values.npy read-only and reads the sidecar; no matrix bytes are read, so
+    opening costs the same for a 60k × 1k matrix as for a tiny one
+  - .array(genes=None, samples=None) -> np.ndarray
+  - .frame(genes=None, samples=None) -> pd.DataFrame
+      no selection / a contiguous run of labels -> views of the mapping (zero-copy);
+      arbitrary label lists -> only the selected cells are copied
+  - Rows are contiguous on disk, so a gene slice touches only those rows' pages; a
+    sample-only slice still has to visit every row (one strided read per gene)
+  - Process-private memory is only what gets copied; touched pages of the mapping are
+    shared, reclaimable page cache (RSS counts them at the kernel's folio size)
+
+load_matrix(path, genes=None, samples=None) -> pd.DataFrame
+
+CLI (run from the repo root):
+  python -m src.preprocess.matrix_store convert data_proc/tcga_expr_logcpm.parquet data_proc/store/tcga_expr_logcpm
+  python -m src.preprocess.matrix_store info data_proc/store/tcga_expr_logcpm
+"""
+
+import argparse, json, os, shutil, sys, time
+import pandas as pd, numpy as np
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # write_matrix_parquet needs pyarrow
+    pa = pq = None
+
+STORE_VERSION = 1
+DTYPES = ("float32", "int32")
+VALUES, INDEX = "values.npy", "index.json"
+
+
+def _check_dtype(dtype):
+    dtype = np.dtype(dtype)
+    if dtype.name not in DTYPES:
+        raise ValueError(f"matrix store holds {DTYPES}; got {dtype} (pass dtype= to cast)")
+    return dtype
+
+
+def _labels(index):
+    return {"labels": [str(x) for x in index], "name": index.name,
+            "dtype": "string" if isinstance(index.dtype, pd.StringDtype) else "object"}
+
+
+def _index(meta):
+    return pd.Index(meta["labels"], dtype=meta["dtype"], name=meta["name"])
+
+
+def _finish(tmp, path, meta):
+    with open(tmp / INDEX, "w") as fh:
+        json.dump(meta, fh)
+    if path.exists():
+        shutil.rmtree(path)
+    os.replace(tmp, path)  # readers never see a half-written store
+    return path
+
+
+def _tmp_dir(path):
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    return path, tmp
+
+
+def write_matrix(X, path, dtype=None):
+    """Save a genes × samples DataFrame as a memory-mappable store; returns the store path."""
+    assert X.index.is_unique and X.columns.is_unique, "store needs unique gene/sample labels"
+    values = X.to_numpy(dtype=dtype) if dtype is not None else X.to_numpy()
+    _check_dtype(values.dtype)
+    path, tmp = _tmp_dir(path)
+    np.save(tmp / VALUES, np.ascontiguousarray(values))
+    meta = {"version": STORE_VERSION, "shape": list(values.shape), "dtype": values.dtype.name,
+            "rows": _labels(X.index), "cols": _labels(X.columns)}
+    return _finish(tmp, path, meta)
+
+
+def write_matrix_parquet(src, path, memory_mb=512, dtype=None):
+    """Convert a genes × samples Parquet file (index column + sample columns) batch by batch."""
+    if pq is None:
+        raise ImportError("write_matrix_parquet requires pyarrow")
+    from src.preprocess.normalize import _sample_columns
+
+    pf = pq.ParquetFile(src)
+    samples, index_cols = _sample_columns(pf)
+    n_rows = pf.metadata.num_rows
+    dtype = _check_dtype(dtype or pf.schema_arrow.field(samples[0]).type.to_pandas_dtype())
+    rows = max(1, int(memory_mb * 1e6 // (len(samples) * (dtype.itemsize * 3))))
+
+    path, tmp = _tmp_dir(path)
+    out = np.lib.format.open_memmap(tmp / VALUES, mode="w+", dtype=dtype, shape=(n_rows, len(samples)))
+    labels, at = [], 0
+    for batch in pf.iter_batches(batch_size=rows, columns=index_cols + samples):
+        chunk = pa.Table.from_batches([batch]).to_pandas()   # restores the gene index
+        out[at:at + len(chunk)] = chunk.to_numpy(dtype=dtype)
+        labels.append(chunk.index)
+        at += len(chunk)
+    out.flush()
+    del out
+
+    index = labels[0].append(labels[1:]) if labels else pd.Index([])
+    assert index.is_unique, "store needs unique gene labels"
+    col_meta = (pf.schema_arrow.pandas_metadata or {}).get("column_indexes") or [{}]
+    columns = pd.Index(samples, name=col_meta[0].get("name"))
+    meta = {"version": STORE_VERSION, "shape": [n_rows, len(samples)], "dtype": dtype.name,
+            "rows": _labels(index), "cols": _labels(columns)}
+    return _finish(tmp, path, meta)
+
+
+class MatrixStore:
+    """Read-only view over a store directory (see module docstring)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / INDEX) as fh:
+            meta = json.load(fh)
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"{self.path}: store version {meta.get('version')} != {STORE_VERSION}")
+        self.values = np.load(self.path / VALUES, mmap_mode="r")
+        if list(self.values.shape) != meta["shape"]:
+            raise ValueError(f"{self.path}: values shape {self.values.shape} != index {meta['shape']}")
+        self.rows = _index(meta["rows"])
+        self.cols = _index(meta["cols"])
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    def _positions(self, index, labels, what):
+        if labels is None:
+            return slice(None)
+        pos = index.get_indexer(pd.Index(labels))
+        if (pos < 0).any():
+            missing = pd.Index(labels)[pos < 0]
+            raise KeyError(f"{len(missing)} {what} not in store, e.g. {list(missing[:5])}")
+        # a run of consecutive positions slices the mapping instead of copying it
+        if len(pos) and (np.diff(pos) == 1).all():
+            return slice(int(pos[0]), int(pos[-1]) + 1)
+        return pos
+
+    def array(self, genes=None, samples=None):
+        """Values for the selected genes/samples (a view of the mapping when possible)."""
+        r = self._positions(self.rows, genes, "genes")
+        c = self._positions(self.cols, samples, "samples")
+        if isinstance(r, slice) or isinstance(c, slice):
+            return self.values[r, c]
+        return self.values[r][:, c]    # rows first: only the touched rows are read
+
+    def frame(self, genes=None, samples=None):
+        """DataFrame over array(genes, samples); shares memory with the mapping when it is a view."""
+        r = self._positions(self.rows, genes, "genes")
+        c = self._positions(self.cols, samples, "samples")
+        values = self.array(genes, samples)
+        return pd.DataFrame(values, index=self.rows[r], columns=self.cols[c], copy=False)
+
+    def __repr__(self):
+        return f"MatrixStore({str(self.path)!r}, shape={self.shape}, dtype={self.dtype})"
+
+
+def open_matrix(path):
+    return MatrixStore(path)
+
+
+def load_matrix(path, genes=None, samples=None):
+    """Shortcut: open_matrix(path).frame(genes, samples)."""
+    return MatrixStore(path).frame(genes, samples)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Convert Parquet matrices to memory-mapped stores / inspect stores.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    cv = sub.add_parser("convert", help="Parquet (genes × samples) -> store")
+    cv.add_argument("src", type=Path)
+    cv.add_argument("dst", type=Path)
+    cv.add_argument("--dtype", choices=DTYPES, default=None, help="cast values (default: keep)")
+    cv.add_argument("--memory-mb", type=float, default=512)
+    info = sub.add_parser("info", help="print shape/dtype/labels of a store")
+    info.add_argument("path", type=Path)
+    args = ap.parse_args(argv)
+
+    if args.command == "convert":
+        t0 = time.perf_counter()
+        out = write_matrix_parquet(args.src, args.dst, args.memory_mb, args.dtype)
+        print("saved:", out, "| seconds:", round(time.perf_counter() - t0, 2))
+        args.path = out
+    t0 = time.perf_counter()
+    store = open_matrix(args.path)
+    print(store, "| open (ms):", round((time.perf_counter() - t0) * 1e3, 2))
+    print("genes:", len(store.rows), list(store.rows[:3]), "| samples:", len(store.cols), list(store.cols[:3]))
+    print("size (MB) ~", round((store.path / VALUES).stat().st_size / 1e6, 1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Counts -> log2(CPM + 1) normalization (3D-D), in memory or streamed over Parquet.
+
+logcpm(Xc) -> pd.DataFrame (float32)
+  - The 3D-D arithmetic: CPM = counts / libsize * 1e6 (float64), zero-size libraries
+    give 0, log2(CPM + 1) cast to float32; computed in place on one float64 buffer
+
+logcpm_values(counts, libs) / library_divisors(libs)
+  - The same arithmetic on arrays (libs from library_divisors: float64, NaN for empty
+    libraries), for callers that bring their own counts (src/modeling/scorer.py)
+
+library_sizes_parquet(path, memory_mb) -> pd.Series (int64)
+  - Pass 1: per-sample sums, reading blocks of sample columns (column projection),
+    so memory is bounded whatever the file's row-group layout
+
+logcpm_parquet(src, dst, memory_mb) -> dict
+  - Pass 2: streams row batches of the counts file, writes float32 row groups to dst
+  - Numbers are identical to logcpm(): library sizes are exact int64 sums and every
+    cell goes through the same float64 ops. Peak memory is ~memory_mb as long as the
+    source has row groups no larger than a batch (3D-C --row-group-size PARQUET_ROW_GROUP);
+    larger source row groups still work, at a peak set by their size
+"""
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # streaming mode needs pyarrow
+    pa = pq = None
+
+# row-group size for genes × samples Parquet matrices written by the pipeline
+PARQUET_ROW_GROUP = 4096
+
+# bytes held per matrix cell while a row batch is in flight:
+# arrow int32 + numpy int32 + float64 work buffer + float32 result + arrow float32
+# (the Parquet writer's encoded row group comes on top; float columns skip dictionary
+# encoding, which would only grow the buffers for logCPM values)
+_BYTES_PER_CELL = 4 + 4 + 8 + 4 + 4
+
+
+def logcpm_values(counts, libs):
+    """log2(counts / libs * 1e6 + 1) as float32; libs is float64 with NaN for empty libraries."""
+    cpm = np.divide(counts, libs, dtype=np.float64)
+    cpm *= 1e6
+    cpm[np.isnan(cpm)] = 0           # zero-size libraries (NaN libs) -> 0
+    cpm += 1.0
+    np.log2(cpm, out=cpm)
+    return cpm.astype(np.float32)
+
+
+def library_divisors(libs):
+    """Library sizes as the float64 divisors logcpm_values() expects (0 -> NaN)."""
+    libs = np.asarray(libs, dtype=np.float64).copy()
+    libs[libs == 0] = np.nan
+    return libs
+
+
+def logcpm(Xc):
+    """In-memory log2(CPM+1) of a genes × samples counts DataFrame (float32)."""
+    libs = Xc.sum(axis=0).astype(np.float64)
+    out = logcpm_values(Xc.to_numpy(), library_divisors(libs))
+    return pd.DataFrame(out, index=Xc.index, columns=Xc.columns)
+
+
+def _sample_columns(pf):
+    """(sample column names, index column names) of a pandas-written Parquet file."""
+    meta = pf.schema_arrow.pandas_metadata or {}
+    index_cols = [c for c in meta.get("index_columns", []) if isinstance(c, str)]
+    samples = [c for c in pf.schema_arrow.names if c not in index_cols]
+    return samples, index_cols
+
+
+def library_sizes_parquet(path, memory_mb=512):
+    """Per-sample int64 count sums of a genes × samples Parquet file, column block by block."""
+    pf = pq.ParquetFile(path)
+    samples, _ = _sample_columns(pf)
+    n_rows = pf.metadata.num_rows
+    per_col = max(n_rows * (4 + 8), 1)            # decoded int32 + int64 sum temp
+    block = max(1, int(memory_mb * 1e6 // per_col))
+    sums = []
+    for i in range(0, len(samples), block):
+        cols = samples[i:i + block]
+        tbl = pf.read(columns=cols)
+        sums.extend(int(np.sum(tbl.column(c).to_numpy(), dtype=np.int64)) for c in cols)
+    return pd.Series(sums, index=samples, dtype=np.int64)
+
+
+def logcpm_parquet(src, dst, memory_mb=512):
+    """Stream src counts -> dst log2(CPM+1) float32 Parquet with bounded memory.
+
+    Returns a dict with shape, library sizes and QA stats (zero libraries, non-finite
+    cells, mean/std over all cells accumulated in float64), plus "note": None, or why
+    peak memory exceeds memory_mb (source row groups larger than a batch).
+    """
+    if pq is None:
+        raise ImportError("logcpm_parquet requires pyarrow")
+    libs = library_sizes_parquet(src, memory_mb)
+    libs_div = library_divisors(libs.to_numpy())
+
+    pf = pq.ParquetFile(src)
+    samples, index_cols = _sample_columns(pf)
+    rows = max(1, int(memory_mb * 1e6 // (len(samples) * _BYTES_PER_CELL)))
+    biggest_rg = max(pf.metadata.row_group(i).num_rows for i in range(pf.metadata.num_row_groups))
+    note = None
+    if biggest_rg > rows:
+        note = (f"source row groups hold up to {biggest_rg} rows (> batch of {rows}); "
+                f"peak memory follows the row group size")
+
+    writer = None
+    n_rows, n_nonfinite, s1, s2 = 0, 0, 0.0, 0.0
+    try:
+        for batch in pf.iter_batches(batch_size=rows, columns=index_cols + samples):
+            chunk = pa.Table.from_batches([batch]).to_pandas()
+            vals = logcpm_values(chunk.to_numpy(), libs_div)
+            n_nonfinite += int((~np.isfinite(vals)).sum())
+            s1 += float(vals.sum(dtype=np.float64))
+            s2 += float(np.square(vals, dtype=np.float64).sum())
+            out = pa.Table.from_pandas(pd.DataFrame(vals, index=chunk.index, columns=samples),
+                                       preserve_index=True)
+            if writer is None:
+                writer = pq.ParquetWriter(dst, out.schema, use_dictionary=index_cols)
+            writer.write_table(out, row_group_size=rows)
+            n_rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    n = max(n_rows * len(samples), 1)
+    mean = s1 / n
+    return {
+        "shape": (n_rows, len(samples)),
+        "columns": samples,
+        "libs": libs,
+        "zero_libs": int((libs == 0).sum()),
+        "nonfinite": n_nonfinite,
+        "mean": mean,
+        "std": float(np.sqrt(max(s2 / n - mean * mean, 0.0))),
+        "note": note,
+    }
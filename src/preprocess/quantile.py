@@ -0,0 +1,126 @@
+"""
+Quantile normalization onto a reference cohort (the "qnz" scaling mode: map METABRIC
+onto the TCGA expression distribution, then z-score with TCGA statistics).
+
+QuantileReference(n_quantiles=None)
+  - .fit(X, chunk_cols=128) -> self
+      X: genes × samples (DataFrame, ndarray or MatrixStore). The reference is the
+      mean over samples of each sorted column (classic quantile normalization target).
+      Columns with NaNs contribute their sorted values interpolated onto the common
+      quantile grid; built in sample-column chunks, one pass
+  - .transform(X, chunk_cols=128) -> same kind as X (float32)
+      Every column is mapped onto the reference by rank: ties get their average rank,
+      so equal inputs stay equal; the rank fraction r / (m - 1) over the column's m
+      non-missing values is interpolated on the reference grid (m == reference length
+      without ties -> exactly the reference values). NaN stays NaN
+      Vectorized per chunk of samples (one row-wise argsort, tie runs found with
+      cumulative max/min), so memory is bounded by chunk_cols, not by the number of
+      samples
+  - .transform_one(x) -> pd.Series / np.ndarray for a single new sample
+  - .save(path) / QuantileReference.load(path)
+      tcga_qn_reference.tsv: quantile (grid position in [0, 1]), value
+  - Apply to the gene set the reference was built on (the aligned common genes)
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.preprocess.matrix_store import MatrixStore
+
+
+def _columns(X):
+    """(2-D array, frame to copy labels from or None) without copying the values."""
+    if isinstance(X, MatrixStore):
+        return X.values, None
+    if isinstance(X, pd.DataFrame):
+        return X.to_numpy(), X
+    return np.asarray(X), None
+
+
+class QuantileReference:
+    """Reference distribution + rank mapping (see module docstring)."""
+
+    def __init__(self, n_quantiles=None):
+        self.n_quantiles = n_quantiles
+        self.grid = self.values = None
+
+    # ---- fitting ----
+    def fit(self, X, chunk_cols=128):
+        """Mean sorted column of X (genes × samples), built chunk by chunk."""
+        values = _columns(X)[0]
+        n = self.n_quantiles or values.shape[0]
+        self.grid = np.linspace(0.0, 1.0, n)
+        total, count = np.zeros(n), 0
+        for c0 in range(0, values.shape[1], chunk_cols):
+            rows = np.sort(np.ascontiguousarray(values[:, c0:c0 + chunk_cols].T, dtype=np.float64), axis=1)  # NaN last
+            m = (~np.isnan(rows)).sum(axis=1)
+            if n == rows.shape[1] and (m == n).all():
+                total += rows.sum(axis=0)
+                count += rows.shape[0]
+                continue
+            for j in range(rows.shape[0]):    # samples with missing values (or a coarser grid)
+                if m[j] == 0:
+                    continue
+                col = rows[j, :m[j]]
+                total += np.interp(self.grid, np.linspace(0.0, 1.0, m[j]), col) if m[j] > 1 else col[0]
+                count += 1
+        if count == 0:
+            raise ValueError("no non-missing column to build the reference from")
+        self.values = total / count
+        return self
+
+    # ---- application ----
+    def _map(self, rows):
+        """Map each row of a (samples × genes) float64 block onto the reference."""
+        g = rows.shape[1]
+        order = np.argsort(rows, axis=1)        # NaN sorted last; order within ties is irrelevant
+        s = np.take_along_axis(rows, order, axis=1)
+        m = (~np.isnan(s)).sum(axis=1, keepdims=True)
+        pos = np.broadcast_to(np.arange(g, dtype=np.float64), s.shape)
+        # tie runs: first position via running max of run starts, last via reversed running min
+        new = np.ones(s.shape, dtype=bool)
+        new[:, 1:] = s[:, 1:] != s[:, :-1]
+        end = np.ones(s.shape, dtype=bool)
+        end[:, :-1] = new[:, 1:]
+        first = np.maximum.accumulate(np.where(new, pos, 0.0), axis=1)
+        last = np.minimum.accumulate(np.where(end, pos, g - 1.0)[:, ::-1], axis=1)[:, ::-1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frac = np.where(m > 1, (first + last) / 2 / (m - 1), 0.5)
+        mapped = np.interp(frac, self.grid, self.values)
+        mapped[np.isnan(s)] = np.nan
+        out = np.empty_like(mapped)
+        np.put_along_axis(out, order, mapped, axis=1)
+        return out
+
+    def transform(self, X, chunk_cols=128):
+        """Quantile-normalize every column of X onto the reference -> float32."""
+        if self.values is None:
+            raise RuntimeError("QuantileReference is not fitted")
+        values, like = _columns(X)
+        out = np.empty(values.shape, dtype=np.float32)
+        for c0 in range(0, values.shape[1], chunk_cols):
+            # samples as contiguous rows: sorting runs along memory, not across it
+            rows = np.ascontiguousarray(values[:, c0:c0 + chunk_cols].T, dtype=np.float64)
+            out[:, c0:c0 + chunk_cols] = self._map(rows).T
+        if like is None:
+            return out
+        return pd.DataFrame(out, index=like.index, columns=like.columns, copy=False)
+
+    def transform_one(self, x):
+        """One new sample (genes vector) onto the reference, without refitting anything."""
+        mapped = self._map(np.asarray(x, dtype=np.float64).reshape(1, -1))[0].astype(np.float32)
+        if isinstance(x, pd.Series):
+            return pd.Series(mapped, index=x.index, name=x.name)
+        return mapped
+
+    # ---- persistence ----
+    def save(self, path):
+        pd.DataFrame({"quantile": self.grid, "value": self.values}).to_csv(path, sep="\t", index=False)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        df = pd.read_csv(path, sep="\t", dtype=np.float64, float_precision="round_trip")
+        ref = cls(len(df))
+        ref.grid, ref.values = df["quantile"].to_numpy(), df["value"].to_numpy()
+        return ref
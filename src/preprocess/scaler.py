@@ -0,0 +1,327 @@
+"""
+Per-gene z-scaling: fit on one cohort (TCGA), apply to any genes × samples matrix.
+
+ZScaler(eps=1e-6)
+  - .fit(X, chunk_rows=2048) -> self
+      X: DataFrame, ndarray or MatrixStore (memory-mapped); one pass over X in gene-row
+      chunks, each chunk reduced to count/mean/M2 in float64 while it is in cache
+  - .partial_fit(block, genes=None) -> self
+      block: all genes × some samples; merged into the running count/mean/M2 with the
+      parallel (Chan et al.) form of Welford's update, so samples can stream in column
+      blocks of any size and the result does not depend on how they were split
+  - .fit_parquet(path, memory_mb=256) -> self
+      Pipeline Parquet matrix (gene index + sample columns): reads sample-column blocks
+      through partial_fit, so only one block is ever decoded
+  - .mean / .std -> pd.Series (float32, index SYMBOL); std is ddof=0 clipped at eps,
+    NaNs are skipped: the same statistics as the notebook's fit_zstats
+  - .transform(X, inplace=False, chunk_rows=2048)
+      (X - mean) / std as float32, gene-row chunk by chunk:
+        float32 input + inplace=True -> subtract/divide in place (no new matrix)
+        otherwise -> one float32 output; temporaries are a single chunk, never a full
+        copy (same result as X.copy().subtract(mu).divide(sd).astype("float32"))
+      X: DataFrame (rows aligned to the fitted genes by label) or ndarray
+  - .transform_store(src, dst, chunk_rows=2048) -> Path
+      MatrixStore -> new store of z-scores, written through a memory-mapped output
+  - .aligned(genes) -> (mean, std) float32 arrays reordered to genes (KeyError when a
+    gene has no statistics)
+  - .save(path) / ZScaler.load(path)
+      tcga_scaler_stats.tsv format: SYMBOL, mean, std (float32 values)
+ZScaler.from_stats(mean, std, eps=1e-6) -> ZScaler
+
+FoldStats(X, eps=1e-6)
+  - Train-fold statistics for CV without rescanning the matrix per fold: one pass
+    stores per-gene count, mean c and M2 = sum((x - c)^2); samples are kept as
+    contiguous rows (the per-sample contributions)
+  - .stats(train) -> float32 (mean, std)
+      train: index array or boolean mask; sums of (x - c) and (x - c)^2 over the
+      held-out samples are subtracted from the totals, or accumulated directly over
+      the training samples when those are fewer: O(genes × min(train, held-out))
+  - .folds(folds) -> (means, stds), each (n_folds × genes) float32
+      folds: list of train index arrays (e.g. [tr for tr, _ in RepeatedKFold().split(...)])
+  - .scaler(train) -> ZScaler for one fold
+  - Same statistics as ZScaler().fit(X.iloc[:, train]) (float64 sums, float32 results)
+fold_zstats(X, folds, eps=1e-6) -> (means, stds)
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.preprocess.matrix_store import MatrixStore, VALUES, STORE_VERSION, _finish, _labels, _tmp_dir
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # fit_parquet needs pyarrow
+    pq = None
+
+
+def _block_stats(block):
+    """Per-row (count, mean, M2) of a 2-D block, float64, NaNs skipped."""
+    block = np.asarray(block, dtype=np.float64)
+    if not np.isnan(block).any():
+        n = np.full(block.shape[0], block.shape[1], dtype=np.float64)
+        mean = block.mean(axis=1)
+        dev = block - mean[:, None]
+        return n, mean, np.einsum("ij,ij->i", dev, dev)
+    n = (~np.isnan(block)).sum(axis=1).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(block, axis=1) / n
+    dev = block - mean[:, None]
+    return n, mean, np.nansum(dev * dev, axis=1)
+
+
+def _finalize(n, mean, m2, eps):
+    """count/mean/M2 -> float32 (mean, std): ddof=0, std clipped at eps, NaN without data."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(n > 0, mean, np.nan)
+        std = np.sqrt(np.maximum(m2, 0.0) / n)
+    std = np.where(np.isnan(std), std, np.maximum(std, eps))
+    return mean.astype(np.float32), std.astype(np.float32)
+
+
+class ZScaler:
+    """Streaming per-gene mean/std with float32 application (see module docstring)."""
+
+    def __init__(self, eps=1e-6):
+        self.eps = eps
+        self.genes = None
+        self._n = self._mean = self._m2 = None
+        self._stats = None   # (mean, std) float32 once fitted/loaded
+
+    # ---- fitting ----
+    def _reset(self, genes, n_genes):
+        self.genes = pd.Index(genes if genes is not None else pd.RangeIndex(n_genes), name="SYMBOL")
+        self._n = np.zeros(n_genes)
+        self._mean = np.zeros(n_genes)
+        self._m2 = np.zeros(n_genes)
+        self._stats = None
+
+    def partial_fit(self, block, genes=None):
+        """Merge a block of samples (all genes × k samples) into the running stats."""
+        if isinstance(block, pd.DataFrame):
+            genes = block.index if genes is None else genes
+            block = block.to_numpy()
+        if self._n is None:
+            self._reset(genes, block.shape[0])
+        elif genes is not None and not self.genes.equals(pd.Index(genes)):
+            raise ValueError("partial_fit blocks must list the same genes in the same order")
+        nb, mb, m2b = _block_stats(block)
+        n = self._n + nb
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = mb - self._mean
+            w = np.where(n > 0, nb / n, 0.0)
+        delta = np.where(nb > 0, delta, 0.0)
+        self._mean += delta * w
+        self._m2 += np.where(nb > 0, m2b, 0.0) + delta * delta * self._n * w
+        self._n = n
+        self._stats = None
+        return self
+
+    def fit(self, X, chunk_rows=2048):
+        """One pass over a DataFrame / ndarray / MatrixStore, gene-row chunk by chunk."""
+        values, genes = _values(X)
+        self._reset(genes, values.shape[0])
+        for r0 in range(0, values.shape[0], chunk_rows):
+            r1 = min(r0 + chunk_rows, values.shape[0])
+            self._n[r0:r1], self._mean[r0:r1], self._m2[r0:r1] = _block_stats(values[r0:r1])
+        return self
+
+    def fit_parquet(self, path, memory_mb=256):
+        """Fit on a pipeline Parquet matrix, decoding one block of sample columns at a time."""
+        if pq is None:
+            raise ImportError("fit_parquet requires pyarrow")
+        from src.preprocess.normalize import _sample_columns
+
+        pf = pq.ParquetFile(path)
+        samples, index_cols = _sample_columns(pf)
+        n_rows = pf.metadata.num_rows
+        # arrow column + float64 block + deviation temporaries per sample
+        cols = max(1, int(memory_mb * 1e6 // (n_rows * 8 * 3)))
+        self._n = None
+        for c0 in range(0, len(samples), cols):
+            block = pf.read(columns=index_cols + samples[c0:c0 + cols]).to_pandas()
+            self.partial_fit(block)
+        return self
+
+    # ---- statistics ----
+    def _fitted(self):
+        if self._stats is None:
+            if self._n is None:
+                raise RuntimeError("ZScaler is not fitted")
+            self._stats = _finalize(self._n, self._mean, self._m2, self.eps)
+        return self._stats
+
+    @property
+    def mean(self):
+        return pd.Series(self._fitted()[0], index=self.genes, name="mean")
+
+    @property
+    def std(self):
+        return pd.Series(self._fitted()[1], index=self.genes, name="std")
+
+    @classmethod
+    def from_stats(cls, mean, std, eps=1e-6):
+        """Scaler from precomputed per-gene mean/std Series (no refitting)."""
+        sc = cls(eps)
+        sc.genes = pd.Index(mean.index, name="SYMBOL")
+        sc._stats = (np.asarray(mean, dtype=np.float32),
+                     np.asarray(pd.Series(std).reindex(mean.index), dtype=np.float32))
+        return sc
+
+    def save(self, path):
+        mean, std = self._fitted()
+        pd.DataFrame({"SYMBOL": self.genes, "mean": mean, "std": std}).to_csv(path, sep="\t", index=False)
+        return path
+
+    @classmethod
+    def load(cls, path, eps=1e-6):
+        df = pd.read_csv(path, sep="\t", dtype={"SYMBOL": str, "mean": np.float32, "std": np.float32})
+        return cls.from_stats(df.set_index("SYMBOL")["mean"], df.set_index("SYMBOL")["std"], eps)
+
+    # ---- application ----
+    def aligned(self, genes, n_rows=None):
+        """(mean, std) float32 arrays in the order of genes (None: fitted order, n_rows long)."""
+        mean, std = self._fitted()
+        if n_rows is None:
+            n_rows = len(mean) if genes is None else len(genes)
+        if genes is None or self.genes.equals(pd.Index(genes)):
+            if n_rows != len(mean):
+                raise ValueError(f"matrix has {n_rows} genes, scaler has {len(mean)}")
+            return mean, std
+        pos = self.genes.get_indexer(pd.Index(genes))
+        if (pos < 0).any():
+            missing = pd.Index(genes)[pos < 0]
+            raise KeyError(f"{len(missing)} genes have no scaler stats, e.g. {list(missing[:5])}")
+        return mean[pos], std[pos]
+
+    def _apply(self, src, out, mean, std, chunk_rows):
+        for r0 in range(0, src.shape[0], chunk_rows):
+            r1 = min(r0 + chunk_rows, src.shape[0])
+            mu, sd = mean[r0:r1, None], std[r0:r1, None]
+            if src.dtype == np.float32:
+                # float32 arithmetic, written straight into out (no temporaries)
+                np.subtract(src[r0:r1], mu, out=out[r0:r1])
+                np.divide(out[r0:r1], sd, out=out[r0:r1])
+            else:
+                # other dtypes: compute at the promoted precision (float64 for float64/int
+                # input, as pandas would), cast once; temporaries are chunk-sized
+                wide = np.promote_types(src.dtype, np.float32)
+                out[r0:r1] = (src[r0:r1].astype(wide, copy=False) - mu.astype(wide)) / sd.astype(wide)
+        return out
+
+    def transform(self, X, inplace=False, chunk_rows=2048):
+        """(X - mean) / std as float32; inplace=True reuses a float32 X's buffer."""
+        if isinstance(X, MatrixStore):
+            raise TypeError("stores are read-only: use transform_store(src, dst)")
+        values, genes = _values(X)
+        mean, std = self.aligned(genes, values.shape[0])
+        if inplace and values.dtype == np.float32 and values.flags.writeable:
+            out = values
+        else:
+            out = np.empty(values.shape, dtype=np.float32)
+        self._apply(values, out, mean, std, chunk_rows)
+        if not isinstance(X, pd.DataFrame):
+            return out
+        if out is values and np.shares_memory(out, X.to_numpy()):
+            return X
+        return pd.DataFrame(out, index=X.index, columns=X.columns, copy=False)
+
+    def transform_store(self, src, dst, chunk_rows=2048):
+        """Z-score a MatrixStore into a new store at dst (bounded memory)."""
+        store = src if isinstance(src, MatrixStore) else MatrixStore(src)
+        mean, std = self.aligned(store.rows, store.shape[0])
+        dst, tmp = _tmp_dir(dst)
+        out = np.lib.format.open_memmap(tmp / VALUES, mode="w+", dtype=np.float32, shape=store.shape)
+        self._apply(store.values, out, mean, std, chunk_rows)
+        out.flush()
+        del out
+        meta = {"version": STORE_VERSION, "shape": list(store.shape), "dtype": "float32",
+                "rows": _labels(store.rows), "cols": _labels(store.cols)}
+        return _finish(tmp, dst, meta)
+
+
+def _values(X):
+    """(2-D array, gene labels or None) without copying where the input allows it."""
+    if isinstance(X, MatrixStore):
+        return X.values, X.rows
+    if isinstance(X, pd.DataFrame):
+        return X.to_numpy(), X.index
+    return np.asarray(X), None
+
+
+class FoldStats:
+    """Train-fold mean/std by subtraction from whole-cohort totals (see module docstring)."""
+
+    def __init__(self, X, eps=1e-6, chunk_samples=256):
+        values, genes = _values(X)
+        full = ZScaler(eps).fit(values)
+        self.genes = pd.Index(genes if genes is not None else pd.RangeIndex(values.shape[0]), name="SYMBOL")
+        self.eps, self.chunk_samples = eps, chunk_samples
+        self.n_samples = values.shape[1]
+        # totals centered on the cohort mean: sum(x - c) = 0, sum((x - c)^2) = M2
+        self._n, self._center, self._m2 = full._n, np.nan_to_num(full._mean), full._m2
+        # per-sample contributions = sample rows; a view when X is already sample-major
+        # (DataFrames backed by one block), else one float32-sized copy
+        self._xt = np.ascontiguousarray(values.T)
+        # missing cells are tracked only for the genes that have any
+        self._nan_genes = np.flatnonzero(self._n < self.n_samples)
+        self._missing = np.isnan(self._xt[:, self._nan_genes])
+
+    def _sums(self, idx):
+        """Per-gene (count, sum(x - c), sum((x - c)^2)) over the samples in idx (float64)."""
+        g, nan_genes = len(self._center), self._nan_genes
+        n = np.full(g, float(len(idx)))
+        if len(nan_genes):
+            n[nan_genes] -= self._missing[idx].sum(axis=0)
+        s1, s2 = np.zeros(g), np.zeros(g)
+        buf = np.empty((min(len(idx), self.chunk_samples), g))
+        for k in range(0, len(idx), self.chunk_samples):
+            part = idx[k:k + self.chunk_samples]
+            d = buf[:len(part)]
+            np.subtract(self._xt[part], self._center, out=d)   # float64 deviations, no astype copy
+            if len(nan_genes):
+                sub = d[:, nan_genes]
+                d[:, nan_genes] = np.where(np.isnan(sub), 0.0, sub)
+            s1 += d.sum(axis=0)
+            s2 += np.einsum("ij,ij->j", d, d)
+        return n, s1, s2
+
+    def _index(self, train):
+        train = np.asarray(train)
+        if train.dtype == bool:
+            if len(train) != self.n_samples:
+                raise ValueError(f"mask has {len(train)} entries, matrix has {self.n_samples} samples")
+            return train
+        mask = np.zeros(self.n_samples, dtype=bool)
+        mask[train] = True
+        return mask
+
+    def stats(self, train):
+        """float32 (mean, std) of the samples in `train` (index array or boolean mask)."""
+        mask = self._index(train)
+        if mask.sum() <= self.n_samples // 2:
+            # small training side: accumulate it directly
+            n, s1, s2 = self._sums(np.flatnonzero(mask))
+        else:
+            # subtract the held-out side from the totals
+            nh, s1h, s2h = self._sums(np.flatnonzero(~mask))
+            n, s1, s2 = self._n - nh, -s1h, self._m2 - s2h
+        with np.errstate(invalid="ignore", divide="ignore"):
+            shift = np.where(n > 0, s1 / n, 0.0)
+        return _finalize(n, self._center + shift, s2 - s1 * shift, self.eps)
+
+    def folds(self, folds):
+        """Stacked float32 (means, stds), each (n_folds × genes), one row per train index array."""
+        out = [self.stats(f) for f in folds]
+        g = len(self.genes)
+        return (np.stack([m for m, _ in out]) if out else np.empty((0, g), np.float32),
+                np.stack([s for _, s in out]) if out else np.empty((0, g), np.float32))
+
+    def scaler(self, train):
+        """ZScaler holding the stats of one training fold."""
+        mean, std = self.stats(train)
+        return ZScaler.from_stats(pd.Series(mean, index=self.genes), pd.Series(std, index=self.genes), self.eps)
+
+
+def fold_zstats(X, folds, eps=1e-6):
+    """Shortcut: FoldStats(X, eps).folds(folds) -> (means, stds), each (n_folds × genes)."""
+    return FoldStats(X, eps).folds(folds)
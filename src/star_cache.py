@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+"""
+Content-addressed on-disk cache of parsed STAR count vectors.
+
+Entries are keyed by the GDC manifest md5 of the source file plus
+star_utils.READER_VERSION, so a file is parsed once per reader version no matter
+where it sits on disk; re-running a build after adding new files only parses the
+new ones.
+
+Layout on disk (<root> defaults to data_proc/cache/star_counts):
+  <root>/<md5>.v<READER_VERSION>.npz   one parsed file (np.savez_compressed)
+      values   counts after read_star_counts() filtering
+      digest   the file's gene-layout digest
+      name     count column name
+      index    gene symbols (only for files off the reference layout)
+      index_name
+      verified   True when the bytes were checked against the manifest md5/size
+  <root>/layouts/<digest>.npz          gene index (+ index_name) of a reference layout (stored once)
+
+read_star_counts_cached() can also verify the file against the manifest md5/size in the
+same read that feeds the parser (see check_integrity()). Entries parsed without that
+check are flagged unverified; a verifying read does not trust them and re-checks the file.
+
+Access refreshes an entry's mtime; evict() drops least-recently-used entries until
+the cache fits under its size cap.
+
+CLI (run from the repo root):
+  python -m src.star_cache stats
+  python -m src.star_cache verify [--manifest PATH] [--delete]
+  python -m src.star_cache prune --max-mb 2048 [--orphans --manifest PATH]
+"""
+
+import argparse, os, sys, time
+import pandas as pd, numpy as np
+from pathlib import Path
+
+from src.star_utils import READER_VERSION, parse_star_file, read_star_bytes
+
+DEFAULT_ROOT = Path("data_proc/cache/star_counts")
+DEFAULT_MANIFEST = Path("data_raw/gdc/manifest_tcga_brca_star_counts_primary.txt")
+
+
+def load_manifest(path=DEFAULT_MANIFEST):
+    """Return DataFrame indexed by filename with md5/size columns (GDC manifest format)."""
+    man = pd.read_csv(path, sep="\t", dtype={"md5": str})
+    return man.drop_duplicates("filename").set_index("filename")[["id", "md5", "size"]]
+
+
+def _index(labels, name):
+    # same Index read_star_counts() builds: string dtype, named after the symbol column
+    return pd.Index(labels, dtype="string", name=str(name) or None)
+
+
+class StarCountCache:
+    """Parse cache for STAR count vectors (see module docstring for the format)."""
+
+    def __init__(self, root=DEFAULT_ROOT, version=READER_VERSION):
+        self.root = Path(root)
+        self.version = version
+        self.suffix = f".v{version}.npz"
+        (self.root / "layouts").mkdir(parents=True, exist_ok=True)
+        self._layouts = {}
+
+    def path(self, md5):
+        return self.root / f"{md5}{self.suffix}"
+
+    def _layout_path(self, digest):
+        return self.root / "layouts" / f"{digest}.npz"
+
+    def _write(self, path, **arrays):
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as fh:
+            np.savez_compressed(fh, **arrays)
+        os.replace(tmp, path)  # atomic: concurrent workers never see half-written entries
+
+    def save_layout(self, layout):
+        p = self._layout_path(layout.digest)
+        if not p.exists():
+            self._write(p, index=np.asarray(layout.index, dtype=str),
+                        index_name=np.array(layout.index.name or ""))
+
+    def layout_index(self, digest):
+        if digest not in self._layouts:
+            p = self._layout_path(digest)
+            if not p.exists():
+                return None
+            with np.load(p) as z:
+                self._layouts[digest] = _index(z["index"], z["index_name"])
+        return self._layouts[digest]
+
+    def get(self, md5, layout=None, verified=False):
+        """Return cached counts (int32 array if on `layout`, else Series) or None on a miss.
+
+        verified=True only accepts entries whose bytes were checked against the manifest.
+        """
+        p = self.path(md5)
+        try:
+            with np.load(p) as z:
+                if verified and not ("verified" in z.files and bool(z["verified"])):
+                    return None
+                values, digest, name = z["values"], str(z["digest"]), str(z["name"])
+                index = _index(z["index"], z["index_name"]) if "index" in z.files else None
+        except FileNotFoundError:
+            return None
+        except Exception:  # unreadable entry: treat as a miss, it gets rewritten
+            return None
+        os.utime(p)  # LRU bookkeeping
+        if layout is not None and digest == layout.digest:
+            return values.astype(np.int32, copy=False)
+        if index is None:
+            index = self.layout_index(digest)
+            if index is None:
+                return None
+        return pd.Series(values, index=index, name=name)
+
+    def put(self, md5, counts, digest, name, verified=False):
+        """Store one parsed file (array on a saved reference layout, or a Series)."""
+        arrays = dict(digest=np.array(digest), name=np.array(name), verified=np.array(bool(verified)))
+        if isinstance(counts, pd.Series):
+            arrays["values"] = counts.to_numpy()
+            arrays["index"] = np.asarray(counts.index, dtype=str)
+            arrays["index_name"] = np.array(counts.index.name or "")
+        else:
+            arrays["values"] = np.asarray(counts)
+        self._write(self.path(md5), **arrays)
+
+    def discard(self, md5):
+        self.path(md5).unlink(missing_ok=True)
+
+    def entries(self):
+        """DataFrame of cache entries: md5, version, bytes, atime (mtime)."""
+        rows = []
+        for p in self.root.glob("*.v*.npz"):
+            md5, ver = p.name[:-len(".npz")].rsplit(".v", 1)
+            st = p.stat()
+            rows.append({"path": p, "md5": md5, "version": ver, "bytes": st.st_size, "atime": st.st_mtime})
+        return pd.DataFrame(rows, columns=["path", "md5", "version", "bytes", "atime"])
+
+    def size_bytes(self):
+        return int(self.entries()["bytes"].sum())
+
+    def evict(self, max_bytes):
+        """Delete least-recently-used entries until the cache is <= max_bytes; return removed md5s."""
+        ent = self.entries().sort_values("atime", ascending=False)
+        over = ent["bytes"].cumsum() > max_bytes
+        removed = ent[over]
+        for p in removed["path"]:
+            p.unlink(missing_ok=True)
+        self._drop_unused_layouts()
+        return removed["md5"].tolist()
+
+    def prune_orphans(self, keep_md5s):
+        """Delete entries from other reader versions or whose md5 is not in keep_md5s."""
+        ent = self.entries()
+        bad = ent[(ent["version"] != str(self.version)) | ~ent["md5"].isin(set(keep_md5s))]
+        for p in bad["path"]:
+            p.unlink(missing_ok=True)
+        self._drop_unused_layouts()
+        return bad["md5"].tolist()
+
+    def _drop_unused_layouts(self):
+        used = set()
+        for p in self.root.glob(f"*{self.suffix}"):
+            try:
+                with np.load(p) as z:
+                    if "index" not in z.files:
+                        used.add(str(z["digest"]))
+            except Exception:
+                continue
+        for p in (self.root / "layouts").glob("*.npz"):
+            if p.stem not in used:
+                p.unlink(missing_ok=True)
+
+    def verify(self, manifest=None, delete=False):
+        """Check every entry loads and has a resolvable index; return a report DataFrame."""
+        known = set(manifest["md5"]) if manifest is not None else None
+        rows = []
+        for e in self.entries().itertuples():
+            status = "ok"
+            try:
+                with np.load(e.path) as z:
+                    n, digest = len(z["values"]), str(z["digest"])
+                    checked = "verified" in z.files and bool(z["verified"])
+                    if "index" in z.files:
+                        if len(z["index"]) != n:
+                            status = "index length mismatch"
+                    else:
+                        index = self.layout_index(digest)
+                        if index is None:
+                            status = "missing layout"
+                        elif len(index) != n:
+                            status = "layout length mismatch"
+            except Exception as ex:
+                status = f"unreadable: {type(ex).__name__}"
+            if status == "ok" and e.version != str(self.version):
+                status = "stale version"
+            if status == "ok" and known is not None and e.md5 not in known:
+                status = "not in manifest"
+            if status == "ok" and not checked:
+                status = "unverified"      # parsed without an md5 check; kept, re-checked on a verifying read
+            rows.append({"md5": e.md5, "version": e.version, "bytes": e.bytes, "status": status})
+        report = pd.DataFrame(rows, columns=["md5", "version", "bytes", "status"])
+        if delete:
+            bad = ~report["status"].isin(["ok", "unverified"])
+            for md5, ver in report.loc[bad, ["md5", "version"]].itertuples(index=False):
+                (self.root / f"{md5}.v{ver}.npz").unlink(missing_ok=True)
+            self._drop_unused_layouts()
+        return report
+
+
+# integrity statuses that mean the bytes on disk are not the file GDC published
+BAD_STATUSES = ("md5_mismatch", "truncated", "size_mismatch")
+
+
+def check_integrity(md5, size, expect_md5=None, expect_size=None):
+    """Compare an observed md5/size with the manifest; return an integrity status."""
+    if expect_md5 is None:
+        return "unverified"
+    if expect_size is not None and size != int(expect_size):
+        return "truncated" if size < int(expect_size) else "size_mismatch"
+    return "ok" if md5 == expect_md5 else "md5_mismatch"
+
+
+def read_star_counts_cached(path, md5, cache, layout=None, engine="auto", size=None, verify=False):
+    """Return (counts, cache_hit, integrity) for one file keyed by its manifest md5/size.
+
+    Cache hits skip the file entirely (integrity status "cached"); with verify=True only
+    entries that were themselves verified count as hits. On a miss with verify=True the
+    file is read once: the md5 is computed over the bytes as they are read and the same
+    in-memory bytes are parsed. Files that fail the check are not parsed or cached (an
+    unverified entry for them is dropped) and come back with counts=None and a
+    BAD_STATUSES status.
+    """
+    if cache is not None and md5:
+        counts = cache.get(md5, layout, verified=verify)
+        if counts is not None:
+            return counts, True, {"status": "cached", "observed_md5": None, "observed_size": None}
+    data = None
+    integrity = {"status": "unverified", "observed_md5": None, "observed_size": None}
+    if verify:
+        data, got_md5, got_size = read_star_bytes(path)
+        integrity = {"status": check_integrity(got_md5, got_size, md5, size),
+                     "observed_md5": got_md5, "observed_size": got_size}
+        if integrity["status"] in BAD_STATUSES:
+            if cache is not None and md5:
+                cache.discard(md5)
+            return None, False, integrity
+    counts, digest, name = parse_star_file(path, layout, engine, data=data)
+    # unchecked parses are cached too, but flagged so a verifying run re-reads the file
+    if cache is not None and md5:
+        cache.put(md5, counts, digest, name, verified=integrity["status"] == "ok")
+    return counts, False, integrity
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Inspect, verify or prune the STAR parse cache.")
+    ap.add_argument("command", choices=["stats", "verify", "prune"])
+    ap.add_argument("--root", type=Path, default=DEFAULT_ROOT)
+    ap.add_argument("--manifest", type=Path, default=None, help="GDC manifest (flags/prunes md5s not listed)")
+    ap.add_argument("--delete", action="store_true", help="verify: delete entries that fail")
+    ap.add_argument("--max-mb", type=float, default=None, help="prune: LRU-evict down to this size")
+    ap.add_argument("--orphans", action="store_true", help="prune: drop stale versions / md5s not in --manifest")
+    args = ap.parse_args(argv)
+
+    cache = StarCountCache(args.root)
+    manifest = load_manifest(args.manifest) if args.manifest else None
+    ent = cache.entries()
+
+    if args.command == "stats":
+        print("cache:", cache.root, "| reader version:", cache.version)
+        print("entries:", len(ent), "| size (MB) ~", round(ent["bytes"].sum() / 1e6, 1))
+        if len(ent):
+            print(ent.groupby("version")["bytes"].agg(["count", "sum"]))
+            print("oldest access:", time.ctime(ent["atime"].min()), "| newest:", time.ctime(ent["atime"].max()))
+    elif args.command == "verify":
+        report = cache.verify(manifest, delete=args.delete)
+        print(report["status"].value_counts().to_string())
+        bad = report[~report["status"].isin(["ok", "unverified"])]
+        if len(bad):
+            print(bad.head(20).to_string(index=False))
+        return 1 if len(bad) and not args.delete else 0
+    else:
+        if args.orphans:
+            if manifest is None:
+                ap.error("--orphans needs --manifest")
+            print("removed orphans:", len(cache.prune_orphans(manifest["md5"])))
+        if args.max_mb is not None:
+            print("evicted (LRU):", len(cache.evict(int(args.max_mb * 1e6))))
+        print("cache size (MB) ~", round(cache.size_bytes() / 1e6, 1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
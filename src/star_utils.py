@@ -2,27 +2,126 @@
 """
 Utilities for STAR/HTSeq raw counts.
 
-read_star_counts(path) -> pd.Series
+read_star_counts(path, engine="auto") -> pd.Series
   - Chooses raw counts column (not TPM/FPKM)
   - Prefers gene symbol; falls back to gene_id for missing/blank symbols
   - Drops summary rows (__*, N_*)
   - Returns numeric counts indexed by uppercased gene symbol/id
+
+star_layout(path) -> StarLayout
+read_star_counts_fixed(path, layout) -> np.ndarray[int32] | None
+  - Fast path for files that share the reference gene layout (every GDC
+    augmented_star_gene_counts.tsv lists the same gene_id rows in the same order)
+  - The layout digest covers the header plus the gene_id/gene_name columns; a file
+    whose digest differs returns None and should go through read_star_counts()
+  - Values equal read_star_counts(path).to_numpy() for matching files, so the
+    counts can be written straight into a preallocated genes × samples matrix
+
+parse_star_file(path, layout=None, data=None) -> (counts, digest, count_col)
+  - One parse that yields the fast-path array when the layout matches and the
+    read_star_counts() Series otherwise (used by the ingest and the parse cache)
+
+read_star_bytes(path) -> (bytes, md5, size)
+  - Reads a file once, updating the md5 chunk by chunk as the bytes arrive; pass the
+    bytes back as `data=` so checksum + parse cost a single read of the file
+
+Engines:
+  - "pyarrow": pyarrow.csv with column projection (gene_id, gene_name, count column only)
+  - "pandas":  pandas C parser, same projection (fallback when pyarrow is missing)
+  - "auto":    pyarrow if importable, else pandas
+  Every engine returns the same result: identical index (labels and order), identical
+  values and dtype, and identical layout digests. Both engines treat pandas' default
+  NA tokens as missing, and only leading '#' comment lines are supported (GDC writes
+  a single '# gene-model: ...' line).
+
+The header line is sniffed per file; picking the gene/count columns is cached per
+distinct header, so a build over one GENCODE release resolves the columns once.
 """
 
+import gzip
+import hashlib
+import io
+from functools import lru_cache
+from typing import NamedTuple
+
 import pandas as pd, numpy as np
 from pathlib import Path
 
-def read_star_counts(path):
-    """Return Series: index = gene symbol (uppercased; fallback to gene_id), values = raw counts."""
-    import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+except ImportError:  # pandas engine only
+    pa = pc = pacsv = None
+
+ENGINES = ("pyarrow", "pandas")
+
+# bump when parsing semantics change (keys on-disk parse caches)
+READER_VERSION = 1
+
+# pandas' default na_values, applied to pyarrow too so both engines agree
+NA_TOKENS = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+             "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+
+COUNT_KEYS = ["unstranded", "raw_count", "read_count", "htseq_counts", "stranded_first", "stranded_second"]
+
+
+class StarLayout(NamedTuple):
+    """Reference gene layout shared by STAR files from one GENCODE release."""
+    digest: str            # hash of header + gene_id/gene_name columns
+    keep: np.ndarray       # row positions that survive read_star_counts() filtering
+    index: pd.Index        # gene symbols of the kept rows (may contain duplicates)
 
-    kw = dict(sep="\t", comment="#", dtype=str, engine="python")
-    if str(path).endswith(".gz"):
-        kw["compression"] = "infer"
-    df = pd.read_csv(path, **kw)
 
+def resolve_engine(engine="auto"):
+    if engine == "auto":
+        return "pyarrow" if pacsv is not None else "pandas"
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine!r}; choose from {ENGINES + ('auto',)}")
+    if engine == "pyarrow" and pacsv is None:
+        raise ImportError("engine='pyarrow' requires pyarrow")
+    return engine
+
+
+def read_star_bytes(path, chunk_size=1 << 20):
+    """Read a file once -> (raw bytes, md5 hex, size in bytes)."""
+    h = hashlib.md5()
+    buf = bytearray()
+    with open(path, "rb") as fh:
+        while chunk := fh.read(chunk_size):
+            h.update(chunk)
+            buf += chunk
+    return bytes(buf), h.hexdigest(), len(buf)
+
+
+def _text_source(path, data):
+    """Uncompressed bytes for an in-memory file (data is the raw on-disk content)."""
+    return gzip.decompress(data) if str(path).endswith(".gz") else data
+
+
+def sniff_header(path, data=None):
+    """Return (number of leading '#' lines, header column tuple)."""
+    if data is not None:
+        fh = io.TextIOWrapper(io.BytesIO(data), newline="")
+    elif str(path).endswith(".gz"):
+        fh = gzip.open(path, "rt", newline="")
+    else:
+        fh = open(path, "r", newline="")
+    with fh:
+        skip = 0
+        for line in fh:
+            if line.startswith("#"):
+                skip += 1
+                continue
+            return skip, tuple(line.rstrip("\r\n").split("\t"))
+    raise ValueError(f"No header line found in {path}")
+
+
+@lru_cache(maxsize=64)
+def star_columns(header):
+    """Return (gene_id_col, gene_name_col, count_col) for a STAR/HTSeq header tuple."""
     # normalize column names
-    norm = {c: c.lower().replace(".", "_").strip() for c in df.columns}
+    norm = {c: c.lower().replace(".", "_").strip() for c in header}
     inv  = {v: k for k, v in norm.items()}
 
     # columns present?
@@ -30,12 +129,88 @@ def read_star_counts(path):
     gene_name_col = inv.get("gene_name") or inv.get("gene") or inv.get("hugo_symbol")
 
     # choose raw-counts column (NOT tpm/fpkm)
-    for key in ["unstranded", "raw_count", "read_count", "htseq_counts", "stranded_first", "stranded_second"]:
+    for key in COUNT_KEYS:
         if key in inv:
             count_col = inv[key]
             break
     else:
-        raise ValueError(f"No counts column found in {list(df.columns)}")
+        raise ValueError(f"No counts column found in {list(header)}")
+    if gene_id_col is None and gene_name_col is None:
+        raise ValueError("Neither gene_name nor gene_id found")
+    return gene_id_col, gene_name_col, count_col
+
+
+def _joined(values):
+    return "\n".join(values).encode()
+
+
+def _read_pyarrow(src, skip, usecols, count_col):
+    read = pacsv.ReadOptions(skip_rows=skip)
+    parse = pacsv.ParseOptions(delimiter="\t")
+
+    def convert(count_type):
+        types = {c: pa.string() for c in usecols}
+        types[count_col] = count_type
+        return pacsv.ConvertOptions(include_columns=usecols, column_types=types,
+                                    null_values=NA_TOKENS, strings_can_be_null=True)
+    try:
+        tbl = pacsv.read_csv(_pa_input(src), read_options=read, parse_options=parse,
+                             convert_options=convert(pa.int64()))
+    except pa.ArrowInvalid:  # non-integer counts: parse as text, coerce like pandas
+        tbl = pacsv.read_csv(_pa_input(src), read_options=read, parse_options=parse,
+                             convert_options=convert(pa.string()))
+
+    # layout digest straight from the Arrow buffers (same bytes as the pandas path)
+    parts = []
+    for c in usecols:
+        if c == count_col:
+            continue
+        col = pc.fill_null(tbl.column(c).combine_chunks(), "")
+        lst = pa.ListArray.from_arrays(pa.array([0, len(col)], pa.int32()), col)
+        parts.append(pc.binary_join(lst, "\n")[0].as_py().encode())
+    return tbl.to_pandas(), parts
+
+
+def _pa_input(src):
+    return pa.BufferReader(src) if isinstance(src, (bytes, bytearray)) else src
+
+
+def _read_pandas(src, usecols, count_col):
+    if isinstance(src, (bytes, bytearray)):
+        src = io.BytesIO(src)
+    df = pd.read_csv(src, sep="\t", comment="#", usecols=usecols, dtype=str, engine="c",
+                     compression="infer")
+    parts = [_joined(df[c].fillna("").tolist()) for c in usecols if c != count_col]
+    return df, parts
+
+
+def read_star_frame(path, engine="auto", data=None):
+    """Parse the gene_id/gene_name/count columns of one file.
+
+    `data` (raw file bytes from read_star_bytes) parses from memory instead of
+    re-reading `path`. Returns (df, (gene_id_col, gene_name_col, count_col), layout digest).
+    """
+    src = path if data is None else _text_source(path, data)
+    skip, header = sniff_header(path, None if data is None else src)
+    cols = star_columns(header)
+    gene_id_col, gene_name_col, count_col = cols
+    usecols = [c for c in header if c in (gene_id_col, gene_name_col, count_col)]
+    if resolve_engine(engine) == "pyarrow":
+        df, parts = _read_pyarrow(src, skip, usecols, count_col)
+    else:
+        df, parts = _read_pandas(src, usecols, count_col)
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update("\t".join(header).encode())
+    for part in parts:
+        h.update(b"\0")
+        h.update(part)
+    return df, cols, h.hexdigest()
+
+
+def _star_series(df, cols, values):
+    """Apply the read_star_counts() index rules to `values` (one per row of df)."""
+    gene_id_col, gene_name_col, count_col = cols
 
     # build a robust index: use gene_name if available; otherwise fall back to gene_id
     if gene_name_col is not None:
@@ -43,21 +218,20 @@ def read_star_counts(path):
         # consider empty/NA/"NA"/"NAN"/"-" as missing
         miss = sym.isna() | (sym == "") | sym.str.upper().isin({"NA", "NAN", "NULL", "-"})
         if gene_id_col is not None:
-            sym.loc[miss] = df[gene_id_col]
+            sym.loc[miss] = df[gene_id_col].astype("string")
         else:
             sym = sym[~miss]
+            values = np.asarray(values)[~miss.to_numpy(dtype=bool)]
         index = sym.str.upper()
-    elif gene_id_col is not None:
-        index = df[gene_id_col].astype("string").str.strip().str.upper()
     else:
-        raise ValueError("Neither gene_name nor gene_id found")
+        index = df[gene_id_col].astype("string").str.strip().str.upper()
 
     # make the series
-    s = pd.Series(df[count_col].values, index=index, name=count_col)
+    s = pd.Series(values, index=index, name=count_col)
 
-    # drop STAR/HTSeq summary rows
-    idx = s.index.astype(str)
-    s = s[~(idx.str.startswith("__") | idx.str.startswith("N_"))]
+    # drop STAR/HTSeq summary rows (single pass; robust to NA)
+    idx = s.index.astype("string")
+    s = s[~idx.str.startswith(("__", "N_"), na=False)]
 
     # coerce to numeric; NaN -> 0
     s = pd.to_numeric(s, errors="coerce").fillna(0)
@@ -68,3 +242,34 @@ def read_star_counts(path):
     return s
 
 
+def read_star_counts(path, engine="auto"):
+    """Return Series: index = gene symbol (uppercased; fallback to gene_id), values = raw counts."""
+    df, cols, _ = read_star_frame(path, engine)
+    return _star_series(df, cols, df[cols[2]].values)
+
+
+def star_layout(path, engine="auto"):
+    """Build the reference StarLayout from one STAR file (run once per build)."""
+    df, cols, digest = read_star_frame(path, engine)
+    # push row positions through the same filters read_star_counts() applies
+    pos = _star_series(df, cols, np.arange(len(df), dtype=np.int64))
+    return StarLayout(digest=digest, keep=pos.to_numpy(dtype=np.int64), index=pos.index)
+
+
+def parse_star_file(path, layout=None, engine="auto", data=None):
+    """Parse once -> (counts, layout digest, count column name).
+
+    counts is an int32 array in `layout` row order when the file's digest matches,
+    otherwise the read_star_counts() Series.
+    """
+    df, cols, digest = read_star_frame(path, engine, data)
+    if layout is not None and digest == layout.digest:
+        counts = pd.to_numeric(df[cols[2]], errors="coerce").fillna(0).to_numpy()
+        return counts[layout.keep].astype(np.int32), digest, cols[2]
+    return _star_series(df, cols, df[cols[2]].values), digest, cols[2]
+
+
+def read_star_counts_fixed(path, layout, engine="auto"):
+    """Return int32 counts in `layout` row order, or None if the file's gene layout differs."""
+    counts, _, _ = parse_star_file(path, layout, engine)
+    return counts if isinstance(counts, np.ndarray) else None